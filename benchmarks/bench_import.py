@@ -0,0 +1,45 @@
+'''
+Benchmark of the startup time: importing the modules of the package in a
+fresh interpreter and parsing a first formula, with parser tables cached
+in the package directory (warm) and built from the grammar (cold).
+
+    python benchmarks/bench_import.py [repeat]
+'''
+import sys
+import os
+import subprocess
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__), '../markov_logic_network'))
+
+cases = [
+    # (name, statement run after sys.path is set up)
+    ('import syntax', 'import syntax'),
+    ('import model', 'import model'),
+    ('first parse', 'import syntax; syntax.parse_formula("forall x (P(x) => Q(x))")'),
+    ('first parse (cold)', 'import syntax; syntax.TABLE_PREFIX = "_bench_"; '
+                           'syntax.TABLE_DIR = "/nonexistent"; '
+                           'syntax.parse_formula("forall x (P(x) => Q(x))")'),
+    ]
+
+script = '''
+import sys, time
+sys.path.insert(0, {!r})
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start)
+'''
+
+def measure(statement, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', script.format(libpath, statement)])
+        best = min(best, float(out))
+    return best
+
+def main(repeat=5):
+    measure(cases[2][1], 1)     # write parser tables if they are missing
+    print('{:<24} {:>12}'.format('case', 'time'))
+    for name, statement in cases:
+        print('{:<24} {:>11.4f}s'.format(name, measure(statement, repeat)))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,54 @@
+'''
+Benchmark of the conjunctive normal form translation: the recursive passes
+of normalize against the fused explicit-stack pipeline.
+
+    python benchmarks/bench_normalize.py [repeat]
+'''
+import sys
+import os
+import time
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from syntax import *
+import normalize as n
+
+def recursive_cnf(f, C):
+    f = n._uniquify(f, [0])
+    f = n._remove_arrows(f)
+    f = n._move_neg(f)
+    f = n._remove_exists(f, C)
+    f = n._remove_forall(f)
+    return n._move_or(f)
+
+def fused_cnf(f, C):
+    return n._distribute(n._quantifier_free(f, C), And, Or)
+
+cases = [
+    # (name, formula, number of constants)
+    ('exists-large', 'forall x (Smokes(x) => exists y (Friends(x, y) or Smokes(y)))', 600),
+    ('exists-equiv', 'forall x (P(x) => exists y (Q(x, y) <=> R(y)))', 10),
+    ('not-forall', 'not forall x y (P(x, y) and not Q(y, x))', 25),
+    ('wide-and', ' and '.join('P{}(x)'.format(i) for i in range(200)), 1),
+    ]
+
+def measure(fun, f, C, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun(f, C)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(repeat=3):
+    print('{:<24} {:>12} {:>12} {:>8}'.format('case', 'recursive', 'fused', 'speedup'))
+    for name, text, k in cases:
+        f = parse_formula(text)
+        C = ['C' + str(i) for i in range(k)]
+        assert recursive_cnf(f, C) == fused_cnf(f, C)
+        t1 = measure(recursive_cnf, f, C, repeat)
+        t2 = measure(fused_cnf, f, C, repeat)
+        print('{:<24} {:>11.4f}s {:>11.4f}s {:>7.2f}x'.format(name, t1, t2, t1 / t2))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
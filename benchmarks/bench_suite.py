@@ -0,0 +1,210 @@
+'''
+Benchmark suite on synthetic models: parsing, each normalization pass,
+grounding and each inference method. The time (best of repeat runs) and
+the peak memory (by tracemalloc, in a separate run) of each case are
+written as JSON and compared against a baseline written by an earlier run.
+
+    python benchmarks/bench_suite.py [--repeat N] [--filter TEXT]
+                                     [--output FILE] [--baseline FILE]
+                                     [--threshold RATIO]
+
+Cases which are slower or use more memory than threshold times the
+baseline are reported as regressions and the exit status is 1.
+'''
+import sys
+import os
+import gc
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from syntax import *
+from evidence import Database
+from model import MarkovLogicNetwork
+import normalize as n
+import inference
+
+# === Generators of synthetic models ===
+
+FRIENDS_AND_SMOKERS = '''
+Friends(person, person)
+Smokes(person)
+Cancer(person)
+forall x (Smokes(x) => Cancer(x))                         : 1.5
+forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))   : 1.1
+forall x (not exists y Friends(x, y) => Smokes(x))        : 0.8
+'''
+
+def friends_and_smokers(size, seed=0):
+    '''
+    The friends and smokers model over size people, where each person has
+    about two friends and every third person smokes. Return the text of
+    the model and the evidence.
+    '''
+    people = ['P{}'.format(i) for i in range(size)]
+    world = Database(constants=people)
+    for i in range(size):
+        for d in (1, 7):
+            if i + d < size and (i * d + seed) % 3 != 2:
+                world.add(Atom('Friends', (people[i], people[i + d])))
+        if i % 3 == 0:
+            world.add(Atom('Smokes', (people[i],)))
+    return FRIENDS_AND_SMOKERS, world
+
+def nested_quantifiers(depth):
+    '''
+    A formula of depth nested universal quantifiers whose innermost
+    subformula is existentially quantified
+    '''
+    body = 'exists y R(x{}, y)'.format(depth - 1)
+    for i in reversed(range(depth)):
+        guard = 'P(x0)' if i == 0 else 'R(x{}, x{})'.format(i - 1, i)
+        body = 'forall x{} ({} => {})'.format(i, guard, body)
+    return body
+
+def biconditionals(count):
+    'A formula which is a chain of count biconditionals'
+    body = 'P0(x)'
+    for i in range(1, count + 1):
+        body = '({} <=> P{}(x))'.format(body, i)
+    return 'forall x ' + body
+
+def rule_file(size):
+    'The text of a model of size weighted rules with type declarations'
+    lines = ['R{}(item, item)'.format(i % 50) for i in range(50)]
+    for i in range(size):
+        lines.append('forall x y (R{}(x, y) and R{}(y, x) => R{}(x, x)) : {}'.format(
+            i % 50, (i + 1) % 50, (i + 2) % 50, (i % 7) / 4.0))
+    return '\n'.join(lines) + '\n'
+
+# === Cases ===
+
+PASSES = [
+    ('uniquify', lambda f, C: n._uniquify(f, [0])),
+    ('remove_arrows', lambda f, C: n._remove_arrows(f)),
+    ('move_neg', lambda f, C: n._move_neg(f)),
+    ('remove_exists', lambda f, C: n._remove_exists(f, C)),
+    ('remove_forall', lambda f, C: n._remove_forall(f)),
+    ('move_or', lambda f, C: n._move_or(f)),
+    ]
+
+INFERENCE_OPTIONS = {
+    'mcsat': {'burn_in': 20, 'samples': 200, 'seed': 0},
+    'gibbs': {'burn_in': 20, 'samples': 200, 'seed': 0},
+    'dedup': {'burn_in': 20, 'samples': 200, 'seed': 0},
+    'elimination': {'burn_in': 20, 'samples': 200, 'seed': 0},
+    'maxwalksat': {'seed': 0},
+    }
+
+def _normalize_cases(name, f, C):
+    'Cases of each recursive normalization pass applied in order and the fused passes'
+    cases = [('normalize/{}/fused'.format(name), lambda f=f: n._conjunctive_normal_form(f, C))]
+    for pass_name, fun in PASSES:
+        cases.append(('normalize/{}/{}'.format(name, pass_name), lambda fun=fun, f=f: fun(f, C)))
+        f = fun(f, C)
+    return cases
+
+def cases(sizes=(10, 40, 160)):
+    'List of pairs (name, function of no arguments)'
+    result = []
+    for size in (1000, 10000):
+        text = rule_file(size)
+        result.append(('parse/rules-{}'.format(size), lambda text=text: parse_mln(text)))
+
+    C = ['C{}'.format(i) for i in range(10)]
+    result.extend(_normalize_cases('nested-40', parse_formula(nested_quantifiers(40)), C))
+    result.extend(_normalize_cases('biconditionals-5', parse_formula(biconditionals(5)), C))
+    f = parse_mln(FRIENDS_AND_SMOKERS)[1][0]
+    result.extend(_normalize_cases('friends-smokers', f, ['P{}'.format(i) for i in range(40)]))
+
+    for size in sizes:
+        model = MarkovLogicNetwork()
+        text, world = friends_and_smokers(size)
+        model.load(text)
+        result.append(('ground/friends-smokers-{}'.format(size),
+                       lambda model=model, world=world:
+                           model.ground_network(world, open_world=['Smokes', 'Cancer'])))
+
+    for size in (3, sizes[-1]):
+        model = MarkovLogicNetwork()
+        text, world = friends_and_smokers(size)
+        model.load(text)
+        network = model.ground_network(world, open_world=['Smokes', 'Cancer'])
+        methods = sorted(inference.methods.items()) + sorted(inference.map_methods.items())
+        for name, method in methods:
+            if name == 'simple' and network.n_atoms > 16:
+                continue
+            options = INFERENCE_OPTIONS.get(name, {})
+            result.append(('infer/{}/friends-smokers-{}'.format(name, size),
+                           lambda method=method, network=network, options=options:
+                               method(network, **options)))
+    return result
+
+# === Measurement ===
+
+def measure(fun, repeat):
+    'Best time of repeat runs and the peak memory of one run'
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fun()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def compare(results, baseline, threshold):
+    'List of (name, metric, value, baseline value) which regress by more than threshold'
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, floor in (('time', 1e-3), ('peak', 1 << 16)):
+            if result[metric] > threshold * max(base[metric], floor):
+                regressions.append((name, metric, result[metric], base[metric]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--filter', default='', help='run cases whose names contain this text')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print('{:<52} {:>11} {:>12}'.format('case', 'time', 'peak'))
+    for name, fun in cases():
+        if args.filter not in name:
+            continue
+        t, peak = measure(fun, args.repeat)
+        results[name] = {'time': t, 'peak': peak}
+        print('{:<52} {:>10.4f}s {:>10.1f}KB'.format(name, t, peak / 1024.0))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': results}, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, value, base in regressions:
+            print('REGRESSION {} {}: {:.6g} (baseline {:.6g})'.format(name, metric, value, base))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
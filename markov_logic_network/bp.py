@@ -0,0 +1,107 @@
+'Loopy belief propagation on ground networks compressed by color passing'
+
+import numpy as np
+from scipy.special import expit
+from lifted import color_passing
+
+__all__ = ['BeliefPropagationStats', 'compress', 'belief_propagation']
+
+# Bound of log-odds of messages, which keeps hard clauses finite
+LIMIT = 30.0
+
+class BeliefPropagationStats(object):
+    'Sizes of the ground and the compressed graphs and the convergence of messages'
+    def __init__(self):
+        self.atoms = 0          # number of ground atoms
+        self.clauses = 0        # number of ground clauses
+        self.edges = 0          # number of ground literals
+        self.supernodes = 0     # number of atom colors
+        self.superfeatures = 0  # number of clause colors
+        self.superedges = 0     # number of edges of the compressed graph
+        self.iterations = 0
+        self.converged = False
+
+    @property
+    def compression(self):
+        'Ratio of the number of nodes of the ground graph to the compressed graph'
+        nodes = self.supernodes + self.superfeatures
+        return (self.atoms + self.clauses) / nodes if nodes else 1.0
+
+    def __repr__(self):
+        return ('BeliefPropagationStats(atoms={}, clauses={}, supernodes={}, superfeatures={}, '
+                'compression={:.2f}, iterations={}, converged={})').format(
+                self.atoms, self.clauses, self.supernodes, self.superfeatures,
+                self.compression, self.iterations, self.converged)
+
+def compress(network, lifted=True):
+    '''
+    Build the factor graph of a GroundNetwork whose nodes are supernodes
+    (atoms of the same color) and superfeatures (clauses of the same color)
+    found by color_passing, or single atoms and clauses if not lifted.
+    Return (atom colors, clause colors, edges) where edges is a tuple of
+    arrays (superfeature, supernode, sign, n, m) for each distinct triple
+    of literals: a clause of the superfeature has n such literals and an
+    atom of the supernode appears in m such literals.
+    '''
+    if lifted:
+        atom_colors, clause_colors = color_passing(network)
+    else:
+        atom_colors = np.arange(network.n_atoms)
+        clause_colors = np.arange(network.n_clauses)
+    keys = np.stack([clause_colors[network.literal_clauses()],
+                     atom_colors[network.lits], network.signs.astype(np.int64)], axis=1)
+    keys, counts = np.unique(keys.reshape(-1, 3), axis=0, return_counts=True)
+    F, X, S = keys[:, 0], keys[:, 1], keys[:, 2].astype(bool)
+    clause_sizes = np.bincount(clause_colors)
+    atom_sizes = np.bincount(atom_colors)
+    return atom_colors, clause_colors, (F, X, S, counts // clause_sizes[F], counts // atom_sizes[X])
+
+def belief_propagation(network, damping=0.5, tol=1e-6, max_iter=200, lifted=True, stats=None):
+    '''
+    Estimate marginal probabilities of the atoms of a GroundNetwork by loopy
+    belief propagation. Return an array of probabilities indexed by atom
+    ids.
+
+    If lifted, atoms and clauses which would send identical messages are
+    merged by color passing and messages are passed on the compressed graph
+    (see compress), which gives the same result as on the ground graph.
+    Messages are log-odds of atoms, updated in parallel and damped by
+    damping (the weight of old messages), until their largest change is
+    below tol or max_iter iterations. If stats (a BeliefPropagationStats)
+    is given, it is filled in.
+    '''
+    atom_colors, clause_colors, (F, X, S, n, m) = compress(network, lifted)
+    weights = np.zeros(len(np.bincount(clause_colors)))
+    weights[clause_colors] = network.weights
+    # Factors of satisfied and unsatisfied clauses divided by the larger
+    sat = np.exp(np.minimum(weights, 0.0))[F]
+    unsat = np.exp(-np.maximum(weights, 0.0))[F]
+    sign = np.where(S, 1.0, -1.0)
+    n_nodes = len(np.bincount(atom_colors)) if network.n_atoms else 0
+
+    r = np.zeros(len(F))        # messages from superfeatures to supernodes
+    total = np.zeros(n_nodes)
+    converged = False
+    iteration = 0
+    while iteration < max_iter and not converged:
+        iteration += 1
+        total = np.bincount(X, weights=m * r, minlength=n_nodes)
+        v = total[X] - r        # messages from supernodes to superfeatures
+        log_false = -np.logaddexp(0.0, sign * v)
+        log_q = np.bincount(F, weights=n * log_false, minlength=len(weights))[F] - log_false
+        q = np.exp(log_q)       # probability that the other literals are false
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = np.log(sat) - np.log(sat - (sat - unsat) * q)
+        new = np.clip(np.nan_to_num(sign * g, nan=0.0), -LIMIT, LIMIT)
+        new = damping * r + (1 - damping) * new
+        converged = np.all(np.abs(new - r) < tol)
+        r = new
+    total = np.bincount(X, weights=m * r, minlength=n_nodes)
+
+    if stats is not None:
+        stats.atoms, stats.clauses = network.n_atoms, network.n_clauses
+        stats.edges = len(network.lits)
+        stats.supernodes, stats.superfeatures = n_nodes, len(weights)
+        stats.superedges = len(F)
+        stats.iterations, stats.converged = iteration, bool(converged)
+    return expit(total[atom_colors]) if network.n_atoms else np.zeros(0)
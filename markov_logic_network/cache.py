@@ -0,0 +1,104 @@
+'Caches of ground networks and query results with LRU eviction'
+
+from collections import OrderedDict
+from syntax import *
+
+__all__ = ['CacheStats', 'LRUCache', 'QueryCache', 'query_key']
+
+class CacheStats(object):
+    'Counters of lookups of a cache'
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        'Ratio of hits to lookups'
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self):
+        return 'CacheStats(hits={}, misses={}, evictions={}, hit_rate={:.2f})'.format(
+            self.hits, self.misses, self.evictions, self.hit_rate)
+
+class LRUCache(object):
+    'A map of at most maxsize entries which evicts the least recently used entry'
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.stats = CacheStats()
+
+    def get(self, key, default=None):
+        'The value of key, which becomes the most recently used, or default'
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.stats.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+class QueryCache(object):
+    '''
+    Caches of a MarkovLogicNetwork: networks maps keys of the model, the
+    evidence and the open-world predicates to GroundNetworks and results
+    maps keys of the model, the evidence, the query and the inference
+    method and options to query results.
+    '''
+    def __init__(self, max_networks=8, max_results=128):
+        self.networks = LRUCache(max_networks)
+        self.results = LRUCache(max_results)
+
+    def clear(self):
+        'Remove all entries (statistics are kept)'
+        self.networks.clear()
+        self.results.clear()
+
+    def __repr__(self):
+        return 'QueryCache(networks={!r}, results={!r})'.format(
+            self.networks.stats, self.results.stats)
+
+def _rename(terms, names):
+    'Terms whose variables are renamed to v0, v1, ... in order of appearance'
+    result = []
+    for t in terms:
+        if isinstance(t, Apply):
+            result.append(Apply(t.fun, _rename(t.args, names)))
+        elif isinstance(t, str) and t[:1].islower():
+            result.append(names.setdefault(t, 'v{}'.format(len(names))))
+        else:
+            result.append(t)
+    return tuple(result)
+
+# Types of option values which are compared by their representations
+_PLAIN = (bool, int, float, str, type(None))
+
+def query_key(atoms, method, options):
+    '''
+    A key of the query result of atoms (the atoms of a query formula) by
+    method with options, or None if an option is not a number, a string or
+    None. Query results only depend on the atoms up to renaming their
+    variables, so each atom is renamed apart and their order is ignored.
+    '''
+    if not all(isinstance(v, _PLAIN) for v in options.values()):
+        return None
+    renamed = frozenset(Atom(a.pred, _rename(a.args, {})) for a in atoms)
+    return (renamed, method, tuple(sorted(options.items())))
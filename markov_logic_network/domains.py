@@ -0,0 +1,92 @@
+'Typed domains of variables'
+
+from syntax import *
+
+__all__ = ['InvalidType', 'infer_types', 'literal_types', 'type_domains', 'variable_domains']
+
+class InvalidType(Exception):
+    'Type Error'
+
+def _bind(pred, args, types, env):
+    'Assign the declared types of pred to the variables in args'
+    if pred not in types:
+        return
+    declared = types[pred]
+    if len(declared) != len(args):
+        raise InvalidType('Arity of {} mismatch: {} arguments given'.format(pred, len(args)))
+    for t, ty in zip(args, declared):
+        if isinstance(t, str) and t[:1].islower():
+            if env.setdefault(t, ty) != ty:
+                raise InvalidType('Variable {} has types {} and {}'.format(t, env[t], ty))
+
+def infer_types(f, types, env=None):
+    '''
+    Infer types of the variables of a formula from the declarations types,
+    a map from predicates to tuples of argument types. Return a map from
+    variables to types; variables which only appear in undeclared
+    predicates or as arguments of functions are untyped.
+    '''
+    if env is None:
+        env = {}
+    stack = [f]
+    while stack:
+        g = stack.pop()
+        if isinstance(g, Atom):
+            _bind(g.pred, g.args, types, env)
+        elif isinstance(g, Not) or isinstance(g, Forall) or isinstance(g, Exists):
+            stack.append(g.f)
+        else:
+            stack.append(g.f2)
+            stack.append(g.f1)
+    return env
+
+def literal_types(lits, types):
+    'Infer types of the variables of a clause given as a list of (pred, args, sign)'
+    env = {}
+    for pred, args, _ in lits:
+        _bind(pred, args, types, env)
+    return env
+
+def type_domains(types, database, formulas=()):
+    '''
+    Collect the constants of each type: those at typed argument positions
+    of the evidence and of formulas. Return a map from types to lists of
+    constants in order of the constants of the database.
+    '''
+    members = {}
+    for pred, declared in types.items():
+        for args in database.tuples(pred):
+            for c, ty in zip(args, declared):
+                members.setdefault(ty, set()).add(c)
+    extra = []
+    for f in formulas:
+        _formula_members(f, types, members, extra)
+    domains = {ty: [] for ty in set(types[p][i] for p in types for i in range(len(types[p])))}
+    for c in list(database.constants) + extra:
+        for ty, cs in members.items():
+            if c in cs:
+                domains[ty].append(c)
+                cs.discard(c)
+    return domains
+
+def _formula_members(f, types, members, extra):
+    stack = [f]
+    while stack:
+        g = stack.pop()
+        if isinstance(g, Atom):
+            for t, ty in zip(g.args, types.get(g.pred, ())):
+                if isinstance(t, str) and not t[:1].islower():
+                    members.setdefault(ty, set()).add(t)
+                    extra.append(t)
+        elif isinstance(g, Not) or isinstance(g, Forall) or isinstance(g, Exists):
+            stack.append(g.f)
+        else:
+            stack.append(g.f2)
+            stack.append(g.f1)
+
+def variable_domains(variable_types, domains):
+    '''
+    Map typed variables to the constants of their types in domains. Other
+    variables range over all constants.
+    '''
+    return {x: domains.get(ty, []) for x, ty in variable_types.items()}
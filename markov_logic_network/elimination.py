@@ -0,0 +1,184 @@
+'Exact inference by variable elimination on junction trees'
+
+import numpy as np
+from scipy.special import logsumexp
+from enumeration import InferenceError
+from mcsat import mcsat
+
+__all__ = ['elimination_order', 'junction_tree', 'variable_elimination']
+
+class _Factor(object):
+    'A table of log values over binary atoms (in increasing order), one axis per atom'
+    def __init__(self, atoms, table):
+        self.atoms = atoms
+        self.table = table
+
+    def expand(self, atoms):
+        'The table broadcastable over atoms, a sorted superset of the atoms of the factor'
+        shape = [2 if a in self.atoms else 1 for a in atoms]
+        return self.table.reshape(shape)
+
+    def marginalize(self, atoms):
+        'Sum out the atoms of the factor which are not in atoms'
+        axes = tuple(i for i, a in enumerate(self.atoms) if a not in atoms)
+        kept = [a for a in self.atoms if a in atoms]
+        return _Factor(kept, logsumexp(self.table, axis=axes) if axes else self.table)
+
+def _product(factors, atoms):
+    'The product of factors whose atoms are subsets of atoms'
+    table = np.zeros((2,) * len(atoms))
+    for f in factors:
+        table = table + f.expand(atoms)
+    return _Factor(atoms, table)
+
+def _clause_factor(atoms, signs, w):
+    'The factor of a clause of weight w, or None if it is a tautology'
+    literals = {}
+    for a, s in zip(atoms, signs):
+        if literals.setdefault(a, s) != s:
+            return None
+    if w == float('inf'):
+        sat, unsat = 0.0, -np.inf
+    elif w == -float('inf'):
+        sat, unsat = -np.inf, 0.0
+    else:
+        sat, unsat = w, 0.0
+    atoms = sorted(literals)
+    table = np.full((2,) * len(atoms), sat)
+    table[tuple(0 if literals[a] else 1 for a in atoms)] = unsat
+    return _Factor(atoms, table)
+
+def _neighbors(network):
+    'Sets of atoms which share clauses with each atom'
+    neighbors = [set() for _ in range(network.n_atoms)]
+    ptr, lits = network.clause_ptr, network.lits.tolist()
+    for j in range(network.n_clauses):
+        atoms = lits[ptr[j]:ptr[j+1]]
+        for a in atoms:
+            neighbors[a].update(atoms)
+    for a, n in enumerate(neighbors):
+        n.discard(a)
+    return neighbors
+
+def _fill(neighbors, a):
+    'Number of edges added among the neighbors of a by eliminating a'
+    ns = list(neighbors[a])
+    return sum(1 for i, b in enumerate(ns) for c in ns[i+1:] if c not in neighbors[b])
+
+def elimination_order(network, max_width=None):
+    '''
+    Order the atoms of a GroundNetwork for elimination by the min-fill
+    heuristic (ties are broken by degrees). Return the order and the width
+    of the order, the largest number of neighbors of an atom when it is
+    eliminated, which bounds the treewidth from above. If the width
+    exceeds max_width, the order stops at the atom which exceeds it.
+    '''
+    neighbors = _neighbors(network)
+    remaining = set(range(network.n_atoms))
+    fills = {a: _fill(neighbors, a) for a in remaining}
+    order = []
+    width = 0
+    while remaining:
+        a = min(remaining, key=lambda a: (fills[a], len(neighbors[a]), a))
+        ns = neighbors[a]
+        width = max(width, len(ns))
+        if max_width is not None and width > max_width:
+            order.append(a)
+            break
+        for b in ns:
+            neighbors[b].discard(a)
+            neighbors[b].update(c for c in ns if c != b)
+        affected = set(ns)
+        for b in ns:
+            affected.update(neighbors[b])
+        remaining.discard(a)
+        order.append(a)
+        for b in affected:
+            if b in remaining:
+                fills[b] = _fill(neighbors, b)
+    return order, width
+
+def junction_tree(network, order):
+    '''
+    Build the junction tree of eliminating the atoms of a GroundNetwork in
+    order. Cluster i consists of the i-th atom of order and its neighbors
+    when it is eliminated, and its parent is the cluster of the first of
+    these neighbors to be eliminated (-1 for roots). Return the lists of
+    clusters (sorted lists of atoms) and parents.
+    '''
+    neighbors = _neighbors(network)
+    position = np.empty(network.n_atoms, dtype=np.int64)
+    position[order] = np.arange(len(order))
+    clusters, parents = [], []
+    for a in order:
+        ns = neighbors[a]
+        for b in ns:
+            neighbors[b].discard(a)
+            neighbors[b].update(c for c in ns if c != b)
+        clusters.append(sorted(ns | set([a])))
+        parents.append(min(position[b] for b in ns) if ns else -1)
+    return clusters, parents
+
+def variable_elimination(network, max_width=16, fallback=mcsat, **options):
+    '''
+    Compute marginal probabilities of the atoms of a GroundNetwork exactly
+    by sum-product message passing on the junction tree of a min-fill
+    elimination order, with factor tables in log space. Return an array of
+    probabilities indexed by atom ids.
+
+    If the width of the order is more than max_width, the network is passed
+    to the ground inference method fallback called with options, or an
+    InferenceError is raised if fallback is None.
+    '''
+    weights = network.weights
+    lengths = network.clause_lengths()
+    if np.any((lengths == 0) & np.isinf(weights) & (weights > 0)):
+        raise InferenceError('Hard clauses are unsatisfiable')
+    order, width = elimination_order(network, max_width)
+    if width > max_width:
+        if fallback is None:
+            raise InferenceError('Width of elimination order {} exceeds {}'.format(width, max_width))
+        return fallback(network, **options)
+    clusters, parents = junction_tree(network, order)
+    position = np.empty(network.n_atoms, dtype=np.int64)
+    position[order] = np.arange(len(order))
+
+    # Each clause is assigned to the cluster of its first eliminated atom
+    assigned = [[] for _ in clusters]
+    ptr, lits, signs = network.clause_ptr, network.lits, network.signs
+    for j in np.flatnonzero(lengths):
+        atoms = lits[ptr[j]:ptr[j+1]].tolist()
+        factor = _clause_factor(atoms, signs[ptr[j]:ptr[j+1]].tolist(), weights[j])
+        if factor is not None:
+            assigned[min(position[a] for a in atoms)].append(factor)
+    potentials = [_product(fs, c) for fs, c in zip(assigned, clusters)]
+
+    # Messages to parents in elimination order, then to children in reverse
+    up = [None] * len(clusters)
+    down = [None] * len(clusters)
+    children = [[] for _ in clusters]
+    for i, p in enumerate(parents):
+        if p >= 0:
+            children[p].append(i)
+    for i, c in enumerate(clusters):
+        if parents[i] >= 0:
+            f = _product([potentials[i]] + [up[k] for k in children[i]], c)
+            up[i] = f.marginalize([a for a in c if a != order[i]])
+    result = np.zeros(network.n_atoms)
+    for i in reversed(range(len(clusters))):
+        c = clusters[i]
+        incoming = [up[k] for k in children[i]]
+        if parents[i] >= 0:
+            incoming.append(down[i])
+        belief = _product([potentials[i]] + incoming, c)
+        marginal = belief.marginalize([order[i]]).table
+        logz = logsumexp(marginal)
+        if logz == -np.inf:
+            raise InferenceError('Hard clauses are unsatisfiable')
+        result[order[i]] = np.exp(marginal[1] - logz)
+        for k in children[i]:
+            others = [potentials[i]] + [up[m] for m in children[i] if m != k]
+            if parents[i] >= 0:
+                others.append(down[i])
+            down[k] = _product(others, c).marginalize(up[k].atoms)
+    return result
@@ -0,0 +1,43 @@
+'Exact inference by enumeration of all worlds'
+
+import numpy as np
+
+__all__ = ['InferenceError', 'simple_inference']
+
+class InferenceError(Exception):
+    'Inference Error'
+
+# Compute marginal probabilities of atoms of a GroundNetwork by enumerating
+# all configurations. Only for validation of other methods on small networks.
+def simple_inference(network, max_atoms=20, chunk=4096):
+    n = network.n_atoms
+    if n > max_atoms:
+        raise InferenceError('Too many ground atoms to enumerate: {}'.format(n))
+    weights = network.weights
+    hard = np.isinf(weights)
+    soft = np.where(hard, 0.0, weights)
+    starts = network.clause_ptr[:-1]
+    nonempty = network.clause_lengths() > 0     # empty clauses are false
+
+    logz, ref = -np.inf, 0.0
+    total = np.zeros(n)
+    for begin in range(0, 2**n, chunk):
+        worlds = np.arange(begin, min(begin + chunk, 2**n))
+        X = ((worlds[:, None] >> np.arange(n)) & 1).astype(bool)
+        sat = np.zeros((len(worlds), network.n_clauses), dtype=bool)
+        if len(network.lits):
+            sat[:, nonempty] = np.logical_or.reduceat(X[:, network.lits] == network.signs,
+                                                      starts[nonempty], axis=1)
+        logw = sat @ soft
+        logw[np.any(~sat[:, hard & (weights > 0)], axis=1)] = -np.inf
+        logw[np.any(sat[:, hard & (weights < 0)], axis=1)] = -np.inf
+        m = max(logz, logw.max())
+        if m == -np.inf:
+            continue
+        p = np.exp(logw - m)
+        total = total * np.exp(ref - m) + p @ X
+        logz = m + np.log(np.exp(logz - m) + p.sum())
+        ref = m
+    if logz == -np.inf:
+        raise InferenceError('Hard clauses are unsatisfiable')
+    return total / np.exp(logz - ref)
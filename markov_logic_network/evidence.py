@@ -0,0 +1,443 @@
+'Evidence database of ground atoms'
+
+import re
+import csv
+import hashlib
+import numpy as np
+from array import array
+from syntax import *
+
+__all__ = ['InvalidEvidence', 'Database', 'ColumnarDatabase', 'read_evidence',
+           'load_database']
+
+class InvalidEvidence(Exception):
+    'Invalid Evidence Error'
+
+def _ground_literal(atom, truth):
+    'The pair of the Atom and the truth value of a ground literal given as in Database.add'
+    if isinstance(atom, str):
+        atom = parse_formula(atom)
+    if isinstance(atom, Not):
+        atom, truth = atom.f, not truth
+    if not isinstance(atom, Atom):
+        raise InvalidEvidence('Not a ground literal: {}'.format(atom))
+    for c in atom.args:
+        if not _is_constant(c):
+            raise InvalidEvidence('Not a ground literal: {}'.format(atom))
+    return atom, truth
+
+def _is_constant(c):
+    'Constants begin with an uppercase letter as in formulas'
+    return isinstance(c, str) and c[:1].isupper()
+
+class Database(object):
+    '''
+    A set of ground atoms whose truth values are known.
+
+    Predicates which have some evidence are closed-world (ground atoms not
+    in the database are false) unless they are listed in open_world.
+    Predicates without any evidence are open-world. version counts the
+    changes of the evidence.
+    '''
+    def __init__(self, constants=(), atoms=(), open_world=()):
+        self.version = 0
+        self.constants = []
+        self._constant_set = set()
+        self.true = {}      # a map from predicates to sets of argument tuples
+        self.false = {}
+        self.open_world = set(open_world)
+        for c in constants:
+            self.add_constant(c)
+        for atom in atoms:
+            self.add(atom)
+
+    def add_constant(self, c):
+        if c not in self._constant_set:
+            self.version += 1
+            self._constant_set.add(c)
+            self.constants.append(c)
+
+    def add(self, atom, truth=True):
+        '''
+        Add a ground literal. atom is an Atom, Not(Atom) or its text
+        representation such as 'not Smokes(Anna)'.
+        '''
+        atom, truth = _ground_literal(atom, truth)
+        for c in atom.args:
+            self.add_constant(c)
+        self.version += 1
+        self.true.setdefault(atom.pred, set())
+        self.false.setdefault(atom.pred, set())
+        if truth:
+            self.false[atom.pred].discard(atom.args)
+            self.true[atom.pred].add(atom.args)
+        else:
+            self.true[atom.pred].discard(atom.args)
+            self.false[atom.pred].add(atom.args)
+
+    def retract(self, atom):
+        '''
+        Remove a ground atom (given as in add, whose sign is ignored) from
+        the database. Its predicate stays closed-world.
+        '''
+        atom, _ = _ground_literal(atom, True)
+        self.version += 1
+        self.true.get(atom.pred, set()).discard(atom.args)
+        self.false.get(atom.pred, set()).discard(atom.args)
+
+    def predicates(self):
+        return list(self.true)
+
+    def is_closed(self, pred):
+        return pred in self.true and pred not in self.open_world
+
+    def true_tuples(self, pred):
+        return self.true.get(pred, ())
+
+    def tuples(self, pred):
+        'Argument tuples of the atoms of pred in the database'
+        return list(self.true.get(pred, ())) + list(self.false.get(pred, ()))
+
+    def lookup(self, pred, args):
+        'Return the recorded truth value (True, False or None) of an atom'
+        if args in self.true.get(pred, ()):
+            return True
+        elif args in self.false.get(pred, ()):
+            return False
+        else:
+            return None
+
+    def truth(self, pred, args):
+        'Return True, False or None (unknown) under the closed-world assumption'
+        t = self.lookup(pred, args)
+        if t is None and self.is_closed(pred):
+            return False
+        return t
+
+    def fingerprint(self):
+        'A content hash of the constants and the evidence'
+        h = hashlib.sha256()
+        h.update(repr(self.constants).encode('utf-8'))
+        h.update(repr(sorted(self.open_world)).encode('utf-8'))
+        for pred in sorted(self.true):
+            h.update(repr((pred, sorted(self.true[pred]), sorted(self.false[pred]))).encode('utf-8'))
+        return h.hexdigest()
+
+    def __len__(self):
+        return sum(len(s) for s in self.true.values()) + \
+               sum(len(s) for s in self.false.values())
+
+# Alchemy .db lines: [!]Pred(Const, ...) with // comments
+_DB_LINE = re.compile(r'\s*(!?)\s*([A-Za-z_]\w*)\s*\((.*)\)\s*$')
+
+def _constant(c, lineno):
+    c = c.strip()
+    if len(c) >= 2 and c[0] == c[-1] == '"':
+        c = c[1:-1]
+    if not c:
+        raise InvalidEvidence('Empty constant at line {}'.format(lineno))
+    if not _is_constant(c):
+        raise InvalidEvidence('Not a constant at line {}: {}'.format(lineno, c))
+    return c
+
+def read_evidence(lines, format='db'):
+    '''
+    Parse evidence from an iterable of lines, one ground literal per line,
+    and yield (predicate, argument tuple, truth value).
+
+    format 'db' is the Alchemy database format ('Smokes(Anna)',
+    '!Friends(Anna, Bob)', '// comment'). Formats 'csv' and 'tsv' have the
+    predicate, optionally prefixed by '!', in the first column and the
+    arguments in the rest.
+    '''
+    if format == 'db':
+        for lineno, line in enumerate(lines, 1):
+            line = line.split('//', 1)[0]
+            if not line.strip():
+                continue
+            m = _DB_LINE.match(line)
+            if m is None:
+                raise InvalidEvidence('Syntax error at line {}: {}'.format(lineno, line.strip()))
+            neg, pred, args = m.groups()
+            args = tuple(_constant(c, lineno) for c in args.split(',')) if args.strip() else ()
+            yield pred, args, not neg
+    elif format in ('csv', 'tsv'):
+        reader = csv.reader(lines, delimiter=',' if format == 'csv' else '\t')
+        for row in reader:
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            pred = row[0].strip()
+            neg = pred.startswith('!')
+            if neg:
+                pred = pred[1:].strip()
+            yield pred, tuple(_constant(c, reader.line_num) for c in row[1:]), not neg
+    else:
+        raise ValueError('Unknown evidence format: {}'.format(format))
+
+def _void(keys):
+    'View the rows of a 2-d integer array as single comparable items'
+    keys = np.ascontiguousarray(keys)
+    return keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+
+def _unique_last(keys, truth):
+    'Sort rows stably by their bytes keeping the last of equal rows'
+    order = np.argsort(_void(keys), kind='stable')
+    keys, truth = keys[order], truth[order]
+    v = _void(keys)
+    last = np.ones(len(v), dtype=bool)
+    last[:-1] = v[1:] != v[:-1]
+    return keys[last], truth[last]
+
+def _merge(keys, truth, new_keys, new_truth):
+    'Merge sorted unique rows into sorted unique rows; the new ones override equal rows'
+    if not len(keys):
+        return new_keys, new_truth
+    v, w = _void(keys), _void(new_keys)
+    at = np.searchsorted(v, w)
+    found = at < len(v)
+    found[found] = v[at[found]] == w[found]
+    truth = truth.copy()
+    truth[at[found]] = new_truth[found]
+    rest = ~found
+    return (np.insert(keys, at[rest], new_keys[rest], axis=0),
+            np.insert(truth, at[rest], new_truth[rest]))
+
+class _Column(object):
+    '''
+    Truth values of the ground atoms of one predicate: rows of constant ids
+    sorted by their bytes, and a parallel array of truth values. Additions
+    are buffered, sorted into runs of one chunk each, and the runs are
+    merged into the rows on the next lookup; later additions override
+    earlier ones.
+    '''
+    def __init__(self, arity):
+        self.arity = arity
+        self.width = max(arity, 1)     # nullary atoms are stored as a row (0,)
+        self.keys = np.zeros((0, self.width), dtype=np.int32)
+        self.truth = np.zeros(0, dtype=bool)
+        self._ids = array('i')
+        self._truth = array('b')
+        self._runs = []
+        self._true = None
+
+    def append(self, ids, truth):
+        self._ids.extend(ids if ids else (0,))
+        self._truth.append(truth)
+
+    def pending(self):
+        return len(self._truth)
+
+    def seal(self):
+        'Sort the buffered additions into a run'
+        if not self._truth:
+            return
+        keys = np.frombuffer(self._ids, dtype=np.int32).reshape(-1, self.width).copy()
+        truth = np.frombuffer(self._truth, dtype=np.int8).astype(bool)
+        self._ids, self._truth = array('i'), array('b')
+        self._runs.append(_unique_last(keys, truth))
+
+    def flush(self):
+        'Merge the runs into the sorted rows'
+        self.seal()
+        if not self._runs:
+            return
+        if len(self._runs) == 1:
+            keys, truth = self._runs[0]
+        else:
+            keys, truth = _unique_last(np.concatenate([k for k, _ in self._runs]),
+                                       np.concatenate([t for _, t in self._runs]))
+        self._runs = []
+        self.keys, self.truth = _merge(self.keys, self.truth, keys, truth)
+        self._true = None
+
+    def find(self, ids):
+        'Index of the row of ids or -1'
+        key = _void(np.array([ids if ids else (0,)], dtype=np.int32))
+        i = int(np.searchsorted(_void(self.keys), key)[0])
+        if i < len(self.keys) and tuple(self.keys[i]) == tuple(ids if ids else (0,)):
+            return i
+        return -1
+
+    def remove(self, ids):
+        'Remove the row of ids if any'
+        self.flush()
+        i = self.find(ids)
+        if i >= 0:
+            self.keys = np.delete(self.keys, i, axis=0)
+            self.truth = np.delete(self.truth, i)
+            self._true = None
+
+    def true_keys(self):
+        if self._true is None:
+            self._true = self.keys[self.truth][:, :self.arity]
+        return self._true
+
+    def __len__(self):
+        return len(self.truth)
+
+class _Tuples(object):
+    'Argument tuples of an array of constant ids, decoded on iteration'
+    def __init__(self, keys, constants):
+        self.keys = keys
+        self.constants = constants
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        constants = self.constants
+        for row in self.keys.tolist():
+            yield tuple(constants[i] for i in row)
+
+class ColumnarDatabase(object):
+    '''
+    A Database of ground atoms for large evidence. Constants are interned
+    into integer ids (and into the domain of their type when the argument
+    types of the predicate are given by types, a map from predicates to
+    tuples of type names), and each predicate keeps its atoms in a columnar
+    store of ids, so no Atom is built during ingest. It answers the same
+    queries as Database, and version counts the changes of the evidence.
+    '''
+    def __init__(self, types=None, open_world=(), chunk=65536):
+        self.version = 0
+        self.constants = []
+        self.constant_ids = {}
+        self.types = dict(types or {})
+        self.domains = {}   # a map from types to lists of constants
+        self._domain_sets = {}
+        self.open_world = set(open_world)
+        self.columns = {}
+        self.chunk = chunk
+
+    def add_constant(self, c, type=None):
+        i = self.constant_ids.get(c)
+        if i is None:
+            self.version += 1
+            i = self.constant_ids[c] = len(self.constants)
+            self.constants.append(c)
+        if type is not None:
+            members = self._domain_sets.setdefault(type, set())
+            if i not in members:
+                members.add(i)
+                self.domains.setdefault(type, []).append(c)
+        return i
+
+    def add(self, atom, truth=True):
+        'Add a ground literal given as in Database.add'
+        atom, truth = _ground_literal(atom, truth)
+        self.add_tuple(atom.pred, atom.args, truth)
+
+    def retract(self, atom):
+        '''
+        Remove a ground atom (given as in add, whose sign is ignored) from
+        the database. Its predicate stays closed-world.
+        '''
+        atom, _ = _ground_literal(atom, True)
+        self.version += 1
+        column = self._column(atom.pred)
+        if column is None or len(atom.args) != column.arity:
+            return
+        ids = [self.constant_ids.get(c) for c in atom.args]
+        if None not in ids:
+            column.remove(ids)
+
+    def add_tuple(self, pred, args, truth=True):
+        column = self.columns.get(pred)
+        if column is None:
+            column = self.columns[pred] = _Column(len(args))
+        elif column.arity != len(args):
+            raise InvalidEvidence('Arity mismatch of {}: {} arguments given'.format(pred, len(args)))
+        types = self.types.get(pred, ())
+        if types and len(types) != len(args):
+            raise InvalidEvidence('Arity mismatch of {}: {} arguments given'.format(pred, len(args)))
+        self.version += 1
+        column.append([self.add_constant(c, types[k] if types else None)
+                       for k, c in enumerate(args)], truth)
+        if column.pending() >= self.chunk:
+            column.seal()
+
+    def extend(self, records):
+        'Add (predicate, argument tuple, truth value) records'
+        for pred, args, truth in records:
+            self.add_tuple(pred, args, truth)
+
+    def _column(self, pred):
+        column = self.columns.get(pred)
+        if column is not None:
+            column.flush()
+        return column
+
+    def predicates(self):
+        return list(self.columns)
+
+    def is_closed(self, pred):
+        return pred in self.columns and pred not in self.open_world
+
+    def true_tuples(self, pred):
+        column = self._column(pred)
+        if column is None:
+            return ()
+        return _Tuples(column.true_keys(), self.constants)
+
+    def tuples(self, pred):
+        'Argument tuples of the atoms of pred in the database'
+        column = self._column(pred)
+        if column is None:
+            return ()
+        return _Tuples(column.keys[:, :column.arity], self.constants)
+
+    def lookup(self, pred, args):
+        'Return the recorded truth value (True, False or None) of an atom'
+        column = self._column(pred)
+        if column is None or len(args) != column.arity:
+            return None
+        ids = []
+        for c in args:
+            i = self.constant_ids.get(c)
+            if i is None:
+                return None
+            ids.append(i)
+        i = column.find(ids)
+        return None if i < 0 else bool(column.truth[i])
+
+    def truth(self, pred, args):
+        'Return True, False or None (unknown) under the closed-world assumption'
+        t = self.lookup(pred, args)
+        if t is None and self.is_closed(pred):
+            return False
+        return t
+
+    def fingerprint(self):
+        'A content hash of the constants and the evidence'
+        h = hashlib.sha256()
+        h.update(repr(self.constants).encode('utf-8'))
+        h.update(repr(sorted(self.open_world)).encode('utf-8'))
+        for pred in sorted(self.columns):
+            column = self._column(pred)
+            h.update(repr((pred, column.arity)).encode('utf-8'))
+            h.update(column.keys.tobytes())
+            h.update(column.truth.tobytes())
+        return h.hexdigest()
+
+    def __len__(self):
+        return sum(len(self._column(pred)) for pred in self.columns)
+
+_FORMATS = {'.db': 'db', '.csv': 'csv', '.tsv': 'tsv'}
+
+def load_database(source, format=None, types=None, open_world=(), db=None):
+    '''
+    Stream evidence into a ColumnarDatabase (a new one unless db is given).
+    source is a file name, whose extension tells the format if format is
+    not given, or an iterable of lines.
+    '''
+    if db is None:
+        db = ColumnarDatabase(types, open_world)
+    if isinstance(source, str):
+        if format is None:
+            ext = source[source.rfind('.'):].lower() if '.' in source else ''
+            format = _FORMATS.get(ext, 'db')
+        with open(source, newline='', encoding='utf-8') as f:
+            db.extend(read_evidence(f, format))
+    else:
+        db.extend(read_evidence(source, format or 'db'))
+    return db
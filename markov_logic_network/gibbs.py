@@ -0,0 +1,121 @@
+'Blocked Gibbs sampling of ground networks'
+
+import time
+import random
+import numpy as np
+from sat import ClauseState
+from mcsat import sample_sat
+
+__all__ = ['gibbs', 'color_atoms']
+
+def _edges(network):
+    'Pairs of atoms which appear in the same clause'
+    lengths = network.clause_lengths()
+    src, dst = [], []
+    for k in np.unique(lengths):
+        if k < 2:
+            continue
+        starts = network.clause_ptr[:-1][lengths == k]
+        atoms = network.lits[starts[:, None] + np.arange(k)]
+        for i in range(k):
+            for j in range(k):
+                if i != j:
+                    src.append(atoms[:, i])
+                    dst.append(atoms[:, j])
+    if not src:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(src), np.concatenate(dst)
+
+def color_atoms(network, seed=None):
+    '''
+    Color the atoms so that atoms in the same clause have different colors
+    (Jones-Plassmann: in each round, uncolored atoms whose random priorities
+    are larger than those of all uncolored neighbors get the next color).
+    Return an array of colors indexed by atom ids.
+    '''
+    n = network.n_atoms
+    src, dst = _edges(network)
+    priority = np.random.default_rng(seed).permutation(n)
+    colors = np.full(n, -1, dtype=np.int64)
+    color = 0
+    while np.any(colors < 0):
+        uncolored = colors < 0
+        live = uncolored[src] & uncolored[dst]
+        best = np.full(n, -1, dtype=np.int64)
+        np.maximum.at(best, src[live], priority[dst[live]])
+        chosen = uncolored & (priority > best)
+        colors[chosen] = color
+        color += 1
+    return colors
+
+def gibbs(network, burn_in=100, samples=1000, seed=None, init=None, stats=None):
+    '''
+    Estimate marginal probabilities of the atoms of a GroundNetwork by
+    Gibbs sampling. Return an array of probabilities indexed by atom ids.
+
+    Atoms of the same color share no clause, so their conditional
+    probabilities given the Markov blankets are independent and each color
+    block is resampled by one vectorized update. The estimates average the
+    conditional probabilities (Rao-Blackwellization). If stats (a
+    SamplerStats) is given, the flips are added to it.
+    '''
+    start = time.perf_counter()
+    n = network.n_atoms
+    total = np.zeros(n)
+    if n == 0:
+        return total
+    nprng = np.random.default_rng(seed)
+
+    # Start from a state which satisfies hard clauses
+    weights = network.weights
+    if init is None:
+        hard = np.isinf(weights) & (weights > 0)
+        cs = ClauseState(network, nprng.random(n) < 0.5, hard)
+        sample_sat(cs, [True] * n, random.Random(seed))
+        state = cs.assignment()
+        flips = cs.flips
+    else:
+        flips = 0
+        state = np.array(init, dtype=bool)
+
+    lits, signs = network.lits, network.signs
+    lit_clauses = network.literal_clauses()
+    lit_weights = np.where(signs, weights[lit_clauses], -weights[lit_clauses])
+    counts = np.bincount(lit_clauses, weights=state[lits] == signs,
+                         minlength=network.n_clauses).astype(np.int64)
+
+    # Literals of the atoms of each color block
+    colors = color_atoms(network, seed)
+    ptr, _, positions = network.atom_clauses()
+    blocks = []
+    for color in range(colors.max() + 1):
+        atoms = np.flatnonzero(colors == color)
+        degree = ptr[atoms + 1] - ptr[atoms]
+        local = np.repeat(np.arange(len(atoms)), degree)
+        offsets = np.arange(degree.sum()) - np.repeat(np.cumsum(degree) - degree, degree)
+        blocks.append((atoms, local, positions[np.repeat(ptr[atoms], degree) + offsets]))
+
+    for step in range(burn_in + samples):
+        for atoms, local, pos in blocks:
+            clauses = lit_clauses[pos]
+            others = counts[clauses] - (state[lits[pos]] == signs[pos])
+            contrib = np.where(others == 0, lit_weights[pos], 0.0)
+            with np.errstate(invalid='ignore', over='ignore'):
+                delta = np.bincount(local, weights=contrib, minlength=len(atoms))
+                p = 1.0 / (1.0 + np.exp(-delta))
+            p[np.isnan(p)] = 0.5
+            new = nprng.random(len(atoms)) < p
+            changed = new != state[atoms]
+            state[atoms] = new
+            if stats is not None:
+                flips += int(changed.sum())
+            moved = changed[local]
+            change = np.where(new[local] == signs[pos], 1, -1)[moved]
+            np.add.at(counts, clauses[moved], change)
+            if step >= burn_in:
+                total[atoms] += p
+    if stats is not None:
+        stats.flips += flips
+        stats.steps += burn_in + samples
+        stats.time += time.perf_counter() - start
+    return total / max(samples, 1)
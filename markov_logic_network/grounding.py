@@ -0,0 +1,398 @@
+'Lazy grounding of weighted first-order clauses'
+
+from syntax import *
+from normalize import ConjunctiveNormalForm
+from domains import literal_types, variable_domains
+from itertools import product
+
+__all__ = [
+    'GroundingStats', 'Grounder', 'weighted_clauses', 'formula_constants', 'formula_atoms',
+    'ground_atoms'
+    ]
+
+def _is_variable(t):
+    return isinstance(t, str) and t[:1].islower()
+
+def _literal(l):
+    'Translate Atom or Not(Atom) to a tuple (pred, args, sign)'
+    if isinstance(l, Not):
+        return (l.f.pred, l.f.args, False)
+    return (l.pred, l.args, True)
+
+def _variables(terms, vs):
+    'Append variables in terms to vs in order of appearance'
+    for t in terms:
+        if isinstance(t, Apply):
+            _variables(t.args, vs)
+        elif _is_variable(t) and t not in vs:
+            vs.append(t)
+    return vs
+
+def _variables_of(lits):
+    vs = []
+    for _, args, _ in lits:
+        _variables(args, vs)
+    return vs
+
+def _term_constants(terms, cs):
+    for t in terms:
+        if isinstance(t, Apply):
+            _term_constants(t.args, cs)
+        elif not _is_variable(t) and t not in cs:
+            cs.append(t)
+
+def formula_constants(f, cs=None):
+    'List constants which appear in given formula'
+    if cs is None:
+        cs = []
+    if isinstance(f, Atom):
+        _term_constants(f.args, cs)
+    elif isinstance(f, Not) or isinstance(f, Forall) or isinstance(f, Exists):
+        formula_constants(f.f, cs)
+    else:
+        formula_constants(f.f1, cs)
+        formula_constants(f.f2, cs)
+    return cs
+
+def formula_atoms(f, atoms=None):
+    'List atoms which appear in given formula'
+    if atoms is None:
+        atoms = []
+    if isinstance(f, Atom):
+        if f not in atoms:
+            atoms.append(f)
+    elif isinstance(f, Not) or isinstance(f, Forall) or isinstance(f, Exists):
+        formula_atoms(f.f, atoms)
+    else:
+        formula_atoms(f.f1, atoms)
+        formula_atoms(f.f2, atoms)
+    return atoms
+
+def ground_atoms(atom, constants, domains={}):
+    '''
+    Generate ground atoms of an atom whose variables range over constants,
+    or over domains[x] for variables x in domains.
+    '''
+    variables = _variables(atom.args, [])
+    for cs in product(*[domains.get(x, constants) for x in variables]):
+        env = dict(zip(variables, cs))
+        yield Atom(atom.pred, tuple(eval_term(env, constants, t) for t in atom.args))
+
+def weighted_clauses(mln, constants, types=None, domains=None, modes=None, aux_types=None,
+                     sizes=None):
+    '''
+    Translate a list of (formula, weight) to a list of (clause, weight).
+    The weight of a formula is divided equally among its clauses.
+
+    modes is a list of ConjunctiveNormalForm modes of formulas (default
+    'distribute'). Definitions of auxiliary atoms are hard clauses, and
+    the argument types of auxiliary predicates are stored in aux_types.
+    The numbers of clauses, definitions and their literals of each formula
+    are appended to the list sizes as triples.
+    '''
+    result = []
+    for i, (f, w) in enumerate(mln):
+        mode = modes[i] if modes else 'distribute'
+        cnf = ConjunctiveNormalForm(f, constants, types, domains, mode, name=str(i),
+                                    hard=w == float('inf'))
+        for clause in cnf.clauses:
+            result.append((clause, w / len(cnf.clauses)))
+        for clause in cnf.definitions:
+            result.append((clause, float('inf')))
+        if aux_types is not None:
+            aux_types.update(cnf.types)
+        if sizes is not None:
+            sizes.append((len(cnf.clauses), len(cnf.definitions),
+                          sum(len(c) for c in cnf.clauses + cnf.definitions)))
+    return result
+
+class GroundingStats(object):
+    'Counters of a grounding process'
+    def __init__(self):
+        self.total = 0      # number of all groundings
+        self.emitted = 0    # number of emitted ground clauses
+        self.falsified = 0  # number of groundings falsified by evidence
+
+    @property
+    def pruned(self):
+        'Number of groundings whose truth values are decided by evidence'
+        return self.total - self.emitted
+
+    def __repr__(self):
+        return 'GroundingStats(total={}, emitted={}, pruned={}, falsified={})'.format(
+                self.total, self.emitted, self.pruned, self.falsified)
+
+class Grounder(object):
+    '''
+    Enumerate ground clauses of weighted first-order clauses lazily.
+
+    Groundings which are satisfied by evidence are skipped. A negative
+    literal of a closed-world predicate can be false only for tuples in the
+    evidence, so such literals are evaluated first by hash joins on their
+    shared variables and the remaining variables are enumerated afterwards.
+    Literals whose truth values are known are removed from ground clauses.
+
+    If types (a map from predicates to tuples of argument types) and
+    domains (a map from types to lists of constants) are given, typed
+    variables only range over the constants of their types.
+    '''
+    def __init__(self, clauses, database, constants=None, functions={}, open_world=(),
+                 types=None, domains=None):
+        self.clauses = [([_literal(l) for l in c], w) for c, w in clauses]
+        self.database = database
+        if constants is None:
+            constants = database.constants
+        self.constants = list(constants)
+        self.functions = functions
+        self.open_world = set(open_world)
+        self.types = types or {}
+        self.domains = domains
+        self.stats = GroundingStats()
+        self._constant_set = set(self.constants)
+        self._domain_sets = {}
+
+    def ground(self):
+        'Generate ground clauses as pairs (literals, weight)'
+        for ground, w in self.ground_tuples():
+            yield [Atom(p, args) if s else Not(Atom(p, args)) for p, args, s in ground], w
+
+    def ground_tuples(self):
+        '''
+        Generate ground clauses as pairs (literals, weight) where literals
+        are tuples (pred, args, sign).
+        '''
+        for j, (_, w) in enumerate(self.clauses):
+            for ground in self.ground_clause(j):
+                yield ground, w
+
+    def clause_variables(self, j):
+        'Variables of the j-th clause in order of appearance'
+        return _variables_of(self.clauses[j][0])
+
+    def variable_domains(self, lits):
+        'A map from the typed variables of a clause to lists of constants'
+        if not self.types or self.domains is None:
+            return {}
+        return variable_domains(literal_types(lits, self.types), self.domains)
+
+    def clause_domains(self, j):
+        'Lists of constants which the variables of the j-th clause range over'
+        domains = self.variable_domains(self.clauses[j][0])
+        return [domains.get(x, self.constants) for x in self.clause_variables(j)]
+
+    def _domain_set(self, domain):
+        if domain is self.constants:
+            return self._constant_set
+        s = self._domain_sets.get(id(domain))
+        if s is None:
+            s = self._domain_sets[id(domain)] = set(domain)
+        return s
+
+    def is_closed(self, pred):
+        return pred not in self.open_world and self.database.is_closed(pred)
+
+    def truth(self, pred, args):
+        t = self.database.lookup(pred, args)
+        if t is None and self.is_closed(pred):
+            return False
+        return t
+
+    def ground_clause(self, j, leading=None, plan=None):
+        '''
+        Generate ground clauses of the j-th clause as lists of (pred, args,
+        sign) which do not contain evidence atoms. If leading = (x, cs) is
+        given, only groundings which bind variable x to one of cs are made,
+        and plan may be a join_plan of the clause with x bound, whose hash
+        indexes are then used instead of new ones. Groundings falsified by
+        evidence are dropped if the clause is soft and generated as empty
+        clauses if it is hard, which makes the ground network unsatisfiable.
+        '''
+        total = 1
+        for x, domain in zip(self.clause_variables(j), self.clause_domains(j)):
+            total *= len(leading[1]) if leading and x == leading[0] else len(domain)
+        self.stats.total += total
+        lits, w = self.clauses[j]
+        if plan is None:
+            envs = self.bindings(lits, leading=leading)
+        else:
+            envs = self._plan_bindings(plan, leading)
+        for env in envs:
+            ground = self._evaluate(lits, env)
+            if ground is None:
+                continue
+            if not ground:
+                self.stats.falsified += 1
+                if w != float('inf'):
+                    continue
+            self.stats.emitted += 1
+            yield ground
+
+    def _plan_bindings(self, plan, leading):
+        base = dict(self.functions)
+        for c in leading[1]:
+            base[leading[0]] = c
+            for env in self.extend_plan(plan, base):
+                yield env
+
+    def ground_bindings(self, j):
+        '''
+        Generate pairs (binding, ground clause) of the groundings of the
+        j-th clause which are not satisfied by evidence, where binding is
+        the tuple of constants of clause_variables(j) and the ground clause
+        is as in ground_clause (empty if falsified).
+        '''
+        lits = self.clauses[j][0]
+        variables = self.clause_variables(j)
+        for env in self.bindings(lits):
+            ground = self._evaluate(lits, env)
+            if ground is not None:
+                yield tuple(env[x] for x in variables), ground
+
+    def extend_binding(self, j, partial):
+        '''
+        Generate all bindings of the j-th clause (as in ground_bindings)
+        which extend partial, a map from some variables to constants,
+        regardless of evidence
+        '''
+        variables = self.clause_variables(j)
+        domains = self.variable_domains(self.clauses[j][0])
+        for x, c in partial.items():
+            if c not in self._domain_set(domains.get(x, self.constants)):
+                return
+        free = [x for x in variables if x not in partial]
+        positions = [variables.index(x) for x in free]
+        binding = [partial.get(x) for x in variables]
+        for cs in product(*[domains.get(x, self.constants) for x in free]):
+            for i, c in zip(positions, cs):
+                binding[i] = c
+            yield tuple(binding)
+
+    def evaluate(self, j, binding):
+        '''
+        The ground clause of the j-th clause under binding (as given by
+        ground_bindings), or None if it is satisfied by evidence
+        '''
+        env = dict(self.functions)
+        env.update(zip(self.clause_variables(j), binding))
+        return self._evaluate(self.clauses[j][0], env)
+
+    def bindings(self, lits, true_literal=None, leading=None):
+        '''
+        Generate candidate variable bindings (as dicts) of a clause given as
+        a list of (pred, args, sign) under which every literal can be false,
+        except the true_literal-th literal which must be true if given.
+        Only literals used as join keys are guaranteed to have the required
+        truth values. If leading = (x, cs) is given, variable x ranges over
+        constants cs.
+        '''
+        variables = _variables_of(lits)
+        domains = self.variable_domains(lits)
+        steps = []
+        bound = set([leading[0]]) if leading else set()
+        generators = [ (p, args) for i, (p, args, s) in enumerate(lits)
+                if s == (i == true_literal) and self.is_closed(p)
+                and all(isinstance(t, str) for t in args) ]
+        generators.sort(key=lambda g: len(self.database.true_tuples(g[0])))
+        for p, args in generators:
+            steps.append(self._index(p, args, bound, domains))
+            bound.update(a for a in args if _is_variable(a))
+        free = [x for x in variables if x not in bound]
+
+        base = dict(self.functions)
+        for c in (leading[1] if leading else [None]):
+            if leading:
+                base[leading[0]] = c
+            for env in self._join(steps, base):
+                for cs in product(*[domains.get(x, self.constants) for x in free]):
+                    env.update(zip(free, cs))
+                    yield env
+
+    def join_plan(self, lits, bound=(), skip=None):
+        '''
+        Plan the bindings of a clause (as in bindings) which extend given
+        bindings of the variables bound, ignoring the skip-th literal. The
+        hash indexes of the evidence are built once, so that the plan can
+        be run by extend_plan for many bindings.
+        '''
+        domains = self.variable_domains(lits)
+        bound = set(bound)
+        steps = []
+        generators = [ (p, args) for i, (p, args, s) in enumerate(lits)
+                if i != skip and not s and self.is_closed(p)
+                and all(isinstance(t, str) for t in args) ]
+        generators.sort(key=lambda g: len(self.database.true_tuples(g[0])))
+        for p, args in generators:
+            steps.append(self._index(p, args, bound, domains))
+            bound.update(a for a in args if _is_variable(a))
+        free = [x for x in _variables_of(lits) if x not in bound]
+        return steps, free, [domains.get(x, self.constants) for x in free]
+
+    def extend_plan(self, plan, env):
+        'Generate the bindings (as dicts) of a plan of join_plan which extend env'
+        steps, free, domains = plan
+        for e in self._join(steps, dict(env)):
+            for cs in product(*domains):
+                e.update(zip(free, cs))
+                yield e
+
+    def _index(self, pred, args, bound, domains={}):
+        '''
+        Build a hash index of true tuples of pred keyed by arguments which
+        are constants or variables bound by previous steps. Tuples which
+        bind new variables to constants out of their domains are skipped.
+        '''
+        key_pos, new_pos, new_vars, check = [], [], [], []
+        seen = {}
+        for i, t in enumerate(args):
+            if not _is_variable(t) or t in bound:
+                key_pos.append(i)
+            elif t in seen:
+                check.append((seen[t], i))
+            else:
+                seen[t] = i
+                new_pos.append(i)
+                new_vars.append(t)
+        sets = [self._domain_set(domains.get(args[i], self.constants)) for i in new_pos]
+        index = {}
+        for tup in self.database.true_tuples(pred):
+            if all(tup[i] == tup[j] for i, j in check) and \
+                    all(tup[i] in s for i, s in zip(new_pos, sets)):
+                key = tuple(tup[i] for i in key_pos)
+                index.setdefault(key, []).append(tuple(tup[i] for i in new_pos))
+        return [args[i] for i in key_pos], new_vars, index
+
+    def _join(self, steps, env):
+        'Index nested loop join of the steps'
+        if not steps:
+            yield env
+            return
+        key_terms, new_vars, index = steps[0]
+        key = tuple(env.get(t, t) for t in key_terms)
+        for values in index.get(key, ()):
+            e = env.copy()
+            e.update(zip(new_vars, values))
+            for r in self._join(steps[1:], e):
+                yield r
+
+    def ground_args(self, args, env):
+        'Evaluate arguments of an atom under env'
+        return tuple(env.get(t, t) if isinstance(t, str)
+                     else eval_term(env, self._constant_set, t) for t in args)
+
+    def _evaluate(self, lits, env):
+        '''
+        Ground literals under env. Return None if the grounding is satisfied
+        by evidence, otherwise the list of literals of unknown atoms.
+        '''
+        ground = []
+        for pred, args, sign in lits:
+            args = self.ground_args(args, env)
+            t = self.truth(pred, args)
+            if t is None:
+                if (pred, args, not sign) in ground:
+                    return None
+                if (pred, args, sign) not in ground:
+                    ground.append((pred, args, sign))
+            elif t == sign:
+                return None
+        return ground
@@ -0,0 +1,176 @@
+'Incremental grounding of weighted first-order clauses under changing evidence'
+
+import numpy as np
+from syntax import *
+from network import GroundNetwork, NetworkBuilder
+
+__all__ = ['IncrementalGrounding']
+
+def _unify(args, ground):
+    '''
+    The map from the variables of args to constants under which args are
+    ground, or None if there is none. Function terms are not unified.
+    '''
+    env = {}
+    for t, c in zip(args, ground):
+        if isinstance(t, Apply):
+            continue
+        if t[:1].islower():
+            if env.setdefault(t, c) != c:
+                return None
+        elif t != c:
+            return None
+    return env
+
+class IncrementalGrounding(object):
+    '''
+    The ground clauses of a Grounder kept up to date while the evidence of
+    its database changes, without grounding all the clauses again.
+
+    Each grounding is identified by its clause and binding, and an index
+    maps atoms to the groundings whose ground clauses contain them. When an
+    atom whose truth value was unknown becomes evidence, only the ground
+    clauses found by the index change. Otherwise groundings satisfied by
+    the old evidence may no longer be, so the groundings in which some
+    literal unifies with the atom are evaluated again. The evidence must
+    change by adding, retracting or changing atoms over the constants and
+    the closed-world predicates of the Grounder. As in Grounder.ground,
+    groundings falsified by evidence are kept as empty clauses if their
+    clauses are hard and dropped otherwise.
+
+    Atoms keep their ids in the networks made by network, and state is an
+    array of truth values indexed by atom ids (e.g. of the last inference)
+    from which the next inference can start. version is left to the owner
+    to record the version of the evidence which the groundings reflect.
+    '''
+    def __init__(self, grounder):
+        self.grounder = grounder
+        self.state = None
+        self.version = None
+        self._atoms = NetworkBuilder()      # interns atoms only
+        self._slots = []        # (grounding, atom ids, signs) or None for free slots
+        self._free = []
+        self._groundings = {}   # a map from (clause, binding) to slots
+        self._index = {}        # a map from atom ids to sets of slots
+        self._network = None
+        self._clause_slots = None   # slots of the clauses of the last network
+        self._removed = set()
+        self._added = []
+        for j in range(len(grounder.clauses)):
+            for binding, ground in grounder.ground_bindings(j):
+                if self._kept(j, ground):
+                    self._insert((j, binding), ground)
+
+    def __len__(self):
+        return len(self._groundings)
+
+    def _kept(self, j, ground):
+        return ground is not None and (ground or self.grounder.clauses[j][1] == float('inf'))
+
+    def _insert(self, grounding, ground):
+        atoms = tuple(self._atoms.atom_id(pred, args) for pred, args, _ in ground)
+        entry = (grounding, atoms, tuple(sign for _, _, sign in ground))
+        if self._free:
+            slot = self._free.pop()
+            self._slots[slot] = entry
+        else:
+            slot = len(self._slots)
+            self._slots.append(entry)
+        self._groundings[grounding] = slot
+        for a in atoms:
+            self._index.setdefault(a, set()).add(slot)
+        self._added.append(slot)
+
+    def _remove(self, grounding):
+        slot = self._groundings.pop(grounding, None)
+        if slot is None:
+            return
+        for a in self._slots[slot][1]:
+            self._index[a].discard(slot)
+        self._slots[slot] = None
+        self._free.append(slot)
+        self._removed.add(slot)
+
+    def affected(self, pred, args, known):
+        '''
+        Groundings whose ground clauses may change when the truth value of
+        the atom pred(args) changes; known tells whether the truth value
+        was known before the change.
+        '''
+        result = set()
+        atom = self._atoms.find_atom(pred, args)
+        if atom is not None:
+            result.update(self._slots[slot][0] for slot in self._index.get(atom, ()))
+        if not known:
+            return result
+        grounder = self.grounder
+        for j, (lits, _) in enumerate(grounder.clauses):
+            for p, terms, _ in lits:
+                if p == pred:
+                    partial = _unify(terms, args)
+                    if partial is not None:
+                        result.update((j, b) for b in grounder.extend_binding(j, partial))
+        return result
+
+    def update(self, groundings):
+        '''
+        Evaluate groundings (as given by affected, after the evidence has
+        changed) again. Return the number of groundings evaluated.
+        '''
+        for grounding in groundings:
+            self._remove(grounding)
+            ground = self.grounder.evaluate(*grounding)
+            if self._kept(grounding[0], ground):
+                self._insert(grounding, ground)
+        return len(groundings)
+
+    def network(self):
+        '''
+        The GroundNetwork of the current ground clauses. Clauses which are
+        not changed keep their order, and clauses added since the last
+        network are appended.
+        '''
+        added = [s for s in dict.fromkeys(self._added) if self._slots[s] is not None]
+        if self._network is None:
+            kept_ptr = np.zeros(1, dtype=np.int64)
+            kept_lits = np.zeros(0, dtype=np.int32)
+            kept_signs = np.zeros(0, dtype=bool)
+            kept_weights = np.zeros(0)
+            kept_slots = np.zeros(0, dtype=np.int64)
+        else:
+            old = self._network
+            keep = ~np.isin(self._clause_slots, list(self._removed))
+            lengths = old.clause_lengths()[keep]
+            kept_ptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=kept_ptr[1:])
+            lit_keep = keep[old.literal_clauses()]
+            kept_lits, kept_signs = old.lits[lit_keep], old.signs[lit_keep]
+            kept_weights = old.weights[keep]
+            kept_slots = self._clause_slots[keep]
+
+        clauses = self.grounder.clauses
+        new_lits = [a for s in added for a in self._slots[s][1]]
+        new_signs = [x for s in added for x in self._slots[s][2]]
+        new_lengths = np.array([len(self._slots[s][1]) for s in added], dtype=np.int64)
+        new_weights = np.array([clauses[self._slots[s][0][0]][1] for s in added], dtype=float)
+
+        atoms = self._atoms.build()
+        self._network = GroundNetwork(
+            atoms.predicates, atoms.constants, atoms.atom_pred, atoms.atom_ptr, atoms.atom_args,
+            np.concatenate([kept_ptr, kept_ptr[-1] + np.cumsum(new_lengths)]),
+            np.concatenate([kept_lits, np.array(new_lits, dtype=np.int32)]),
+            np.concatenate([kept_signs, np.array(new_signs, dtype=bool)]),
+            np.concatenate([kept_weights, new_weights]))
+        self._clause_slots = np.concatenate([kept_slots, np.array(added, dtype=np.int64)])
+        self._removed = set()
+        self._added = []
+        return self._network
+
+    def initial_state(self, n_atoms):
+        'The state extended to n_atoms atoms by false atoms, or None if there is no state'
+        if self.state is None:
+            return None
+        state = np.zeros(n_atoms, dtype=bool)
+        k = min(n_atoms, len(self.state))
+        state[:k] = self.state[:k]
+        return state
@@ -1,16 +1,41 @@
-import pandas as pd
-from itertools import product
+'Inference engines for ground networks'
 
-# Compute probability P(f1|f2, mln) using specified method.
-def simple_inference(mln, f1, f2):
-    ground_atoms = mln.ground_atoms()
-    ground_clauses = mln.ground_clauses()
-
-    # Generate all configurations
-    dim = len(ground_atoms)
-    X = pd.DataFrame(columns=ground_atoms, data=list(product([1,0], repeat=dim)))
-    print(X)
+from mcsat import mcsat
+from gibbs import gibbs
+from maxwalksat import maxwalksat
+from enumeration import InferenceError, simple_inference
+from lifted import deduplicated_inference
+from bp import belief_propagation
+from wmc import wmc
+from elimination import variable_elimination
+from lazy import lazy_mcsat, lazy_maxwalksat
 
 methods = {
-    'simple': simple_inference
+    'simple': simple_inference,
+    'mcsat': mcsat,
+    'gibbs': gibbs,
+    'dedup': deduplicated_inference,
+    'bp': belief_propagation,
+    'wmc': wmc,
+    'elimination': variable_elimination,
+}
+
+# Methods which compute the most probable state of a GroundNetwork
+map_methods = {
+    'maxwalksat': maxwalksat,
+}
+
+# Methods which count their flips in a SamplerStats given as option stats
+sampling_methods = set(['mcsat', 'gibbs', 'maxwalksat'])
+
+# Methods which start from a state given as option init
+warm_start_methods = set(['mcsat', 'gibbs', 'maxwalksat'])
+
+# Methods which run on a LazyNetwork, materializing clauses on demand
+lazy_methods = {
+    'mcsat': lazy_mcsat,
+}
+
+lazy_map_methods = {
+    'maxwalksat': lazy_maxwalksat,
 }
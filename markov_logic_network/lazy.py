@@ -0,0 +1,631 @@
+'Lazy inference which only grounds the clauses of active atoms (LazySAT)'
+
+import copy
+import math
+import time
+import random
+import numpy as np
+from syntax import *
+from network import NetworkBuilder
+from incremental import _unify
+
+__all__ = ['LazyNetwork', 'LazyClauseState', 'lazy_maxwalksat', 'lazy_mcsat']
+
+# Default cost of violating a hard clause, as the total weight is unknown
+HARD_WEIGHT = 1e6
+
+class _DefaultFalse(object):
+    'A view of a database under which the atoms of unknown truth values are false'
+    def __init__(self, database):
+        self.database = database
+
+    def is_closed(self, pred):
+        return True
+
+    def true_tuples(self, pred):
+        return self.database.true_tuples(pred)
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + math.exp(min(-x, 700.0)))
+
+class LazyNetwork(object):
+    '''
+    The ground clauses of a Grounder which can become unsatisfied while
+    the atoms of unknown truth values are false by default, except active
+    atoms which may be true. Ground clauses are materialized on demand:
+
+    - initially no atom is active, and the active clauses are the ground
+      clauses without negative literals of unknown atoms (the only ones
+      which can be unsatisfied when unknown atoms are false)
+    - activating an atom grounds the clauses in which it appears
+      negatively with the atom bound, and keeps those whose other negative
+      literals are of active atoms
+    - deactivating a false atom drops those clauses, which it satisfies
+
+    So every ground clause which is not active is satisfied by a negative
+    literal of an inactive atom, and memory grows with the active atoms
+    and clauses rather than with all groundings. A watched network (see
+    watch) also keeps the groundings with one negative literal of an
+    inactive atom, which flipping that atom can violate. A clause of
+    negative weight w is replaced by the unit clauses of its negated
+    literals of weight -w divided among them (as Alchemy does), so that no
+    clause is violated by default; this is exact for unit clauses.
+
+    Atoms are numbered in order of materialization, and clauses by slots
+    which are reused after their clauses are dropped (reused lists the
+    slots reused since a LazyClauseState last followed the network). The
+    clause of slot j consists of atoms clause_atoms[j] whose signs are
+    clause_signs[j] and has weight weights[j]; free slots have no atoms
+    and weight 0. atom_clauses[a] lists the pairs (slot, sign) of the
+    literals of atom a, degree[a] counts those in clauses other than the
+    negative units of a, and active_atoms lists the active atoms. Unless
+    the network is watched, inactive atoms only occur positively in
+    materialized clauses.
+    '''
+    def __init__(self, grounder):
+        clauses = []
+        for lits, w in grounder.clauses:
+            if w < 0:
+                clauses.extend(([(p, args, not s)], -w / len(lits)) for p, args, s in lits)
+            elif w > 0:
+                clauses.append((lits, w))
+        self.grounder = copy.copy(grounder)
+        self.grounder.clauses = clauses
+        self.clause_atoms = []
+        self.clause_signs = []
+        self.weights = []
+        self.atom_clauses = []
+        self.active = []
+        self.degree = []
+        self.active_atoms = []
+        self.reused = []
+        self._positions = {}    # a map from active atoms to positions in active_atoms
+        self._atoms = NetworkBuilder()      # interns atoms only
+        self._keys = []
+        self._groundings = {}   # a map from (clause, binding) to slots
+        self._slot_groundings = []
+        self._free = []
+        self._plans = {}        # a map from predicates to join plans of their negative literals
+        self.depth = 0          # number of negative literals of inactive atoms kept in clauses
+        self._falsified = False     # whether evidence falsifies a hard grounding
+
+        view = self._view = copy.copy(self.grounder)
+        view.database = _DefaultFalse(grounder.database)
+        view.open_world = set()
+        for j, (lits, _) in enumerate(clauses):
+            variables = view.clause_variables(j)
+            for env in view.bindings(lits):
+                self._add((j, tuple(env[x] for x in variables)))
+
+    @property
+    def n_atoms(self):
+        return len(self._keys)
+
+    @property
+    def n_clauses(self):
+        'Number of materialized clauses'
+        return len(self.weights) - len(self._free)
+
+    @property
+    def n_slots(self):
+        return len(self.weights)
+
+    def atom(self, i):
+        'Return the i-th ground atom as an Atom'
+        return Atom(*self._keys[i])
+
+    def atom_id(self, atom):
+        'Return the id of given Atom or None if it has not been materialized'
+        return self._atoms.find_atom(atom.pred, atom.args)
+
+    def _atom_id(self, pred, args):
+        i = self._atoms.atom_id(pred, args)
+        if i == len(self._keys):
+            self._keys.append((pred, args))
+            self.atom_clauses.append([])
+            self.active.append(False)
+            self.degree.append(0)
+        return i
+
+    def _add(self, grounding, atom=None):
+        '''
+        Materialize a grounding if it is not yet and its ground clause is
+        not decided by evidence and has at most depth negative literals of
+        inactive atoms other than atom (pred, args)
+        '''
+        if grounding in self._groundings:
+            return
+        ground = self.grounder.evaluate(*grounding)
+        if not ground:
+            if ground is not None and self.grounder.clauses[grounding[0]][1] == float('inf'):
+                self._falsified = True
+            return
+        if len(ground) == 1 and not ground[0][2] and not self._live(*ground[0][:2]):
+            return      # the prior of an atom which is not live (see prior)
+        inactive = 0
+        for pred, args, sign in ground:
+            if not sign and (pred, args) != atom:
+                i = self._atoms.find_atom(pred, args)
+                if i is None or not self.active[i]:
+                    inactive += 1
+                    if inactive > self.depth:
+                        return
+        atoms = tuple(self._atom_id(pred, args) for pred, args, _ in ground)
+        signs = tuple(sign for _, _, sign in ground)
+        w = self.grounder.clauses[grounding[0]][1]
+        if self._free:
+            j = self._free.pop()
+            self.clause_atoms[j], self.clause_signs[j], self.weights[j] = atoms, signs, w
+            self._slot_groundings[j] = grounding
+            self.reused.append(j)
+        else:
+            j = len(self.weights)
+            self.clause_atoms.append(atoms)
+            self.clause_signs.append(signs)
+            self.weights.append(w)
+            self._slot_groundings.append(grounding)
+        self._groundings[grounding] = j
+        for a, s in zip(atoms, signs):
+            self.atom_clauses[a].append((j, s))
+        if len(atoms) > 1 or signs[0]:
+            for a in atoms:
+                self.degree[a] += 1
+                if self.depth and self.degree[a] == 1 and not self.active[a]:
+                    self._add_units(self._keys[a])
+
+    def contradiction(self):
+        'Whether evidence falsifies a grounding of a hard clause, so that no state satisfies the network'
+        return self._falsified
+
+    def _live(self, pred, args):
+        a = self._atoms.find_atom(pred, args)
+        return a is not None and (self.active[a] or self.degree[a] > 0)
+
+    def _add_units(self, key):
+        'Materialize the negative unit clauses of atom (pred, args)'
+        unit = key + (False,)
+        for grounding in self._negative_bindings(key):
+            ground = self.grounder.evaluate(*grounding)
+            if ground and len(ground) == 1 and tuple(ground[0]) == unit:
+                self._add(grounding)
+
+    def activate(self, a):
+        'Make atom a active and materialize its clauses. Return the number of new clauses'
+        if self.active[a]:
+            return 0
+        n = self.n_clauses
+        key = self._keys[a]
+        self.active[a] = True
+        for j, binding in self._negative_bindings(key):
+            self._add((j, binding), key)
+        self._positions[a] = len(self.active_atoms)
+        self.active_atoms.append(a)
+        return self.n_clauses - n
+
+    def deactivate(self, a):
+        '''
+        Make the active atom a, which must be false, inactive and drop the
+        clauses in which it appears negatively, except those whose other
+        negative literals are of active atoms if the network is watched,
+        and the negative unit clauses of the atoms which are no longer
+        live. Return their slots.
+        '''
+        if not self.active[a]:
+            return []
+        self.active[a] = False
+        dropped = set(j for j, s in self.atom_clauses[a]
+                      if not s and self._inactive(j) > self.depth)
+        atoms = set(b for j in dropped for b in self.clause_atoms[j])
+        atoms.add(a)
+        for j in dropped:
+            if len(self.clause_atoms[j]) > 1 or self.clause_signs[j][0]:
+                for b in self.clause_atoms[j]:
+                    self.degree[b] -= 1
+        for b in atoms:
+            if not self.active[b] and not self.degree[b]:
+                dropped.update(j for j, s in self.atom_clauses[b]
+                               if not s and len(self.clause_atoms[j]) == 1)
+        for b in atoms:
+            self.atom_clauses[b] = [(j, s) for j, s in self.atom_clauses[b] if j not in dropped]
+        for j in dropped:
+            del self._groundings[self._slot_groundings[j]]
+            self._slot_groundings[j] = None
+            self.clause_atoms[j], self.clause_signs[j], self.weights[j] = (), (), 0.0
+            self._free.append(j)
+        i = self._positions.pop(a)
+        last = self.active_atoms.pop()
+        if last != a:
+            self.active_atoms[i] = last
+            self._positions[last] = i
+        return sorted(dropped)
+
+    def watch(self):
+        '''
+        Keep the groundings which flipping one inactive atom can violate,
+        those with one negative literal of an inactive atom, materialized
+        as well, except the negative unit clauses of the atoms which are
+        not live (see live_atoms): those are materialized while their atom
+        is. Then the change of the cost by flipping any atom is exact, and
+        the atoms which are not live are independent of the others (see
+        prior). Return the number of new clauses.
+        '''
+        if self.depth:
+            return 0
+        n = self.n_clauses
+        self.depth = 1
+        for a in self.live_atoms():
+            self._add_units(self._keys[a])
+        grounder, view = self.grounder, self._view
+        for j, (lits, _) in enumerate(grounder.clauses):
+            variables = grounder.clause_variables(j)
+            for i, (pred, _, sign) in enumerate(lits):
+                if not sign and not grounder.is_closed(pred):
+                    for env in view.extend_plan(view.join_plan(lits, skip=i), {}):
+                        self._add((j, tuple(env[x] for x in variables)))
+        for a in list(self.active_atoms):
+            for grounding in self._negative_bindings(self._keys[a]):
+                self._add(grounding)
+        return self.n_clauses - n
+
+    def _inactive(self, j):
+        'Number of negative literals of inactive atoms of the clause of slot j'
+        active = self.active
+        return sum(1 for b, s in zip(self.clause_atoms[j], self.clause_signs[j])
+                   if not s and not active[b])
+
+    def live_atoms(self):
+        'Atoms which are active or appear in materialized clauses other than their negative units'
+        active, degree = self.active, self.degree
+        return [a for a in range(self.n_atoms) if active[a] or degree[a]]
+
+    def prior(self, atom):
+        '''
+        Probability that a ground atom is true given its negative unit
+        clauses only, which is its marginal if it is not live in a watched
+        network
+        '''
+        key = (atom.pred, atom.args)
+        if self._live(*key):
+            a = self._atoms.find_atom(*key)
+            return _sigmoid(-sum(self.weights[j] for j, s in self.atom_clauses[a]
+                                 if not s and len(self.clause_atoms[j]) == 1))
+        unit = key + (False,)
+        weight = 0.0
+        for j, binding in self._negative_bindings(key):
+            ground = self.grounder.evaluate(j, binding)
+            if ground and len(ground) == 1 and tuple(ground[0]) == unit:
+                weight += self.grounder.clauses[j][1]
+        return _sigmoid(-weight)
+
+    def _plans_of(self, pred):
+        plans = self._plans.get(pred)
+        if plans is None:
+            grounder = self.grounder
+            plans = self._plans[pred] = []
+            for j, (lits, _) in enumerate(grounder.clauses):
+                for i, (p, terms, sign) in enumerate(lits):
+                    if p == pred and not sign:
+                        bound = [t for t in terms if isinstance(t, str) and t[:1].islower()]
+                        plans.append((j, terms, grounder.join_plan(lits, bound, skip=i)))
+        return plans
+
+    def _negative_bindings(self, key):
+        '''
+        Generate the pairs (clause, binding) of the groundings in which atom
+        (pred, args) may appear negatively and which evidence does not
+        satisfy
+        '''
+        pred, args = key
+        variables = self.grounder.clause_variables
+        seen = set()
+        for j, terms, plan in self._plans_of(pred):
+            partial = _unify(terms, args)
+            if partial is None:
+                continue
+            xs = variables(j)
+            for env in self.grounder.extend_plan(plan, partial):
+                grounding = (j, tuple(env[x] for x in xs))
+                if grounding not in seen:
+                    seen.add(grounding)
+                    yield grounding
+
+    def grounding(self, j):
+        'The pair (clause, binding) of the clause of slot j'
+        return self._slot_groundings[j]
+
+class LazyClauseState(object):
+    '''
+    A truth assignment of the atoms of a LazyNetwork with the number of
+    true literals of each clause, which follows the network as it changes
+    (new atoms are false). Clause j costs cost(j) when it is unsatisfied,
+    where cost is a function called once per clause per reset; unsat is
+    the list of clauses which cost something, and cost is their total.
+    Inactive atoms (which are false) are activated before they are made
+    true, which keeps the cost exact.
+    '''
+    def __init__(self, network, cost):
+        self.network = network
+        self.flips = 0
+        self.reset([], cost)
+
+    def reset(self, state, cost):
+        'Set the assignment (padded by false atoms) and the cost function'
+        self.state = list(state) + [False] * (self.network.n_atoms - len(state))
+        self.cost_of = cost
+        self.counts = []
+        self.costs = []
+        self.unsat = []
+        self._where = []
+        self.cost = 0.0
+        del self.network.reused[:]
+        self._sync()
+
+    def _sync(self):
+        'Follow the clauses and atoms materialized since the last call'
+        network = self.network
+        self.state.extend([False] * (network.n_atoms - len(self.state)))
+        reused = [j for j in network.reused if j < len(self.counts)]
+        del network.reused[:]
+        n = len(self.counts)
+        self.counts.extend([0] * (network.n_slots - n))
+        self.costs.extend([0] * (network.n_slots - n))
+        self._where.extend([-1] * (network.n_slots - n))
+        for j in reused + list(range(n, network.n_slots)):
+            self._follow(j)
+
+    def _follow(self, j):
+        network, state = self.network, self.state
+        count = sum(1 for a, s in zip(network.clause_atoms[j], network.clause_signs[j])
+                    if state[a] == s)
+        self.counts[j] = count
+        self.costs[j] = self.cost_of(j) if network.clause_atoms[j] else 0
+        if count == 0 and self.costs[j] > 0:
+            self._violate(j)
+
+    def _violate(self, j):
+        self._where[j] = len(self.unsat)
+        self.unsat.append(j)
+        self.cost += self.costs[j]
+
+    def _satisfy(self, j):
+        i = self._where[j]
+        last = self.unsat.pop()
+        if last != j:
+            self.unsat[i] = last
+            self._where[last] = i
+        self._where[j] = -1
+        self.cost -= self.costs[j]
+
+    def activate(self, a):
+        self.network.activate(a)
+        self._sync()
+
+    def deactivate(self, a):
+        'Make the false atom a inactive (see LazyNetwork.deactivate)'
+        self._sync()
+        for j in self.network.deactivate(a):
+            if self._where[j] >= 0:
+                self._satisfy(j)
+            self.counts[j] = self.costs[j] = 0
+
+    def delta(self, a):
+        '''
+        Change of the cost of the materialized clauses by flipping a, which
+        is exact if a is active
+        '''
+        value = self.state[a]
+        counts, costs = self.counts, self.costs
+        d = 0.0
+        for j, s in self.network.atom_clauses[a]:
+            if counts[j] == 0:
+                d -= costs[j]
+            elif counts[j] == 1 and s == value:
+                d += costs[j]
+        return d
+
+    def flip(self, a):
+        'Flip the truth value of atom a'
+        if not self.network.active[a]:
+            self.activate(a)
+        value = not self.state[a]
+        self.state[a] = value
+        self.flips += 1
+        counts, costs = self.counts, self.costs
+        for j, s in self.network.atom_clauses[a]:
+            if s == value:
+                counts[j] += 1
+                if counts[j] == 1 and costs[j] > 0:
+                    self._satisfy(j)
+            else:
+                counts[j] -= 1
+                if counts[j] == 0 and costs[j] > 0:
+                    self._violate(j)
+
+    def assignment(self):
+        return np.array(self.state, dtype=bool)
+
+    def is_free(self, a):
+        '''
+        Whether the clauses of atom a other than its negative units are
+        satisfied by other atoms, so that a is independent of the rest
+        '''
+        value, counts, network = self.state[a], self.counts, self.network
+        for j, s in network.atom_clauses[a]:
+            if (s or len(network.clause_atoms[j]) > 1) and counts[j] == (1 if value == s else 0):
+                return False
+        return True
+
+    def probability(self, a):
+        '''
+        Probability that atom a is true given the others under the weights
+        of the materialized clauses, which is exact for a watched network
+        '''
+        value, counts, weights = self.state[a], self.counts, self.network.weights
+        x = 0.0
+        for j, s in self.network.atom_clauses[a]:
+            if counts[j] == (1 if value == s else 0):    # no other literal satisfies j
+                x += weights[j] if s else -weights[j]
+        return float(value) if math.isnan(x) else _sigmoid(x)
+
+    def constrained_atoms(self):
+        'Active atoms of the clauses which cost something'
+        network = self.network
+        atoms = set()
+        for j, cost in enumerate(self.costs):
+            if cost > 0:
+                atoms.update(a for a in network.clause_atoms[j] if network.active[a])
+        return sorted(atoms)
+
+def lazy_maxwalksat(network, tries=1, max_flips=100000, timeout=None, target=0.0,
+                    noise=0.5, hard_weight=HARD_WEIGHT, seed=None, stats=None):
+    '''
+    Search the most probable state of the atoms of a LazyNetwork by
+    MaxWalkSAT starting from the all-false state. Return a boolean array
+    indexed by the atom ids of the network, whose atoms are those
+    materialized by the search. See maxwalksat for the options.
+    '''
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    weights = network.weights
+    cost = lambda j: hard_weight if weights[j] == float('inf') else weights[j]
+    cs = LazyClauseState(network, cost)
+    deadline = None if timeout is None else time.time() + timeout
+    best_state, best_cost = [], float('inf')
+    for t in range(tries):
+        cs.reset([], cost)
+        state, try_best = list(cs.state), cs.cost
+        for flip in range(max_flips):
+            if try_best <= target or not cs.unsat:
+                break
+            if deadline is not None and flip % 1000 == 0 and time.time() > deadline:
+                break
+            atoms = network.clause_atoms[rng.choice(cs.unsat)]
+            if rng.random() < noise:
+                a = rng.choice(atoms)
+            else:
+                for a in atoms:
+                    cs.activate(a)
+                a = min(atoms, key=cs.delta)
+            cs.flip(a)
+            if cs.cost < try_best - 1e-9:
+                state, try_best = list(cs.state), cs.cost
+        if try_best < best_cost:
+            best_state, best_cost = state, try_best
+        if best_cost <= target or (deadline is not None and time.time() > deadline):
+            break
+    if stats is not None:
+        stats.flips += cs.flips
+        stats.steps += t + 1
+        stats.time += time.perf_counter() - start
+    result = np.zeros(network.n_atoms, dtype=bool)
+    result[:len(best_state)] = best_state
+    return result
+
+def _lazy_sample_sat(cs, rng, max_flips, p_sa, temperature, noise, walk=5.0):
+    '''
+    SampleSAT (see sample_sat) on a LazyClauseState whose simulated
+    annealing moves and final random walk only flip active atoms, so that
+    evaluating them materializes no clauses
+    '''
+    network = cs.network
+    active = network.active_atoms       # changes as atoms are activated
+    for _ in range(max_flips):
+        if not cs.unsat:
+            constrained = cs.constrained_atoms()
+            for _ in range(int(walk * len(constrained))):
+                a = rng.choice(constrained)
+                if cs.delta(a) <= 0:
+                    cs.flip(a)
+            return True
+        if active and rng.random() < p_sa:
+            a = rng.choice(active)
+            delta = cs.delta(a)
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                cs.flip(a)
+        else:
+            atoms = network.clause_atoms[rng.choice(cs.unsat)]
+            if rng.random() < noise:
+                cs.flip(rng.choice(atoms))
+            else:
+                cs.flip(min(atoms, key=cs.delta))
+    return not cs.unsat
+
+def _gibbs_sweep(cs, rng, atoms):
+    '''
+    Resample each of atoms of a LazyClauseState, whose state satisfies the
+    selected clauses (those which cost something), uniformly among its
+    values which keep them satisfied: it is flipped if it breaks none of
+    them, which delta tells exactly as the network is watched. Free atoms
+    (see LazyClauseState.is_free) are left as they are whatever their
+    values, as the atoms out of the sweep are.
+    '''
+    for a in atoms:
+        if rng.random() < 0.5 and not cs.is_free(a) and cs.delta(a) <= 0:
+            cs.flip(a)
+
+def lazy_mcsat(network, burn_in=100, samples=1000, seed=None, max_flips=10000,
+               p_sa=0.5, temperature=0.5, noise=0.5, sweeps=1, stats=None):
+    '''
+    Estimate marginal probabilities of the atoms of a LazyNetwork by MC-SAT
+    (see mcsat), materializing clauses as atoms are activated. Return an
+    array of probabilities indexed by the atom ids of the network.
+
+    The network is watched (see LazyNetwork.watch), so the clauses which a
+    flip can violate are materialized, and inactive atoms are false. The
+    first state satisfies the hard clauses by SampleSAT (with options
+    max_flips, p_sa, temperature and noise). Each step then samples the
+    next state from the solutions of the selected clauses by sweeps Gibbs
+    sweeps over the live atoms (see LazyNetwork.live_atoms) starting from
+    the current state. The other atoms only appear in their negative unit
+    clauses, so they are independent of the rest like the free live
+    atoms, which the sweeps leave as they are. Each sample adds to the
+    marginal of an atom its probability given the others (see
+    LazyClauseState.probability and LazyNetwork.prior) rather than its
+    value. Atoms which are false at the end of a step are deactivated, so
+    memory follows the atoms which are true in the current state and the
+    groundings of at most one other inactive atom. The selection of a
+    clause materialized during a step is sampled when it is materialized,
+    from its satisfaction by the state at the start of the step.
+    '''
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    weights = network.weights
+    inf = float('inf')
+    previous = []
+
+    def satisfied(j):
+        return any((previous[a] if a < len(previous) else False) == s
+                   for a, s in zip(network.clause_atoms[j], network.clause_signs[j]))
+
+    def select(j):
+        w = weights[j]
+        return 1 if satisfied(j) and (w == inf or rng.random() < -math.expm1(-w)) else 0
+
+    network.watch()
+    cs = LazyClauseState(network, lambda j: 1 if weights[j] == inf else 0)
+    _lazy_sample_sat(cs, rng, max_flips, p_sa, temperature, noise)
+    counts = np.zeros(network.n_atoms)
+    live = np.zeros(network.n_atoms)      # number of samples in which atoms were live
+    for step in range(burn_in + samples):
+        previous = list(cs.state)
+        cs.reset(previous, select)
+        for _ in range(sweeps):
+            _gibbs_sweep(cs, rng, network.live_atoms())
+        if step >= burn_in:
+            if len(counts) < network.n_atoms:
+                grow = np.zeros(network.n_atoms - len(counts))
+                counts, live = np.concatenate([counts, grow]), np.concatenate([live, grow])
+            atoms = network.live_atoms()
+            counts[atoms] += [cs.probability(a) for a in atoms]
+            live[atoms] += 1
+        for a in [a for a in network.active_atoms if not cs.state[a]]:
+            cs.deactivate(a)
+    if stats is not None:
+        stats.flips += cs.flips
+        stats.steps += burn_in + samples
+        stats.time += time.perf_counter() - start
+    if len(counts) < network.n_atoms:
+        grow = np.zeros(network.n_atoms - len(counts))
+        counts, live = np.concatenate([counts, grow]), np.concatenate([live, grow])
+    priors = np.array([network.prior(network.atom(a)) for a in range(network.n_atoms)])
+    return (counts + priors * (samples - live)) / max(samples, 1)
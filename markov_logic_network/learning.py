@@ -0,0 +1,193 @@
+'Weight learning by pseudo-log-likelihood'
+
+import numpy as np
+from scipy import sparse, optimize
+from scipy.special import expit
+from syntax import *
+from normalize import ConjunctiveNormalForm
+from evidence import Database, ColumnarDatabase
+from grounding import Grounder
+from parallel import shards, leading, pool
+
+__all__ = ['TrainingDatabase', 'count_matrix', 'pseudo_log_likelihood', 'learn_weights',
+           'optimize_weights']
+
+class TrainingDatabase(object):
+    '''
+    Evidence of a training world joined with facts: the truth values of the
+    query predicates (those appearing in facts) are closed-world.
+    '''
+    def __init__(self, world, facts):
+        if not isinstance(facts, (Database, ColumnarDatabase)):
+            facts = Database(atoms=facts)
+        self.world = world
+        self.facts = facts
+        self.query_predicates = set(facts.predicates())
+        self.constants = list(world.constants)
+        known = set(self.constants)
+        self.constants.extend(c for c in facts.constants if c not in known)
+
+    def _db(self, pred):
+        return self.facts if pred in self.query_predicates else self.world
+
+    def is_closed(self, pred):
+        return True
+
+    def true_tuples(self, pred):
+        return self._db(pred).true_tuples(pred)
+
+    def tuples(self, pred):
+        return self._db(pred).tuples(pred)
+
+    def lookup(self, pred, args):
+        return self._db(pred).lookup(pred, args)
+
+class _AtomIndex(object):
+    'Deterministic ids of the ground atoms of query predicates'
+    def __init__(self, arities, constants):
+        self.constants = {c: i for i, c in enumerate(constants)}
+        self.offsets = {}
+        n = 0
+        for pred in sorted(arities):
+            self.offsets[pred] = (n, arities[pred])
+            n += len(constants) ** arities[pred]
+        self.size = n
+
+    def __contains__(self, pred):
+        return pred in self.offsets
+
+    def id(self, pred, args):
+        offset, _ = self.offsets[pred]
+        i = 0
+        for c in args:
+            i = i * len(self.constants) + self.constants[c]
+        return offset + i
+
+def _count_clause(grounder, atoms, j, leading=None):
+    '''
+    Accumulate the changes of the number of true groundings of the j-th
+    clause of grounder (scaled by its weight) by flipping each query atom
+    into a dict {atom id: change}. Only groundings with at most one true
+    literal change.
+    '''
+    lits, scale = grounder.clauses[j]
+    counts = {}
+    for true_literal in [None] + list(range(len(lits))):
+        for env in grounder.bindings(lits, true_literal, leading):
+            signs = {}
+            first = {}
+            for i, (pred, args, sign) in enumerate(lits):
+                key = (pred, grounder.ground_args(args, env))
+                if signs.setdefault(key, sign) != sign:
+                    break       # tautology
+                first.setdefault(key, i)
+            else:
+                true = [key for key, sign in signs.items()
+                        if bool(grounder.truth(*key)) == sign]
+                if true_literal is None and not true:
+                    for key in signs:
+                        if key[0] in atoms:
+                            i = atoms.id(*key)
+                            counts[i] = counts.get(i, 0.0) + scale
+                elif true_literal is not None and len(true) == 1 and \
+                        first[true[0]] == true_literal and true[0][0] in atoms:
+                    i = atoms.id(*true[0])
+                    counts[i] = counts.get(i, 0.0) - scale
+    return counts
+
+_worker = None      # (grounder, atoms) shared with worker processes
+
+def _init_worker(state):
+    global _worker
+    _worker = state
+
+def _count_task(task):
+    grounder, atoms = _worker
+    j, bounds = task
+    return j, _count_clause(grounder, atoms, j, leading(grounder, j, bounds))
+
+def count_matrix(mln, world, facts, constants=None, functions={}, processes=None,
+                 chunks=None, types=None, domains=None):
+    '''
+    Compute the sparse matrix D whose entry (l, i) is the change of the
+    number of true groundings of formula i caused by flipping the l-th
+    query atom of the training world. Rows are only kept for query atoms
+    whose flips change some count. When processes > 1, counting is sharded
+    by clause and by the binding of the leading variable of each clause.
+    Typed variables range over domains as in Grounder.
+    '''
+    db = TrainingDatabase(world, facts)
+    if constants is None:
+        constants = db.constants
+    clauses, formulas = [], []
+    for i, (f, _) in enumerate(mln):
+        cnf = ConjunctiveNormalForm(f, constants, types, domains).clauses
+        for clause in cnf:
+            clauses.append((clause, 1.0 / len(cnf)))
+            formulas.append(i)
+    grounder = Grounder(clauses, db, constants, functions, types=types, domains=domains)
+    arities = {}
+    for lits, _ in grounder.clauses:
+        for pred, args, _ in lits:
+            if pred in db.query_predicates:
+                arities[pred] = len(args)
+    atoms = _AtomIndex(arities, constants)
+
+    rows, cols, vals = [], [], []
+    def collect(j, counts):
+        rows.extend(counts)
+        cols.extend([formulas[j]] * len(counts))
+        vals.extend(counts.values())
+
+    if processes is not None and processes > 1:
+        tasks = shards(grounder, chunks or processes * 4)
+        with pool(processes, _init_worker, ((grounder, atoms),)) as executor:
+            for j, counts in executor.map(_count_task, tasks):
+                collect(j, counts)
+    else:
+        for j in range(len(clauses)):
+            collect(j, _count_clause(grounder, atoms, j))
+
+    rows = np.array(rows, dtype=np.int64)
+    used, rows = np.unique(rows, return_inverse=True)
+    D = sparse.csr_matrix((np.array(vals), (rows, np.array(cols, dtype=np.int64))),
+                          shape=(len(used), len(mln)))
+    D.sum_duplicates()
+    D.eliminate_zeros()
+    return D
+
+def pseudo_log_likelihood(w, D):
+    '''
+    Pseudo-log-likelihood (up to a constant) and its gradient.
+    log P(x_l | MB(x_l)) = -log(1 + exp(w . D_l))
+    '''
+    s = D @ w
+    pll = -np.logaddexp(0, s).sum()
+    grad = -(D.T @ expit(s))
+    return pll, grad
+
+def learn_weights(mln, world, facts, constants=None, functions={}, processes=None,
+                  prior_stdev=10.0, max_iterations=1000, types=None, domains=None):
+    '''
+    Learn weights of formulas of mln (a list of (formula, weight)) which
+    maximize the pseudo-log-likelihood of the training world by L-BFGS
+    with a Gaussian prior. Counts are precomputed once, so iterations do
+    not ground the formulas again. Return the list of weights.
+    '''
+    D = count_matrix(mln, world, facts, constants, functions, processes,
+                     types=types, domains=domains)
+    return optimize_weights(D, [w for _, w in mln], prior_stdev, max_iterations)
+
+def optimize_weights(D, w0, prior_stdev=10.0, max_iterations=1000):
+    '''
+    Maximize the pseudo-log-likelihood of the count matrix D (see
+    count_matrix) with a Gaussian prior by L-BFGS starting from the weights
+    w0. Return the list of weights.
+    '''
+    def objective(w):
+        pll, grad = pseudo_log_likelihood(w, D)
+        return -pll + w @ w / (2 * prior_stdev**2), -grad + w / prior_stdev**2
+    w0 = np.array(w0, dtype=float)
+    result = optimize.minimize(objective, w0, jac=True, method='L-BFGS-B',
+                               options={'maxiter': max_iterations})
+    return [float(w) for w in result.x]
@@ -0,0 +1,155 @@
+'Symmetries of ground networks: color passing and ground component deduplication'
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from network import GroundNetwork
+from enumeration import InferenceError, simple_inference
+from mcsat import mcsat
+
+__all__ = ['color_passing', 'components', 'subnetwork', 'deduplicated_inference']
+
+def _clause_literals(network):
+    'Lists of (atom, sign) of the clauses'
+    lits, signs, ptr = network.lits.tolist(), network.signs.tolist(), network.clause_ptr.tolist()
+    return [list(zip(lits[ptr[j]:ptr[j+1]], signs[ptr[j]:ptr[j+1]]))
+            for j in range(network.n_clauses)]
+
+def _relabel(signatures):
+    'Replace signatures by consecutive integers in order of first appearance'
+    ids = {}
+    return np.array([ids.setdefault(s, len(ids)) for s in signatures], dtype=np.int64)
+
+def color_passing(network, max_rounds=None):
+    '''
+    Partition the atoms and the clauses of a GroundNetwork into colors so
+    that atoms (clauses) of the same color are indistinguishable by their
+    neighborhoods. Clauses are first colored by their weights and atoms
+    all alike. Then each round recolors clauses by the colors and signs of
+    their literals and atoms by the colors of their clauses and their signs
+    in them, until the partitions are stable or max_rounds is reached.
+    Return the pair of arrays (atom colors, clause colors).
+    '''
+    clauses = _clause_literals(network)
+    occurrences = [[] for _ in range(network.n_atoms)]
+    for j, lits in enumerate(clauses):
+        for a, s in lits:
+            occurrences[a].append((j, s))
+    atom_colors = np.zeros(network.n_atoms, dtype=np.int64)
+    clause_colors = _relabel(network.weights.tolist())
+    n_colors = (1 if network.n_atoms else 0, len(set(clause_colors.tolist())))
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        ac, cc = atom_colors.tolist(), clause_colors.tolist()
+        clause_colors = _relabel([(cc[j], tuple(sorted((ac[a], s) for a, s in lits)))
+                                  for j, lits in enumerate(clauses)])
+        cc = clause_colors.tolist()
+        atom_colors = _relabel([(ac[a], tuple(sorted((cc[j], s) for j, s in occ)))
+                                for a, occ in enumerate(occurrences)])
+        rounds += 1
+        counts = (len(set(atom_colors.tolist())), len(set(cc)))
+        if counts == n_colors:
+            break
+        n_colors = counts
+    return atom_colors, clause_colors
+
+def components(network):
+    '''
+    Connected components of the atoms of a GroundNetwork, where atoms are
+    connected if they appear in the same clause. Return a pair of arrays
+    of the component labels of atoms and clauses (-1 for empty clauses).
+    '''
+    n = network.n_atoms
+    lengths = network.clause_lengths()
+    starts = network.clause_ptr[:-1]
+    firsts = np.repeat(network.lits[starts[lengths > 0]], lengths[lengths > 0])
+    graph = sparse.csr_matrix((np.ones(len(firsts)), (network.lits, firsts)), shape=(n, n))
+    _, atom_labels = connected_components(graph, directed=False)
+    clause_labels = np.full(network.n_clauses, -1, dtype=np.int64)
+    clause_labels[lengths > 0] = atom_labels[network.lits[starts[lengths > 0]]]
+    return atom_labels, clause_labels
+
+def _gather(ptr, items):
+    'The CSR pointers and positions of rows items of a CSR array'
+    lengths = ptr[items + 1] - ptr[items]
+    new_ptr = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_ptr[1:])
+    positions = np.repeat(ptr[items] - new_ptr[:-1], lengths) + np.arange(new_ptr[-1])
+    return new_ptr, positions
+
+def subnetwork(network, atoms, clauses):
+    '''
+    The GroundNetwork of the given clauses, whose atoms (which must contain
+    all atoms of the clauses) are renumbered in the order of atoms.
+    '''
+    atoms = np.asarray(atoms, dtype=np.int64)
+    clauses = np.asarray(clauses, dtype=np.int64)
+    index = np.full(network.n_atoms, -1, dtype=np.int32)
+    index[atoms] = np.arange(len(atoms))
+    atom_ptr, arg_positions = _gather(network.atom_ptr, atoms)
+    clause_ptr, lit_positions = _gather(network.clause_ptr, clauses)
+    return GroundNetwork(
+        network.predicates, network.constants,
+        network.atom_pred[atoms], atom_ptr, network.atom_args[arg_positions],
+        clause_ptr, index[network.lits[lit_positions]], network.signs[lit_positions],
+        network.weights[clauses])
+
+def _form(network, clauses, position):
+    '''
+    A canonical form of clauses whose atoms are replaced by their positions.
+    Clauses of the same forms are equal up to renaming of atoms.
+    '''
+    ptr, lits, signs, weights = network.clause_ptr, network.lits, network.signs, network.weights
+    return tuple(sorted(
+        (float(weights[j]), tuple(sorted(zip(position[lits[ptr[j]:ptr[j+1]]].tolist(),
+                                             signs[ptr[j]:ptr[j+1]].tolist()))))
+        for j in clauses))
+
+def deduplicated_inference(network, max_atoms=16, fallback=mcsat, **options):
+    '''
+    Compute marginal probabilities of the atoms of a GroundNetwork by
+    solving each class of isomorphic connected components once (ground
+    component deduplication). This is not lifted inference: the network
+    is fully ground, and no first-order counting is done within a
+    component.
+
+    Constants which are interchangeable in the model and the evidence
+    yield connected components of the ground network which are equal up to
+    renaming of atoms. Atoms of each component are ordered by their colors
+    (see color_passing), and components whose clauses are equal under this
+    order share one solution. Components with at most max_atoms atoms are
+    solved exactly by enumeration, and larger ones by the ground inference
+    method fallback called with options.
+    '''
+    weights = network.weights
+    empty = network.clause_lengths() == 0
+    if np.any(empty & np.isinf(weights) & (weights > 0)):
+        raise InferenceError('Hard clauses are unsatisfiable')
+    result = np.full(network.n_atoms, 0.5)
+    if network.n_atoms == 0:
+        return result
+
+    atom_colors, _ = color_passing(network)
+    atom_labels, clause_labels = components(network)
+    atom_order = np.lexsort((np.arange(network.n_atoms), atom_colors, atom_labels))
+    atom_bounds = np.searchsorted(atom_labels[atom_order], np.arange(atom_labels.max() + 2))
+    clause_order = np.argsort(clause_labels, kind='stable')
+    clause_bounds = np.searchsorted(clause_labels[clause_order], np.arange(atom_labels.max() + 2))
+
+    position = np.zeros(network.n_atoms, dtype=np.int64)
+    solutions = {}
+    for k in range(len(atom_bounds) - 1):
+        atoms = atom_order[atom_bounds[k]:atom_bounds[k+1]]
+        clauses = clause_order[clause_bounds[k]:clause_bounds[k+1]]
+        position[atoms] = np.arange(len(atoms))
+        form = _form(network, clauses, position)
+        marginals = solutions.get(form)
+        if marginals is None:
+            sub = subnetwork(network, atoms, clauses)
+            if sub.n_atoms <= max_atoms:
+                marginals = simple_inference(sub, max_atoms)
+            else:
+                marginals = fallback(sub, **options)
+            solutions[form] = marginals
+        result[atoms] = marginals
+    return result
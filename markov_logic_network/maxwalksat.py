@@ -0,0 +1,82 @@
+'MaxWalkSAT: MAP inference of ground networks'
+
+import time
+import random
+import numpy as np
+from sat import WeightedClauseState
+
+__all__ = ['maxwalksat']
+
+def maxwalksat(network, tries=1, max_flips=100000, timeout=None, target=0.0,
+               noise=0.5, hard_weight=None, seed=None, init=None, stats=None):
+    '''
+    Search the most probable state of the atoms of a GroundNetwork, i.e.
+    the state which minimizes the total weight of violated clauses.
+    Return a boolean array indexed by atom ids.
+
+    tries:       number of restarts (the first try starts from init if given)
+    max_flips:   flip budget of each try
+    timeout:     time budget in seconds for all tries
+    target:      stop as soon as the cost is not greater than target
+    noise:       probability of a random walk move
+    hard_weight: cost of violating a hard clause
+    stats:       a SamplerStats to which the flips and tries are added
+    '''
+    if tries < 1:
+        raise ValueError('tries must be at least 1: {}'.format(tries))
+    start = time.perf_counter()
+    n = network.n_atoms
+    rng = random.Random(seed)
+    nprng = np.random.default_rng(seed)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    deadline = None if timeout is None else time.time() + timeout
+
+    best_state, best_cost = None, float('inf')
+    cs = None
+    for t in range(tries):
+        if t == 0 and init is not None:
+            state = np.asarray(init, dtype=bool)
+        else:
+            state = nprng.random(n) < 0.5
+        if cs is None:
+            cs = WeightedClauseState(network, state, hard_weight)
+        else:
+            cs.reset(state)
+
+        # The best state of this try is anchor with trail[:best_len] flipped
+        anchor = cs.assignment()
+        trail = []
+        try_best, best_len = cs.cost, 0
+        for flip in range(max_flips):
+            if try_best <= target or not cs.unsat:
+                break
+            if deadline is not None and flip % 1000 == 0 and time.time() > deadline:
+                break
+            atoms = cs.clause_atoms(rng.choice(cs.unsat))
+            if rng.random() < noise:
+                a = rng.choice(atoms)
+            else:
+                a = min(atoms, key=cs.delta)
+            cs.flip(a)
+            trail.append(a)
+            if cs.cost < try_best - 1e-9:
+                try_best, best_len = cs.cost, len(trail)
+            if len(trail) > n:
+                _apply(anchor, trail[:best_len])
+                del trail[:best_len]
+                best_len = 0
+        if try_best < best_cost:
+            _apply(anchor, trail[:best_len])
+            best_state, best_cost = anchor, try_best
+        if best_cost <= target or (deadline is not None and time.time() > deadline):
+            break
+    if stats is not None and cs is not None:
+        stats.flips += cs.flips
+        stats.steps += t + 1
+        stats.time += time.perf_counter() - start
+    return best_state
+
+def _apply(state, flips):
+    for a in flips:
+        state[a] = not state[a]
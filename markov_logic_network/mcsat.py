@@ -0,0 +1,104 @@
+'MC-SAT: slice sampling of ground networks with SampleSAT'
+
+import math
+import time
+import random
+import numpy as np
+from sat import ClauseState
+
+__all__ = ['mcsat', 'sample_sat']
+
+def sample_sat(cs, movable, rng, max_flips=10000, p_sa=0.5, temperature=0.5, noise=0.5,
+               walk=5.0):
+    '''
+    Search a satisfying assignment of the active clauses of ClauseState cs
+    by a mixture of WalkSAT and simulated annealing moves, flipping only
+    atoms a with movable[a]. Return True if all active clauses are satisfied.
+
+    Once a solution is found, random flips which keep all active clauses
+    satisfied are made (walk times per atom of the active clauses) to reduce
+    the bias of the search towards solutions near the initial assignment.
+    '''
+    candidates = [a for a in range(len(movable)) if movable[a]]
+    if not candidates:
+        return not cs.unsat
+    for _ in range(max_flips):
+        if not cs.unsat:
+            constrained = [a for a in cs.active_atoms() if movable[a]]
+            for _ in range(int(walk * len(constrained))):
+                a = rng.choice(constrained)
+                if cs.break_count(a) == 0:
+                    cs.flip(a)
+            return True
+        if rng.random() < p_sa:
+            a = rng.choice(candidates)
+            delta = cs.break_count(a) - cs.make_count(a)
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                cs.flip(a)
+        else:
+            atoms = [a for a in cs.clause_atoms(rng.choice(cs.unsat)) if movable[a]]
+            if not atoms:
+                continue
+            if rng.random() < noise:
+                cs.flip(rng.choice(atoms))
+            else:
+                cs.flip(min(atoms, key=cs.break_count))
+    return not cs.unsat
+
+def mcsat(network, burn_in=100, samples=1000, seed=None, max_flips=10000,
+          p_sa=0.5, temperature=0.5, noise=0.5, walk=5.0, stats=None, init=None):
+    '''
+    Estimate marginal probabilities of the atoms of a GroundNetwork by
+    MC-SAT. Return an array of probabilities indexed by atom ids.
+
+    At each step every clause satisfied by the current state is selected
+    with probability 1 - exp(-w) (for negative weights, unsatisfied clauses
+    are selected with probability 1 - exp(w) and their literals are fixed
+    to false) and the next state is sampled from the solutions of the
+    selected clauses by SampleSAT. Only O(atoms + literals) memory is used.
+    The first state is found by SampleSAT starting from init (a random
+    state by default). If stats (a SamplerStats) is given, the flips are
+    added to it.
+    '''
+    start = time.perf_counter()
+    n = network.n_atoms
+    rng = random.Random(seed)
+    nprng = np.random.default_rng(seed)
+    weights = network.weights
+    lit_clauses = network.literal_clauses()
+    counts = np.zeros(n)
+    if n == 0:
+        return counts
+
+    # Initial state satisfies hard clauses
+    hard = np.isinf(weights) & (weights > 0)
+    state = nprng.random(n) < 0.5 if init is None else np.asarray(init, dtype=bool)
+    cs = ClauseState(network, state, hard)
+    sample_sat(cs, [True] * n, rng, max_flips, p_sa, temperature, noise, walk)
+    state = cs.assignment()
+
+    with np.errstate(over='ignore'):
+        p_pos = -np.expm1(-np.abs(weights))
+    for step in range(burn_in + samples):
+        sat = cs.satisfied()
+        u = nprng.random(network.n_clauses)
+        selected = (weights > 0) & sat & (u < p_pos)
+        negative = (weights < 0) & ~sat & (u < p_pos)
+
+        # Literals of selected negative clauses are fixed to false
+        fixed = np.zeros(n, dtype=bool)
+        fixed[network.lits[negative[lit_clauses]]] = True
+
+        init = np.where(fixed, state, nprng.random(n) < 0.5)
+        cs.reset(init, selected)
+        if sample_sat(cs, (~fixed).tolist(), rng, max_flips, p_sa, temperature, noise, walk):
+            state = cs.assignment()
+        else:
+            cs.reset(state)
+        if step >= burn_in:
+            counts += state
+    if stats is not None:
+        stats.flips += cs.flips
+        stats.steps += burn_in + samples
+        stats.time += time.perf_counter() - start
+    return counts / max(samples, 1)
@@ -1,21 +1,512 @@
 'Markov Logic Network model'
 
+import os
+import hashlib
+import numpy as np
 from syntax import *
+from normalize import is_auxiliary, simplify
+from grounding import *
+from domains import infer_types, type_domains, variable_domains
+from network import *
+from learning import TrainingDatabase, count_matrix, optimize_weights
+from parallel import ground_parallel
+from storage import save_network, load_network, InvalidNetworkFile
+from wmc import probability
+from sat import SamplerStats
+from profiling import Profiler, FormulaStats, NULL_PHASE
+from cache import QueryCache, query_key
+from evidence import Database, InvalidEvidence
+from incremental import IncrementalGrounding
+from lazy import LazyNetwork
+import inference
+
+def _evidence_hash(world, open_world):
+    'A content hash of the evidence world and the open-world predicates'
+    return hashlib.sha256('{}:{!r}'.format(
+        world.fingerprint(), sorted(open_world)).encode('utf-8')).hexdigest()
+
+def _literals(atoms):
+    'A list of ground literals given as one literal or an iterable of them'
+    if isinstance(atoms, (str, Atom, Not)):
+        return [atoms]
+    return list(atoms)
 
 class MarkovLogicNetwork(object):
-    'A markov logic network is a set of formulas and weights'
+    '''
+    A markov logic network is a set of formulas and weights. types maps
+    declared predicates to tuples of argument types.
+
+    modes maps formulas to the modes of their conjunctive normal forms used
+    for inference (see ConjunctiveNormalForm); other formulas use
+    default_mode. Weight learning always distributes.
+
+    If simplify is true, clauses are simplified (see normalize.simplify)
+    before grounding and ground clauses are simplified again.
+
+    profiler is None or a Profiler which measures the phases of load,
+    train, query and the other operations (see profile), and cache is None
+    or a QueryCache of ground networks and query results (see
+    enable_cache).
+
+    If incremental is true, ground networks of evidence Databases are kept
+    as IncrementalGroundings which add_evidence, retract_evidence and
+    flip_evidence update instead of grounding again, and the inference
+    methods of inference.warm_start_methods start from the last state.
+    '''
     def __init__(self):
         self.mln = []
+        self.types = {}
+        self.functions = {}
+        self.modes = {}
+        self.simplify = True
+        self.default_mode = 'distribute'
+        self.profiler = None
+        self.cache = None
+        self.incremental = False
+        self._live = {}     # a map from (world id, open world) to (world, fingerprint, grounding)
+        self._hashes = {}   # a map from (world id, version, open world) to (world, evidence hash)
+
+    def profile(self, memory=False, hooks=()):
+        '''
+        Start measuring the phases of operations by a new Profiler and
+        return it. See Profiler for memory and hooks. Setting profiler to
+        None stops measuring.
+        '''
+        self.profiler = Profiler(memory, hooks)
+        return self.profiler
+
+    def _phase(self, name):
+        'A context manager which measures a phase if profiling'
+        if self.profiler is None:
+            return NULL_PHASE
+        return self.profiler.phase(name)
+
+    def enable_cache(self, max_networks=8, max_results=128):
+        '''
+        Start caching ground networks and query results in a new QueryCache
+        of at most max_networks networks and max_results results, and
+        return it. Entries are keyed by content hashes of the model and the
+        evidence, so changes of either never return stale entries. Results
+        of queries with options other than numbers, strings or None are not
+        cached, and results of sampling methods without seeds are reused.
+        Setting cache to None stops caching.
+        '''
+        self.cache = QueryCache(max_networks, max_results)
+        return self.cache
+
+    def invalidate(self):
+        'Remove all entries of the cache and incremental groundings, which load and train do'
+        if self.cache is not None:
+            self.cache.clear()
+        self._live = {}
+        self._hashes = {}
+
+    def load(self, source):
+        'Load Markov Logic Network Model from a text or a file'
+        with self._phase('load') as phase:
+            self.types, self.mln = parse_program(source)
+            phase.record(formulas=len(self.mln), predicates=len(self.types))
+        self.invalidate()
+
+    def fingerprint(self):
+        'A content hash of the formulas, weights and function names'
+        h = hashlib.sha256()
+        for f, w in self.mln:
+            h.update('{!r}:{!r}\n'.format(f, w).encode('utf-8'))
+        h.update(repr(sorted(self.types.items())).encode('utf-8'))
+        h.update(repr([self.modes.get(f, self.default_mode) for f, _ in self.mln]).encode('utf-8'))
+        h.update(repr(self.simplify).encode('utf-8'))
+        h.update(repr(sorted(self.functions)).encode('utf-8'))
+        return h.hexdigest()
+
+    def constants(self, world):
+        'Constants of the domain: those in the world followed by those in formulas'
+        cs = list(world.constants)
+        seen = set(cs)
+        for f, _ in self.mln:
+            for c in formula_constants(f):
+                if c not in seen:
+                    seen.add(c)
+                    cs.append(c)
+        return cs
+
+    def domains(self, world):
+        'Constants of each declared type, or None if no types are declared'
+        if not self.types:
+            return None
+        return type_domains(self.types, world, [f for f, _ in self.mln])
+
+    def grounder(self, world, open_world=(), evaluate=True):
+        '''
+        Return a Grounder which generates ground clauses of the model lazily.
+        world is an evidence database and predicates in open_world are not
+        closed by the evidence. If evaluate is false, ground literals of the
+        clauses are not evaluated by the evidence when they are simplified,
+        so that the clauses stay valid when the evidence changes.
+        '''
+        with self._phase('cnf') as phase:
+            constants = self.constants(world)
+            domains = self.domains(world)
+            modes = [self.modes.get(f, self.default_mode) for f, _ in self.mln]
+            types = dict(self.types)
+            sizes = None if self.profiler is None else []
+            clauses = weighted_clauses(self.mln, constants, self.types, domains, modes, types,
+                                       sizes)
+            grounder = Grounder(clauses, world, constants, self.functions, open_world, types,
+                                domains)
+            if self.simplify:
+                grounder.clauses = simplify(grounder.clauses, grounder.truth if evaluate else None)
+            phase.record(formulas=len(self.mln), clauses=len(grounder.clauses),
+                         constants=len(constants))
+        if sizes is not None:
+            self.profiler.formulas = [FormulaStats(f, *size)
+                                      for (f, _), size in zip(self.mln, sizes)]
+        return grounder
+
+    def ground_network(self, world, open_world=(), processes=None, path=None):
+        '''
+        Ground the model into a GroundNetwork, by a pool of processes if
+        processes > 1. If path is given, the network is stored there and
+        is memory-mapped instead of grounded again as long as the model and
+        the evidence are not changed. Networks are also reused from the
+        cache if caching.
+        '''
+        with self._phase('ground') as phase:
+            network = self._ground_network(world, open_world, processes, path, phase)
+            phase.record(atoms=network.n_atoms, clauses=network.n_clauses)
+        return network
+
+    def lazy_network(self, world, open_world=()):
+        '''
+        Return a LazyNetwork of the model given the evidence world, whose
+        ground clauses are materialized as inference activates atoms
+        '''
+        with self._phase('ground') as phase:
+            network = LazyNetwork(self.grounder(world, open_world))
+            phase.record(atoms=network.n_atoms, clauses=network.n_clauses)
+        return network
+
+    def _evidence_hash(self, world, open_world):
+        '''
+        The evidence hash of world and open_world, computed again only when
+        the version of world changes
+        '''
+        version = getattr(world, 'version', None)
+        if version is None:
+            return _evidence_hash(world, open_world)
+        key = (id(world), version, frozenset(open_world), frozenset(world.open_world))
+        entry = self._hashes.get(key)
+        if entry is None or entry[0] is not world:
+            for k in [k for k, e in self._hashes.items()
+                      if k[0] == id(world) and (e[0] is not world or k[1] != version)]:
+                del self._hashes[k]
+            entry = self._hashes[key] = (world, _evidence_hash(world, open_world))
+        return entry[1]
+
+    def _ground_network(self, world, open_world, processes, path, phase):
+        if path is None:
+            live = self._incremental(world, open_world, create=True)
+            if live is not None:
+                phase.record(incremental=True, groundings=len(live))
+                return live.network()
+        cache = self.cache
+        if path is not None or cache is not None:
+            model_hash = self.fingerprint()
+            evidence_hash = self._evidence_hash(world, open_world)
+        if cache is not None:
+            network = cache.networks.get((model_hash, evidence_hash))
+            if network is not None:
+                phase.record(cached=True)
+                return network
+        if path is not None and os.path.exists(path):
+            try:
+                network = load_network(path, model_hash, evidence_hash)
+                phase.record(cached=True)
+                if cache is not None:
+                    cache.networks.put((model_hash, evidence_hash), network)
+                return network
+            except InvalidNetworkFile:
+                pass
+        grounder = self.grounder(world, open_world)
+        if processes is not None and processes > 1:
+            network = ground_parallel(grounder, processes)
+            clauses = network.to_tuples() if self.simplify else None
+        else:
+            clauses = grounder.ground_tuples()
+        if clauses is not None:
+            if self.simplify:
+                clauses = simplify(clauses)
+            builder = NetworkBuilder()
+            for lits, w in clauses:
+                builder.add(lits, w)
+            network = builder.build()
+        stats = grounder.stats
+        phase.record(groundings=stats.total, pruned=stats.pruned, falsified=stats.falsified)
+        if path is not None:
+            save_network(network, path, model_hash, evidence_hash)
+        if cache is not None:
+            cache.networks.put((model_hash, evidence_hash), network)
+        return network
+
+    def _incremental(self, world, open_world, create=False):
+        '''
+        The IncrementalGrounding of world and open_world which is up to date
+        with the model and the evidence, made if create is true, or None if
+        not incremental
+        '''
+        if not self.incremental or not isinstance(world, Database):
+            return None
+        key = (id(world), frozenset(open_world))
+        fingerprint = self.fingerprint()
+        entry = self._live.get(key)
+        if entry is not None and entry[0] is world and entry[1] == fingerprint \
+                and entry[2].version == world.version:
+            return entry[2]
+        if not create:
+            return None
+        live = IncrementalGrounding(self.grounder(world, open_world, evaluate=False))
+        live.version = world.version
+        self._live[key] = (world, fingerprint, live)
+        return live
+
+    def add_evidence(self, world, atoms, truth=True):
+        '''
+        Add ground literals (an atom or a list of atoms given as in
+        Database.add) to the evidence database world and update its
+        incremental groundings. Return the number of groundings evaluated
+        again.
+        '''
+        return self._change_evidence(world, [(a, truth) for a in _literals(atoms)])
+
+    def retract_evidence(self, world, atoms):
+        'Remove ground atoms from the evidence database world as add_evidence adds them'
+        return self._change_evidence(world, [(a, None) for a in _literals(atoms)])
+
+    def flip_evidence(self, world, atoms):
+        '''
+        Negate the truth values of ground atoms in the evidence database
+        world (including false atoms of closed-world predicates) as
+        add_evidence adds them
+        '''
+        changes = []
+        for atom in _literals(atoms):
+            if isinstance(atom, str):
+                atom = parse_formula(atom)
+            if isinstance(atom, Not):
+                atom = atom.f
+            t = world.truth(atom.pred, atom.args)
+            if t is None:
+                raise InvalidEvidence('Truth value of {} is unknown'.format(atom))
+            changes.append((atom, not t))
+        return self._change_evidence(world, changes)
+
+    def _change_evidence(self, world, changes):
+        '''
+        Apply changes (pairs of a ground literal and a truth value, or None
+        to retract it) to world and update its incremental groundings, which
+        are dropped if constants, domains or closed-world predicates change
+        '''
+        live = [entry[2] for entry in self._live.values()
+                if entry[0] is world and entry[2].version == world.version]
+        atoms = []
+        for atom, _ in changes:
+            if isinstance(atom, str):
+                atom = parse_formula(atom)
+            atoms.append(atom.f if isinstance(atom, Not) else atom)
+        def closed(g):
+            return [g.grounder.is_closed(a.pred) for a in atoms]
+        if live:
+            domains = (self.constants(world), self.domains(world))
+            before = [(closed(g), [g.grounder.truth(a.pred, a.args) is not None for a in atoms])
+                      for g in live]
+        for (atom, truth), a in zip(changes, atoms):
+            if truth is None:
+                world.retract(a)
+            else:
+                world.add(atom, truth)
+        if not live or (self.constants(world), self.domains(world)) != domains:
+            return 0
+        evaluated = 0
+        for g, (was_closed, known) in zip(live, before):
+            if closed(g) != was_closed:
+                continue
+            groundings = set()
+            for a, k in zip(atoms, known):
+                groundings.update(g.affected(a.pred, a.args, k))
+            evaluated += g.update(groundings)
+            g.version = world.version
+        return evaluated
+
+    def train(self, world, facts, **options):
+        '''
+        Learn weights of formulas from the evidence world and facts (a
+        Database or ground literals) which give the truth values of the
+        query predicates. See learning.learn_weights for options.
+        '''
+        prior = dict((k, options.pop(k)) for k in ('prior_stdev', 'max_iterations')
+                     if k in options)
+        with self._phase('train') as phase:
+            db = TrainingDatabase(world, facts)
+            with self._phase('count') as count:
+                D = count_matrix(self.mln, world, facts, self.constants(db), self.functions,
+                                 types=self.types, domains=self.domains(db), **options)
+                count.record(query_atoms=D.shape[0], counts=D.nnz)
+            with self._phase('optimize'):
+                weights = optimize_weights(D, [w for _, w in self.mln], **prior)
+            self.mln = [(f, w) for (f, _), w in zip(self.mln, weights)]
+            phase.record(formulas=len(self.mln))
+        self.invalidate()
+
+    def query(self, world, query, method='mcsat', lazy=False, **options):
+        '''
+        Compute marginal probabilities of the ground atoms of query given
+        the evidence world by one of inference.methods. query is a formula
+        or its text and its variables range over all constants. Return a
+        map from ground atoms to probabilities.
+
+        If lazy, one of inference.lazy_methods runs on a LazyNetwork
+        instead, which only keeps the clauses of the atoms which are true
+        in the current sample and those which flipping one atom can
+        violate; the atoms out of it have the probabilities given by their
+        unit clauses (see LazyNetwork.prior).
+
+        If caching, results are reused for queries of the same atoms up to
+        renaming of variables with the same method and options.
+        '''
+        with self._phase('query') as phase:
+            with self._phase('parse'):
+                if isinstance(query, str):
+                    query = parse_formula(query)
+                atoms = formula_atoms(query)
+                open_world = set(a.pred for a in atoms)
+            keyed = dict(options, lazy=True) if lazy else options
+            key = None if self.cache is None else query_key(atoms, method, keyed)
+            if key is not None:
+                key = (self.fingerprint(), self._evidence_hash(world, open_world)) + key
+                result = self.cache.results.get(key)
+                if result is not None:
+                    phase.record(cached=True)
+                    return dict(result)
+            if lazy:
+                network = self.lazy_network(world, open_world)
+                with self._phase('infer') as infer:
+                    marginals = self._infer(inference.lazy_methods, method, network, options,
+                                            infer)
+                    infer.record(atoms=network.n_atoms, clauses=network.n_clauses)
+            else:
+                network = self.ground_network(world, open_world)
+                live = self._incremental(world, open_world)
+                with self._phase('infer') as infer:
+                    marginals = self._infer(inference.methods, method, network, options, infer,
+                                            live)
+                if live is not None:
+                    live.state = marginals > 0.5
+            with self._phase('result'):
+                result = self._query_result(world, query, network, marginals, 0.5,
+                                            network.prior if lazy else None)
+            if key is not None:
+                self.cache.results.put(key, dict(result))
+            return result
+
+    def probability(self, world, f1, f2=None):
+        '''
+        Compute the conditional probability P(f1 | f2) of formulas (or their
+        texts) given the evidence world exactly by weighted model counting.
+        Variables of the formulas range over all constants.
+        '''
+        with self._phase('probability'):
+            with self._phase('parse'):
+                if isinstance(f1, str):
+                    f1 = parse_formula(f1)
+                if isinstance(f2, str):
+                    f2 = parse_formula(f2)
+                atoms = formula_atoms(f1)
+                if f2 is not None:
+                    formula_atoms(f2, atoms)
+            network = self.ground_network(world, set(a.pred for a in atoms))
+            with self._phase('infer'):
+                constants = self.constants(world)
+                for f in (f1, f2):
+                    if f is not None:
+                        constants.extend(c for c in formula_constants(f) if c not in constants)
+                return probability(network, f1, f2, world, constants)
+
+    def map_state(self, world, query=None, method='maxwalksat', lazy=False, **options):
+        '''
+        Compute the most probable state of ground atoms given the evidence
+        world by one of inference.map_methods. If query (a formula or its
+        text) is given, return the truth values of its ground atoms,
+        otherwise those of all ground atoms of the ground network.
 
-    def load(self, text):
-        'Load Markov Logic Network Model'
-        self.mln = parse_mln(text)
+        If lazy, one of inference.lazy_map_methods runs on a LazyNetwork
+        instead, and only the atoms which it activates can be true.
+        '''
+        with self._phase('map_state'):
+            with self._phase('parse'):
+                if isinstance(query, str):
+                    query = parse_formula(query)
+                open_world = set(a.pred for a in formula_atoms(query)) if query else ()
+            if lazy:
+                network, live = self.lazy_network(world, open_world), None
+                with self._phase('infer') as phase:
+                    state = self._infer(inference.lazy_map_methods, method, network, options,
+                                        phase)
+                    phase.record(atoms=network.n_atoms, clauses=network.n_clauses)
+            else:
+                network = self.ground_network(world, open_world)
+                live = self._incremental(world, open_world)
+                with self._phase('infer') as phase:
+                    state = self._infer(inference.map_methods, method, network, options, phase,
+                                        live)
+            if live is not None:
+                live.state = np.asarray(state, dtype=bool)
+            with self._phase('result'):
+                if query is None:
+                    atoms = ((network.atom(i), state[i]) for i in range(network.n_atoms))
+                    return { atom: bool(t) for atom, t in atoms if not is_auxiliary(atom.pred) }
+                return self._query_result(world, query, network, state, False)
 
-    def train(self, world, facts):
-        pass
+    def _infer(self, methods, method, network, options, phase, live=None):
+        '''
+        Run one of methods on network, starting from the state of the
+        IncrementalGrounding live if given and counting flips of samplers if
+        profiling. Raise InferenceError if a hard clause of network is empty.
+        '''
+        if network.contradiction():
+            raise inference.InferenceError('Hard clauses are unsatisfiable')
+        if live is not None and live.state is not None and 'init' not in options \
+                and method in inference.warm_start_methods:
+            options = dict(options, init=live.initial_state(network.n_atoms))
+        if self.profiler is None or method not in inference.sampling_methods:
+            return methods[method](network, **options)
+        stats = self.profiler.sampler = SamplerStats()
+        result = methods[method](network, stats=stats, **options)
+        phase.record(flips=stats.flips, flips_per_second=stats.flips_per_second)
+        return result
 
-    def query(self, world, query):
-        pass
+    def _query_result(self, world, query, network, values, default, missing=None):
+        '''
+        Map ground atoms of query to values of the network or the evidence,
+        or to missing(atom) (default if missing is None) for the other atoms
+        '''
+        constants = self.constants(world)
+        constants.extend(c for c in formula_constants(query) if c not in constants)
+        domains = self.domains(world)
+        result = {}
+        for atom in formula_atoms(query):
+            typed = variable_domains(infer_types(atom, self.types), domains) if domains else {}
+            for ground in ground_atoms(atom, constants, typed):
+                t = world.lookup(ground.pred, ground.args)
+                i = network.atom_id(ground)
+                if t is not None:
+                    result[ground] = type(default)(t)
+                elif i is not None:
+                    result[ground] = type(default)(values[i])
+                elif missing is not None:
+                    result[ground] = missing(ground)
+                else:
+                    result[ground] = default
+        return result
 
 
 #from itertools import product
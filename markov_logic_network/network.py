@@ -0,0 +1,211 @@
+'Compact integer-encoded ground networks'
+
+import numpy as np
+from array import array
+from syntax import *
+from normalize import ConjunctiveNormalForm
+
+__all__ = ['GroundNetwork', 'NetworkBuilder']
+
+class GroundNetwork(object):
+    '''
+    A set of weighted ground clauses stored in flat arrays.
+
+    Predicates and constants are interned to integer ids. Ground atom i is
+    predicate atom_pred[i] applied to constants
+    atom_args[atom_ptr[i]:atom_ptr[i+1]]. Clause j consists of literals
+    lits[clause_ptr[j]:clause_ptr[j+1]] (atom ids) whose signs are
+    signs[clause_ptr[j]:clause_ptr[j+1]] (True for positive literals) and
+    has weight weights[j].
+    '''
+    def __init__(self, predicates, constants, atom_pred, atom_ptr, atom_args,
+                 clause_ptr, lits, signs, weights, atom_ids=None):
+        self.predicates = predicates
+        self.constants = constants
+        self.atom_pred = atom_pred
+        self.atom_ptr = atom_ptr
+        self.atom_args = atom_args
+        self.clause_ptr = clause_ptr
+        self.lits = lits
+        self.signs = signs
+        self.weights = weights
+        self._atom_ids = atom_ids
+        self._pred_ids = None
+        self._const_ids = None
+        self._atom_clauses = None
+
+    @classmethod
+    def from_clauses(cls, clauses, weights):
+        'Build a network from lists of ground literals (Atom or Not(Atom))'
+        builder = NetworkBuilder()
+        for clause, w in zip(clauses, weights):
+            builder.add_clause(clause, w)
+        return builder.build()
+
+    @classmethod
+    def from_cnf(cls, cnf, weight):
+        'Build a network from a ground ConjunctiveNormalForm'
+        return cls.from_clauses(cnf.clauses, [weight] * len(cnf.clauses))
+
+    @property
+    def n_atoms(self):
+        return len(self.atom_pred)
+
+    @property
+    def n_clauses(self):
+        return len(self.weights)
+
+    def atom(self, i):
+        'Return the i-th ground atom as an Atom'
+        args = self.atom_args[self.atom_ptr[i]:self.atom_ptr[i+1]]
+        return Atom(self.predicates[self.atom_pred[i]],
+                    tuple(self.constants[c] for c in args))
+
+    def atoms(self):
+        return [self.atom(i) for i in range(self.n_atoms)]
+
+    def atom_id(self, atom):
+        'Return the id of given Atom or None if it is not in the network'
+        if self._atom_ids is None:
+            self._atom_ids = {}
+            for i in range(self.n_atoms):
+                self._atom_ids[self._key(i)] = i
+        if self._pred_ids is None:
+            self._pred_ids = {p: i for i, p in enumerate(self.predicates)}
+            self._const_ids = {c: i for i, c in enumerate(self.constants)}
+        key = (self._pred_ids.get(atom.pred),
+               tuple(self._const_ids.get(c) for c in atom.args))
+        return self._atom_ids.get(key)
+
+    def _key(self, i):
+        args = self.atom_args[self.atom_ptr[i]:self.atom_ptr[i+1]]
+        return (int(self.atom_pred[i]), tuple(int(c) for c in args))
+
+    def clause(self, j):
+        'Return the j-th clause as a list of Atom or Not(Atom)'
+        s, e = self.clause_ptr[j], self.clause_ptr[j+1]
+        return [self.atom(a) if sign else Not(self.atom(a))
+                for a, sign in zip(self.lits[s:e], self.signs[s:e])]
+
+    def to_clauses(self):
+        'Return the pair (clauses, weights)'
+        return [self.clause(j) for j in range(self.n_clauses)], list(self.weights)
+
+    def to_tuples(self):
+        'Yield (clause, weight) whose literals are tuples (pred, args, sign) as Grounder.ground_tuples'
+        predicates, constants = self.predicates, self.constants
+        atom_ptr, atom_args = self.atom_ptr.tolist(), self.atom_args.tolist()
+        atoms = [(predicates[p], tuple(constants[c] for c in atom_args[atom_ptr[i]:atom_ptr[i+1]]))
+                 for i, p in enumerate(self.atom_pred.tolist())]
+        clause_ptr, lits, signs = self.clause_ptr.tolist(), self.lits.tolist(), self.signs.tolist()
+        for j, w in enumerate(self.weights.tolist()):
+            s, e = clause_ptr[j], clause_ptr[j+1]
+            yield [atoms[a] + (sign,) for a, sign in zip(lits[s:e], signs[s:e])], w
+
+    def to_cnf(self):
+        'Return the clauses as a ConjunctiveNormalForm (weights are dropped)'
+        return ConjunctiveNormalForm.from_clauses(self.to_clauses()[0])
+
+    def clause_lengths(self):
+        return np.diff(self.clause_ptr)
+
+    def contradiction(self):
+        'Whether a hard clause is empty, so that no state satisfies the network'
+        return bool(np.any((self.clause_lengths() == 0) & (self.weights == np.inf)))
+
+    def literal_clauses(self):
+        'Clause id of each literal'
+        return np.repeat(np.arange(self.n_clauses, dtype=np.int32), self.clause_lengths())
+
+    def atom_clauses(self):
+        '''
+        Return the transposed CSR arrays (ptr, clauses, positions): the
+        literals of atom i are lits[positions[ptr[i]:ptr[i+1]]] and they
+        belong to clauses[ptr[i]:ptr[i+1]].
+        '''
+        if self._atom_clauses is None:
+            positions = np.argsort(self.lits, kind='stable')
+            counts = np.bincount(self.lits, minlength=self.n_atoms)
+            ptr = np.zeros(self.n_atoms + 1, dtype=np.int64)
+            np.cumsum(counts, out=ptr[1:])
+            clauses = self.literal_clauses()[positions]
+            self._atom_clauses = (ptr, clauses, positions)
+        return self._atom_clauses
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.atom_pred, self.atom_ptr, self.atom_args,
+            self.clause_ptr, self.lits, self.signs, self.weights))
+
+    def __repr__(self):
+        return 'GroundNetwork(atoms={}, clauses={})'.format(self.n_atoms, self.n_clauses)
+
+class NetworkBuilder(object):
+    'Build a GroundNetwork incrementally from ground clauses'
+    def __init__(self):
+        self.predicates = []
+        self.constants = []
+        self._pred_ids = {}
+        self._const_ids = {}
+        self._atom_ids = {}     # a map from (pred id, const ids) to atom ids
+        self._atom_pred = array('i')
+        self._atom_ptr = array('q', [0])
+        self._atom_args = array('i')
+        self._clause_ptr = array('q', [0])
+        self._lits = array('i')
+        self._signs = array('b')
+        self._weights = array('d')
+
+    def predicate_id(self, pred):
+        i = self._pred_ids.get(pred)
+        if i is None:
+            i = self._pred_ids[pred] = len(self.predicates)
+            self.predicates.append(pred)
+        return i
+
+    def constant_id(self, c):
+        i = self._const_ids.get(c)
+        if i is None:
+            i = self._const_ids[c] = len(self.constants)
+            self.constants.append(c)
+        return i
+
+    def atom_id(self, pred, args):
+        'Intern a ground atom given by its predicate and constants'
+        key = (self.predicate_id(pred), tuple(self.constant_id(c) for c in args))
+        i = self._atom_ids.get(key)
+        if i is None:
+            i = self._atom_ids[key] = len(self._atom_pred)
+            self._atom_pred.append(key[0])
+            self._atom_args.extend(key[1])
+            self._atom_ptr.append(len(self._atom_args))
+        return i
+
+    def find_atom(self, pred, args):
+        'The id of a ground atom, or None if it is not interned'
+        key = (self._pred_ids.get(pred), tuple(self._const_ids.get(c) for c in args))
+        return self._atom_ids.get(key)
+
+    def add(self, literals, weight):
+        'Add a clause given by a list of tuples (pred, args, sign)'
+        for pred, args, sign in literals:
+            self._lits.append(self.atom_id(pred, args))
+            self._signs.append(sign)
+        self._clause_ptr.append(len(self._lits))
+        self._weights.append(weight)
+
+    def add_clause(self, clause, weight):
+        'Add a clause given by a list of Atom or Not(Atom)'
+        self.add([(l.f.pred, l.f.args, False) if isinstance(l, Not) else (l.pred, l.args, True)
+                  for l in clause], weight)
+
+    def build(self):
+        return GroundNetwork(
+            list(self.predicates), list(self.constants),
+            np.frombuffer(self._atom_pred, dtype=np.int32).copy(),
+            np.frombuffer(self._atom_ptr, dtype=np.int64).copy(),
+            np.frombuffer(self._atom_args, dtype=np.int32).copy(),
+            np.frombuffer(self._clause_ptr, dtype=np.int64).copy(),
+            np.frombuffer(self._lits, dtype=np.int32).copy(),
+            np.frombuffer(self._signs, dtype=np.int8).astype(bool),
+            np.frombuffer(self._weights, dtype=np.float64).copy(),
+            dict(self._atom_ids))
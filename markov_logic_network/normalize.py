@@ -1,26 +1,74 @@
 'Translators from FOL formula to CNF or DNF'
 
 from syntax import *
+from domains import infer_types, variable_domains
 from itertools import product
 from functools import reduce
 
-__all__ = ['ConjunctiveNormalForm', 'DisjunctiveNormalForm']
+__all__ = ['ConjunctiveNormalForm', 'DisjunctiveNormalForm', 'is_auxiliary', 'simplify']
 
 class ConjunctiveNormalForm(object):
-    def __init__(self, formula, constants):
+    '''
+    Conjunctive normal form of a formula.
+
+    In mode 'distribute' ORs are distributed over ANDs, which may make
+    exponentially many clauses. In mode 'tseitin' subformulas are replaced
+    by auxiliary atoms whose definitions are the clauses of definitions, so
+    the size is linear: clauses is the single clause which is true exactly
+    when the formula is, and a world of the original atoms extends uniquely
+    to auxiliary atoms satisfying the definitions, which keeps probabilities
+    (one-way definitions of Plaisted-Greenbaum would keep satisfiability
+    only). A hard formula is split into its conjuncts instead of being
+    defined by a single atom. Mode 'auto' chooses 'tseitin' when
+    distribution makes more than max_clauses clauses.
+
+    Auxiliary atoms are named '_Aux<name>_<k>' and have the variables of
+    their subformulas as arguments. types maps their predicates to argument
+    types when types of all the variables are known.
+    '''
+    modes = ('distribute', 'tseitin', 'auto')
+
+    def __init__(self, formula, constants, types=None, domains=None, mode='distribute',
+                 name='', hard=False, max_clauses=64):
+        if mode not in self.modes:
+            raise ValueError('Unknown CNF mode: {}'.format(mode))
         self.original = formula
-        self.clauses = _conjunctive_normal_form(formula, constants)
+        self.definitions = []
+        self.types = {}
+        f = _quantifier_free(formula, constants, types, domains)
+        if mode == 'auto':
+            mode = 'tseitin' if _count_clauses(f) > max_clauses else 'distribute'
+        if mode == 'distribute':
+            self.clauses = _distribute(f, And, Or)
+        else:
+            variable_types = infer_types(f, types) if types else {}
+            self.clauses, self.definitions, self.types = \
+                    _tseitin(f, name, hard, variable_types)
+
+    @classmethod
+    def from_clauses(cls, clauses, original=None):
+        'Make a conjunctive normal form from a list of clauses'
+        cnf = cls.__new__(cls)
+        cnf.original = original
+        cnf.clauses = clauses
+        cnf.definitions = []
+        cnf.types = {}
+        return cnf
 
     def to_formula(self):
-        return reduce(And, [reduce(Or, clause) for clause in self.clauses])
+        return reduce(And, [reduce(Or, clause) for clause in self.clauses + self.definitions])
 
     def __str__(self):
         return str(self.to_formula())
 
+def is_auxiliary(pred):
+    'Whether pred is a predicate of auxiliary atoms of ConjunctiveNormalForm'
+    return pred.startswith('_Aux')
+
 class DisjunctiveNormalForm(object):
-    def __init__(self, formula, constants):
+    def __init__(self, formula, constants, types=None, domains=None):
         self.original = formula
-        self.clauses = _disjunctive_normal_form(formula, constants)
+        self.clauses = _disjunctive_normal_form(formula, constants, types, domains)
 
     def to_formula(self):
         return reduce(Or, [reduce(And, clause) for clause in self.clauses])
@@ -28,37 +76,186 @@ class DisjunctiveNormalForm(object):
     def __str__(self):
         return str(self.to_formula())
 
-def _conjunctive_normal_form(f, C):
+def _conjunctive_normal_form(f, C, types=None, domains=None):
     '''
     Translate given formula to conjunctive normal form.
 
     f: a formula of first order logic.
     C: list of constants
+    types: a map from predicates to tuples of argument types
+    domains: a map from types to lists of constants
 
     The result will be a list (conjunctive) of lists (disjunctions)
     '''
-    f = _uniquify(f, [0])
-    f = _remove_arrows(f)
-    f = _move_neg(f)
-    f = _remove_exists(f, C)
-    f = _remove_forall(f)
-    return  _move_or(f)
+    return _distribute(_quantifier_free(f, C, types, domains), And, Or)
 
-def _disjunctive_normal_form(f, C):
+def _disjunctive_normal_form(f, C, types=None, domains=None):
     '''
     Translate given formula to disjunctive normal form.
 
     f: a formula of first order logic.
     C: list of constants
+    types: a map from predicates to tuples of argument types
+    domains: a map from types to lists of constants
 
     The result will be a list (disjunctions) of lists (conjuctions)
     '''
-    f = _uniquify(f, [0])
-    f = _remove_arrows(f)
-    f = _move_neg(f)
-    f = _remove_exists(f, C)
-    f = _remove_forall(f)
-    return _move_and(f)
+    return _distribute(_quantifier_free(f, C, types, domains), Or, And)
+
+# === Fused normalization ===
+#
+# _quantifier_free does the work of _uniquify, _remove_arrows, _move_neg,
+# _remove_exists and _remove_forall in one traversal with an explicit stack,
+# and _distribute does that of _move_or and _move_and. The recursive passes
+# below are the reference definitions. Unchanged subtrees are shared, and a
+# subformula which '<=>' duplicates is translated once for each polarity.
+
+_VISIT, _JUNCTION, _IMPLY, _EQUIV, _EXPAND = range(5)
+
+def _quantifier_free(f, C, types=None, domains=None):
+    '''
+    Translate given formula to a quantifier-free formula in negation normal
+    form, as the passes _uniquify, _remove_arrows, _move_neg, _remove_exists
+    and _remove_forall do.
+    '''
+    counter = 0
+    results = []
+    memo = {}       # results of subformulas by polarity and renaming
+    tasks = [(_VISIT, f, False, {})]
+    while tasks:
+        task = tasks.pop()
+        kind = task[0]
+        if kind == _VISIT:
+            _, g, neg, env = task
+            key = (id(g), neg, id(env))
+            if key in memo:
+                results.append(memo[key][2])
+            elif isinstance(g, Atom):
+                if env:
+                    args = tuple(_assign_term(t, env) for t in g.args)
+                    if args != g.args:
+                        g = Atom(g.pred, args)
+                results.append(Not(g) if neg else g)
+            elif isinstance(g, Not):
+                tasks.append((_VISIT, g.f, not neg, env))
+            elif isinstance(g, And) or isinstance(g, Or):
+                tasks.append((_JUNCTION, g, neg, env))
+                tasks.append((_VISIT, g.f2, neg, env))
+                tasks.append((_VISIT, g.f1, neg, env))
+            elif isinstance(g, Imply):
+                tasks.append((_IMPLY, g, neg, env))
+                tasks.append((_VISIT, g.f2, neg, env))
+                tasks.append((_VISIT, g.f1, not neg, env))
+            elif isinstance(g, Equiv):
+                tasks.append((_EQUIV, g, neg, env))
+                for h in (g.f2, g.f1):
+                    tasks.append((_VISIT, h, True, env))
+                    tasks.append((_VISIT, h, False, env))
+            else:
+                inner = env.copy()
+                for x in g.xs:
+                    inner[x] = 'x' + str(counter)
+                    counter += 1
+                if isinstance(g, Exists) != neg:
+                    D = _domains(g.f, types, domains)
+                    tasks.append((_EXPAND, g, neg, env,
+                                  [(inner[x], D.get(x, C)) for x in g.xs]))
+                tasks.append((_VISIT, g.f, neg, inner))
+            continue
+
+        _, g, neg, env = task[:4]
+        if kind == _JUNCTION:
+            r2 = results.pop()
+            r1 = results.pop()
+            if not neg and r1 is g.f1 and r2 is g.f2:
+                r = g
+            elif isinstance(g, And) != neg:
+                r = And(r1, r2)
+            else:
+                r = Or(r1, r2)
+        elif kind == _IMPLY:
+            r2 = results.pop()
+            r1 = results.pop()
+            r = And(r1, r2) if neg else Or(r1, r2)
+        elif kind == _EQUIV:
+            neg2, pos2, neg1, pos1 = [results.pop() for _ in range(4)]
+            if neg:
+                r = Or(And(pos1, neg2), And(neg1, pos2))
+            else:
+                r = And(Or(neg1, pos2), Or(pos1, neg2))
+        else:
+            body = results.pop()
+            xs = [x for x, _ in task[4]]
+            fs = [_substitute(body, dict(zip(xs, cs)))
+                  for cs in product(*[cs for _, cs in task[4]])]
+            if not fs:
+                raise EvaluationError('Empty domain of {}'.format(', '.join(xs)))
+            r = reduce(Or, fs)
+        # g and env are kept alive while their ids are used
+        memo[id(g), neg, id(env)] = (g, env, r)
+        results.append(r)
+    return results[0]
+
+def _substitute(f, d):
+    '''
+    Substitute variables of a quantifier-free formula using given map d.
+    Subtrees without substituted variables are shared.
+    '''
+    results = []
+    tasks = [(True, f)]
+    while tasks:
+        visit, g = tasks.pop()
+        if not visit:
+            r2 = results.pop()
+            r1 = results.pop()
+            results.append(g if r1 is g.f1 and r2 is g.f2 else type(g)(r1, r2))
+        elif isinstance(g, And) or isinstance(g, Or):
+            tasks.append((False, g))
+            tasks.append((True, g.f2))
+            tasks.append((True, g.f1))
+        else:
+            atom = g.f if isinstance(g, Not) else g
+            args = tuple(_assign_term(t, d) for t in atom.args)
+            if args != atom.args:
+                atom = Atom(atom.pred, args)
+                g = Not(atom) if isinstance(g, Not) else atom
+            results.append(g)
+    return results[0]
+
+def _distribute(f, outer, inner):
+    '''
+    Distribute inner over outer in a quantifier-free formula as _move_or
+    (outer = And, inner = Or) and _move_and (outer = Or, inner = And) do.
+    The result will be a list (outer) of lists (inner).
+    '''
+    results = []
+    tasks = [(True, f)]
+    while tasks:
+        visit, g = tasks.pop()
+        if not visit:
+            r2 = results.pop()
+            r1 = results.pop()
+            # Lists of partial results are not shared, so they are extended in place
+            if isinstance(g, outer):
+                r1.extend(r2)
+            elif len(r1) == 1 and len(r2) == 1:
+                r1[0].extend(r2[0])
+            else:
+                r1 = [c1 + c2 for c1, c2 in product(r1, r2)]
+            results.append(r1)
+        elif isinstance(g, outer) or isinstance(g, inner):
+            tasks.append((False, g))
+            tasks.append((True, g.f2))
+            tasks.append((True, g.f1))
+        else:
+            results.append([[g]])
+    return results[0]
+
+def _domains(f, types, domains):
+    'Constants which typed variables of f range over'
+    if not types or domains is None:
+        return {}
+    return variable_domains(infer_types(f, types), domains)
 
 def _uniquify(f, n, d={}):
     'Uniquify bound variables'
@@ -70,7 +267,7 @@ def _uniquify(f, n, d={}):
         return f._replace(xs=tuple(d[x] for x in f.xs), f=_uniquify(f.f, n, d))
     elif isinstance(f, Not):
         return Not(_uniquify(f.f, n, d))
-    elif isinstance(f, And) or isinstance(f, Or):
+    elif isinstance(f, And) or isinstance(f, Or) or isinstance(f, Imply) or isinstance(f, Equiv):
         return f._replace(f1=_uniquify(f.f1, n, d), f2=_uniquify(f.f2, n, d))
     elif isinstance(f, Atom):
         return Atom(f.pred, tuple(_assign_term(t, d) for t in f.args))
@@ -111,34 +308,46 @@ def _remove_arrows(f):
 
 def _move_neg(f):
     'Move negation operator inwards'
-    if isinstance(f, Forall) or isinstance(f, Exists):
-        return f._replace(f=_move_neg(f.f))
-    elif isinstance(f, And) or isinstance(f, Or):
-        return f._replace(f1=_move_neg(f.f1), f2=_move_neg(f.f2))
-    elif isinstance(f, Atom):
-        return f
-    elif isinstance(f.f, Forall):
-        return Exists(f.f.xs, _move_neg(Not(f.f.f)))
-    elif isinstance(f.f, Exists):
-        return Forall(f.f.xs, _move_neg(Not(f.f.f)))
-    elif isinstance(f.f, Not):
-        return _move_neg(f.f.f)
-    elif isinstance(f.f, And):
-        return Or(_move_neg(Not(f.f.f1)), _move_neg(Not(f.f.f2)))
-    elif isinstance(f.f, Or):
-        return And(_move_neg(Not(f.f.f1)), _move_neg(Not(f.f.f2)))
-    else:
-        return f
+    results = []
+    tasks = [(True, f, False)]
+    while tasks:
+        visit, g, neg = tasks.pop()
+        if not visit:
+            if isinstance(g, Forall) or isinstance(g, Exists):
+                quantifier = Exists if isinstance(g, Forall) == neg else Forall
+                results.append(quantifier(g.xs, results.pop()))
+            else:
+                r2 = results.pop()
+                r1 = results.pop()
+                results.append(And(r1, r2) if isinstance(g, And) != neg else Or(r1, r2))
+        elif isinstance(g, Not):
+            tasks.append((True, g.f, not neg))
+        elif isinstance(g, And) or isinstance(g, Or):
+            tasks.append((False, g, neg))
+            tasks.append((True, g.f2, neg))
+            tasks.append((True, g.f1, neg))
+        elif isinstance(g, Forall) or isinstance(g, Exists):
+            tasks.append((False, g, neg))
+            tasks.append((True, g.f, neg))
+        else:
+            results.append(Not(g) if neg else g)
+    return results[0]
 
-def _remove_exists(f, C):
-    'Replace exists "x F(x)" to "F(C1) or F(C2) or ... or F(Cn)"'
+def _remove_exists(f, C, D={}):
+    '''
+    Replace exists "x F(x)" to "F(C1) or F(C2) or ... or F(Cn)".
+    Variables in D range over D[x] instead of C.
+    '''
     if isinstance(f, Forall):
-        return Forall(f.xs, _remove_exists(f.f, C))
+        return Forall(f.xs, _remove_exists(f.f, C, D))
     elif isinstance(f, Exists):
-        fs = [ _assign(f.f, dict(zip(f.xs, cs))) for cs in product(C, repeat=len(f.xs)) ]
+        fs = [ _assign(f.f, dict(zip(f.xs, cs)))
+               for cs in product(*[D.get(x, C) for x in f.xs]) ]
+        if not fs:
+            raise EvaluationError('Empty domain of {}'.format(', '.join(f.xs)))
         return reduce(Or, fs)
     elif isinstance(f, And) or isinstance(f, Or):
-        return f._replace(f1=_remove_exists(f.f1, C), f2=_remove_exists(f.f2, C))
+        return f._replace(f1=_remove_exists(f.f1, C, D), f2=_remove_exists(f.f2, C, D))
     else:
         return f
 
@@ -172,3 +381,233 @@ def _move_and(f):
         return [ f1 + f2 for f1, f2 in product(_move_and(f.f1), _move_and(f.f2)) ]
     else:
         return [[f]]
+
+def _count_clauses(f):
+    'Number of clauses _move_or makes from f'
+    counts = []
+    tasks = [(True, f)]
+    while tasks:
+        visit, g = tasks.pop()
+        if not visit:
+            n2 = counts.pop()
+            n1 = counts.pop()
+            counts.append(n1 + n2 if isinstance(g, And) else n1 * n2)
+        elif isinstance(g, And) or isinstance(g, Or):
+            tasks.append((False, g))
+            tasks.append((True, g.f2))
+            tasks.append((True, g.f1))
+        else:
+            counts.append(1)
+    return counts[0]
+
+def _flatten(f, op, fs):
+    'Operands of nested applications of op'
+    stack = [f]
+    while stack:
+        g = stack.pop()
+        if isinstance(g, op):
+            stack.append(g.f2)
+            stack.append(g.f1)
+        else:
+            fs.append(g)
+    return fs
+
+def _negate(l):
+    return l.f if isinstance(l, Not) else Not(l)
+
+def _term_variables(terms, vs):
+    for t in terms:
+        if isinstance(t, Apply):
+            _term_variables(t.args, vs)
+        elif t[:1].islower() and t not in vs:
+            vs.append(t)
+    return vs
+
+def _formula_variables(f, vs):
+    stack = [f]
+    while stack:
+        g = stack.pop()
+        if isinstance(g, Atom):
+            _term_variables(g.args, vs)
+        elif isinstance(g, Not):
+            stack.append(g.f)
+        else:
+            stack.append(g.f2)
+            stack.append(g.f1)
+    return vs
+
+def _tseitin(f, name, hard, variable_types):
+    '''
+    Translate a quantifier-free formula in negation normal form to
+    (clauses, definitions, types) by introducing auxiliary atoms for
+    subformulas. Definitions are equivalences between auxiliary atoms and
+    their subformulas; a subformula and its negation, which appear
+    together in expansions of '<=>', share one auxiliary atom. If hard,
+    clauses are the conjuncts of f, otherwise a single clause.
+    '''
+    definitions = []
+    types = {}
+    counter = [0]
+    defined = {}    # subformulas and their negations to defining literals
+
+    def literal(g):
+        'A defined literal which is equivalent to g, or None'
+        if isinstance(g, Atom) or isinstance(g, Not):
+            return g
+        return defined.get(g)
+
+    def define(f):
+        'A literal which is equivalent to f under the definitions'
+        tasks = [f]
+        while tasks:
+            g = tasks[-1]
+            if literal(g) is not None:
+                tasks.pop()
+                continue
+            op = And if isinstance(g, And) else Or
+            hs = _flatten(g, op, [])
+            lits = [literal(h) for h in hs]
+            if None in lits:
+                # Define the operands first, in order
+                tasks.extend(h for h, l in reversed(list(zip(hs, lits))) if l is None)
+                continue
+            tasks.pop()
+            vs = _formula_variables(g, [])
+            pred = '_Aux{}_{}'.format(name, counter[0])
+            counter[0] += 1
+            aux = Atom(pred, tuple(vs))
+            if all(x in variable_types for x in vs):
+                types[pred] = tuple(variable_types[x] for x in vs)
+            if op == And:
+                definitions.extend([Not(aux), l] for l in lits)
+                definitions.append([aux] + [_negate(l) for l in lits])
+            else:
+                definitions.append([Not(aux)] + lits)
+                definitions.extend([aux, _negate(l)] for l in lits)
+            defined[g] = aux
+            defined[_move_neg(Not(g))] = Not(aux)
+        return literal(f)
+
+    if hard:
+        clauses = [[define(h) for h in _flatten(c, Or, [])] for c in _flatten(f, And, [])]
+    else:
+        clauses = [[define(h) for h in _flatten(f, Or, [])]]
+    return clauses, definitions, types
+
+# === Simplification of weighted clauses ===
+
+def _literal_key(l):
+    'Translate Atom, Not(Atom) or (pred, args, sign) to (pred, args, sign)'
+    if type(l) is tuple:
+        return l
+    elif isinstance(l, Not):
+        return (l.f.pred, l.f.args, False)
+    return (l.pred, l.args, True)
+
+def _is_ground(args):
+    return all(isinstance(t, str) and not t[:1].islower() for t in args)
+
+def _simplify_clause(clause, truth):
+    '''
+    Remove duplicate and false literals and sort the rest. Return None if
+    the clause is a tautology or satisfied by evidence.
+    '''
+    lits = {}
+    for l in clause:
+        pred, args, sign = _literal_key(l)
+        if truth is not None and _is_ground(args):
+            t = truth(pred, args)
+            if t is not None:
+                if t == sign:
+                    return None
+                continue
+        if lits.setdefault((pred, args), (sign, l))[0] != sign:
+            return None
+    return sorted(l for _, l in lits.values())
+
+def simplify(clauses, truth=None):
+    '''
+    Simplify a list of (clause, weight) whose literals are Atom and Not(Atom)
+    or tuples (pred, args, sign), keeping the probability distribution:
+
+    - duplicate literals are removed and literals are sorted
+    - tautologies and clauses of weight 0 are removed
+    - literals of ground atoms whose truth values are given by truth (a
+      function from pred and args to True, False or None) are evaluated
+    - identical clauses are merged by adding their weights
+    - hard ground unit clauses are propagated: clauses which they satisfy
+      are removed and literals which they falsify are removed from clauses
+    - clauses subsumed by hard clauses are removed
+
+    Hard unit clauses themselves are kept so that their atoms stay fixed.
+    Soft clauses which become empty are removed as the Grounder removes
+    their falsified groundings, but a hard clause which is or becomes
+    empty is kept as an empty clause, which makes the theory
+    unsatisfiable.
+    '''
+    inf = float('inf')
+    index = {}
+    result = []     # lists [literals, weight]; None when removed
+    for clause, w in clauses:
+        c = _simplify_clause(clause, truth)
+        if c is None or w == 0 or not c and w != inf:
+            continue
+        key = tuple(c)
+        if key in index:
+            result[index[key]][1] += w
+        else:
+            index[key] = len(result)
+            result.append([c, w])
+    _propagate(result)
+    _subsume(result)
+    return [(c, w) for c, w in filter(None, result) if w != 0]
+
+def _propagate(result):
+    'Unit propagation of hard ground unit clauses'
+    inf = float('inf')
+    occurrences = {}    # ground atoms to ids of clauses
+    queue = []
+    for j, (c, w) in enumerate(result):
+        for l in c:
+            pred, args, _ = _literal_key(l)
+            if _is_ground(args):
+                occurrences.setdefault((pred, args), []).append(j)
+        if w == inf and len(c) == 1:
+            queue.append(j)
+    while queue:
+        u = queue.pop()
+        if result[u] is None or not result[u][0]:
+            continue
+        pred, args, sign = _literal_key(result[u][0][0])
+        for j in occurrences.get((pred, args), ()):
+            if j == u or result[j] is None:
+                continue
+            c, w = result[j]
+            if any(_literal_key(l) == (pred, args, sign) for l in c):
+                result[j] = None
+                continue
+            c = [l for l in c if _literal_key(l)[:2] != (pred, args)]
+            if not c and w != inf:
+                result[j] = None
+            else:
+                result[j] = [c, w]
+                if w == inf and len(c) == 1:
+                    queue.append(j)
+
+def _subsume(result):
+    'Remove clauses which are supersets of hard clauses'
+    inf = float('inf')
+    occurrences = {}    # literals to ids of clauses
+    for j, r in enumerate(result):
+        if r is not None:
+            for l in r[0]:
+                occurrences.setdefault(_literal_key(l), set()).add(j)
+    hard = [j for j, r in enumerate(result) if r is not None and r[1] == inf]
+    hard.sort(key=lambda j: len(result[j][0]))
+    for j in hard:
+        if result[j] is None or not result[j][0]:
+            continue
+        lists = sorted((occurrences[_literal_key(l)] for l in result[j][0]), key=len)
+        for k in set.intersection(*lists):
+            if k != j and result[k] is not None:
+                result[k] = None
@@ -0,0 +1,135 @@
+'Parallel grounding across a process pool'
+
+import os
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from network import GroundNetwork
+
+__all__ = ['shards', 'leading', 'pool', 'ground_parallel']
+
+def shards(grounder, chunks):
+    '''
+    Split the work of a Grounder into tasks (j, bounds): the j-th clause
+    with its first variable bound to the constants [begin:end] of its
+    domain, where bounds = (begin, end). Clauses without variables make a
+    single task whose bounds are None.
+    '''
+    tasks = []
+    for j in range(len(grounder.clauses)):
+        if not grounder.clause_variables(j):
+            tasks.append((j, None))
+            continue
+        n = len(grounder.clause_domains(j)[0])
+        size = max(1, -(-n // chunks))
+        for begin in range(0, n, size):
+            tasks.append((j, (begin, min(begin + size, n))))
+    return tasks
+
+def leading(grounder, j, bounds):
+    'The leading binding (x, constants) of ground_clause for a task of shards'
+    if bounds is None:
+        return None
+    return (grounder.clause_variables(j)[0], grounder.clause_domains(j)[0][bounds[0]:bounds[1]])
+
+def pool(processes, initializer, initargs):
+    '''
+    A process pool whose workers inherit initargs by fork where it is
+    available, so large evidence is not pickled.
+    '''
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    return ProcessPoolExecutor(processes, context, initializer, initargs)
+
+_worker = None      # (grounder, join plans, predicate ids, constant ids, arity, output directory)
+
+def _init_worker(state):
+    global _worker
+    _worker = state
+
+def _ground_task(task):
+    '''
+    Ground a shard and save it as integer arrays: each literal is a row
+    (predicate id, constant ids padded with -1) of keys.
+    '''
+    grounder, plans, pred_ids, const_ids, arity, outdir = _worker
+    i, (j, bounds) = task
+    keys, signs, lengths = array('i'), array('b'), array('i')
+    padding = [-1] * arity
+    before = (grounder.stats.total, grounder.stats.emitted, grounder.stats.falsified)
+    for ground in grounder.ground_clause(j, leading(grounder, j, bounds), plans.get(j)):
+        for pred, args, sign in ground:
+            keys.append(pred_ids[pred])
+            keys.extend([const_ids[c] for c in args])
+            keys.extend(padding[len(args):])
+            signs.append(sign)
+        lengths.append(len(ground))
+    path = os.path.join(outdir, str(i))
+    np.save(path + '.keys.npy', np.frombuffer(keys, dtype=np.int32).reshape(-1, arity + 1))
+    np.save(path + '.signs.npy', np.frombuffer(signs, dtype=np.int8))
+    np.save(path + '.lengths.npy', np.frombuffer(lengths, dtype=np.int32))
+    stats = grounder.stats
+    return path, j, (stats.total - before[0], stats.emitted - before[1], stats.falsified - before[2])
+
+def ground_parallel(grounder, processes=None, chunks=None, tmpdir=None):
+    '''
+    Ground all clauses of a Grounder by a pool of processes and merge the
+    results into one GroundNetwork. Work is sharded by clause and by the
+    binding of the first variable of each clause, and the hash indexes of
+    the evidence are built once before the workers are forked, so tasks
+    carry only the bounds of their shards. Shards are shipped back as files
+    in tmpdir which are memory-mapped by the parent. Ground atoms are
+    interned by sorting their integer keys.
+    '''
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if chunks is None:
+        chunks = processes * 4
+
+    predicates = sorted(set(p for lits, _ in grounder.clauses for p, _, _ in lits))
+    pred_ids = {p: i for i, p in enumerate(predicates)}
+    const_ids = {c: i for i, c in enumerate(grounder.constants)}
+    arity = max([len(args) for lits, _ in grounder.clauses for _, args, _ in lits] + [0])
+
+    tasks = list(enumerate(shards(grounder, chunks)))
+    plans = {}
+    for _, (j, bounds) in tasks:
+        if bounds is not None and j not in plans:
+            plans[j] = grounder.join_plan(grounder.clauses[j][0], grounder.clause_variables(j)[:1])
+
+    outdir = tempfile.mkdtemp(dir=tmpdir)
+    try:
+        state = (grounder, plans, pred_ids, const_ids, arity, outdir)
+        with pool(processes, _init_worker, (state,)) as executor:
+            results = list(executor.map(_ground_task, tasks))
+
+        keys, signs, lengths, weights = [], [], [], []
+        for path, j, (total, emitted, falsified) in results:
+            grounder.stats.total += total
+            grounder.stats.emitted += emitted
+            grounder.stats.falsified += falsified
+            keys.append(np.load(path + '.keys.npy', mmap_mode='r'))
+            signs.append(np.load(path + '.signs.npy', mmap_mode='r'))
+            lengths.append(np.load(path + '.lengths.npy', mmap_mode='r'))
+            weights.append(np.full(len(lengths[-1]), grounder.clauses[j][1]))
+        keys = np.concatenate(keys) if keys else np.zeros((0, arity + 1), dtype=np.int32)
+        signs = np.concatenate(signs).astype(bool) if signs else np.zeros(0, dtype=bool)
+        lengths = np.concatenate(lengths).astype(np.int64) if lengths else np.zeros(0, dtype=np.int64)
+        weights = np.concatenate(weights) if weights else np.zeros(0)
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+    atoms, lits = np.unique(keys, axis=0, return_inverse=True)
+    atom_arity = (atoms[:, 1:] >= 0).sum(axis=1)
+    atom_ptr = np.zeros(len(atoms) + 1, dtype=np.int64)
+    np.cumsum(atom_arity, out=atom_ptr[1:])
+    clause_ptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=clause_ptr[1:])
+    return GroundNetwork(
+        predicates, list(grounder.constants),
+        atoms[:, 0].astype(np.int32), atom_ptr,
+        atoms[:, 1:][atoms[:, 1:] >= 0].astype(np.int32),
+        clause_ptr, lits.reshape(-1).astype(np.int32), signs, weights)
@@ -0,0 +1,170 @@
+'Profiling of the phases of loading, training and querying models'
+
+import time
+import tracemalloc
+from syntax import *
+
+__all__ = ['PhaseStats', 'FormulaStats', 'Profiler', 'NULL_PHASE', 'formula_size']
+
+def formula_size(f):
+    'Number of atom occurrences of a formula'
+    if isinstance(f, Atom):
+        return 1
+    if isinstance(f, (Not, Forall, Exists)):
+        return formula_size(f.f)
+    return formula_size(f.f1) + formula_size(f.f2)
+
+class PhaseStats(object):
+    '''
+    Measurements of a phase. name is the path of the phase and its enclosing
+    phases joined by '/' (e.g. 'query/ground/cnf'), time is the wall time in
+    seconds and counts maps names to numbers recorded by the phase. If
+    memory is traced, allocated is the net number of bytes allocated by the
+    phase and peak is the largest number of bytes allocated at once.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.time = 0.0
+        self.allocated = None
+        self.peak = None
+        self.counts = {}
+
+    def record(self, **counts):
+        'Record numbers of the phase'
+        self.counts.update(counts)
+
+    def __repr__(self):
+        memory = '' if self.peak is None else ', allocated={}, peak={}'.format(
+            self.allocated, self.peak)
+        return 'PhaseStats({!r}, time={:.6f}{}, counts={!r})'.format(
+            self.name, self.time, memory, self.counts)
+
+class FormulaStats(object):
+    '''
+    Sizes of the conjunctive normal form of a formula: the numbers of its
+    clauses, of the definitions of auxiliary atoms and of the literals of
+    both, and the number of atom occurrences of the formula itself.
+    '''
+    def __init__(self, formula, clauses, definitions, literals):
+        self.formula = formula
+        self.clauses = clauses
+        self.definitions = definitions
+        self.literals = literals
+        self.size = formula_size(formula)
+
+    @property
+    def expansion(self):
+        'Ratio of the number of literals of the CNF to the size of the formula'
+        return self.literals / self.size
+
+    def __repr__(self):
+        return 'FormulaStats(clauses={}, definitions={}, literals={}, expansion={:.2f})'.format(
+            self.clauses, self.definitions, self.literals, self.expansion)
+
+class _NullPhase(object):
+    'A phase which measures nothing'
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, **counts):
+        pass
+
+# The phase of disabled profilers
+NULL_PHASE = _NullPhase()
+
+class _Phase(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.stats = PhaseStats(name)
+
+    def __enter__(self):
+        profiler = self.profiler
+        stack = profiler._stack
+        if stack:
+            self.stats.name = stack[-1].stats.name + '/' + self.stats.name
+        if profiler.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started = True
+            else:
+                self.started = False
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.current = self.peak = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self.stats
+
+    def __exit__(self, *exc):
+        stats = self.stats
+        stats.time = time.perf_counter() - self.start
+        profiler = self.profiler
+        profiler._stack.pop()
+        if profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stats.allocated = current - self.current
+            stats.peak = max(self.peak, peak) - self.current
+            if profiler._stack:
+                outer = profiler._stack[-1]
+                outer.peak = max(outer.peak, peak)
+            if self.started:
+                tracemalloc.stop()
+        profiler.phases.append(stats)
+        for hook in profiler.hooks:
+            hook(stats)
+        return False
+
+class Profiler(object):
+    '''
+    Collector of PhaseStats of the operations of a MarkovLogicNetwork, in
+    the order in which the phases end (inner phases come before their
+    enclosing phases). Each hook is called with the PhaseStats of each phase
+    when it ends. If memory is true, allocations are traced by tracemalloc,
+    which slows down the phases considerably.
+
+    formulas is the list of FormulaStats of the formulas of the model when
+    they were last translated to clauses, and sampler is the SamplerStats
+    of the last sampling inference.
+    '''
+    def __init__(self, memory=False, hooks=()):
+        self.memory = memory
+        self.hooks = list(hooks)
+        self.phases = []
+        self.formulas = []
+        self.sampler = None
+        self._stack = []
+
+    def phase(self, name):
+        'A context manager which measures a phase and gives its PhaseStats'
+        return _Phase(self, name)
+
+    def clear(self):
+        'Forget all measurements'
+        self.phases = []
+        self.formulas = []
+        self.sampler = None
+
+    def times(self):
+        'Map names of phases to their total wall times'
+        result = {}
+        for p in self.phases:
+            result[p.name] = result.get(p.name, 0.0) + p.time
+        return result
+
+    def summary(self):
+        'Measurements as a dictionary of lists and numbers'
+        return {
+            'phases': [dict(name=p.name, time=p.time, allocated=p.allocated, peak=p.peak,
+                            **p.counts) for p in self.phases],
+            'formulas': [dict(formula=str(s.formula), clauses=s.clauses,
+                              definitions=s.definitions, literals=s.literals,
+                              expansion=s.expansion) for s in self.formulas],
+            'sampler': None if self.sampler is None else dict(
+                flips=self.sampler.flips, steps=self.sampler.steps, time=self.sampler.time,
+                flips_per_second=self.sampler.flips_per_second),
+            }
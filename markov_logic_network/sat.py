@@ -0,0 +1,238 @@
+'Truth assignments of ground networks with incremental clause bookkeeping'
+
+import numpy as np
+
+__all__ = ['ClauseState', 'WeightedClauseState', 'SamplerStats']
+
+class SamplerStats(object):
+    'Counters of sampling and local search, accumulated over runs'
+    def __init__(self):
+        self.flips = 0      # number of flipped atoms
+        self.steps = 0      # number of samples (or tries of local search)
+        self.time = 0.0     # wall time in seconds
+
+    @property
+    def flips_per_second(self):
+        return self.flips / self.time if self.time else 0.0
+
+    def __repr__(self):
+        return 'SamplerStats(flips={}, steps={}, time={:.6f}, flips_per_second={:.0f})'.format(
+            self.flips, self.steps, self.time, self.flips_per_second)
+
+class ClauseState(object):
+    '''
+    A truth assignment of the atoms of a GroundNetwork together with the
+    number of true literals of each clause.
+
+    Only active clauses are tracked as satisfiability constraints: the list
+    of unsatisfied active clauses is maintained so that flipping an atom
+    costs O(number of clauses touching the atom). flips counts the flips
+    made since the state was created.
+    '''
+    def __init__(self, network, state, active=None):
+        self.network = network
+        self.flips = 0
+        ptr, clauses, positions = network.atom_clauses()
+        self._ptr = ptr.tolist()
+        self._adj = clauses.tolist()
+        self._adj_signs = network.signs[positions].tolist()
+        self._lit_clauses = network.literal_clauses()
+        self.reset(state, active)
+
+    def reset(self, state, active=None):
+        'Set the assignment and the active clauses, recomputing all counts'
+        network = self.network
+        state = np.asarray(state, dtype=bool)
+        lit_true = state[network.lits] == network.signs
+        counts = np.bincount(self._lit_clauses, weights=lit_true, minlength=network.n_clauses)
+        if active is None:
+            active = np.ones(network.n_clauses, dtype=bool)
+        self.state = state.tolist()
+        self.counts = counts.astype(np.int64).tolist()
+        self.active = np.asarray(active, dtype=bool).tolist()
+        self.unsat = np.flatnonzero((counts == 0) & active).tolist()
+        self._where = [-1] * network.n_clauses
+        for i, c in enumerate(self.unsat):
+            self._where[c] = i
+
+    def assignment(self):
+        return np.array(self.state, dtype=bool)
+
+    def satisfied(self):
+        'Return a boolean array which tells whether each clause is satisfied'
+        return np.array(self.counts) > 0
+
+    def active_atoms(self):
+        'Atoms which appear in active clauses'
+        active = np.array(self.active, dtype=bool)
+        return np.unique(self.network.lits[active[self._lit_clauses]]).tolist()
+
+    def clause_atoms(self, c):
+        network = self.network
+        return network.lits[network.clause_ptr[c]:network.clause_ptr[c+1]].tolist()
+
+    def _add_unsat(self, c):
+        self._where[c] = len(self.unsat)
+        self.unsat.append(c)
+
+    def _remove_unsat(self, c):
+        i = self._where[c]
+        last = self.unsat.pop()
+        if last != c:
+            self.unsat[i] = last
+            self._where[last] = i
+        self._where[c] = -1
+
+    def flip(self, a):
+        'Flip the truth value of atom a'
+        value = not self.state[a]
+        self.state[a] = value
+        self.flips += 1
+        counts, active = self.counts, self.active
+        adj, signs = self._adj, self._adj_signs
+        for k in range(self._ptr[a], self._ptr[a+1]):
+            c = adj[k]
+            if signs[k] == value:
+                counts[c] += 1
+                if counts[c] == 1 and active[c]:
+                    self._remove_unsat(c)
+            else:
+                counts[c] -= 1
+                if counts[c] == 0 and active[c]:
+                    self._add_unsat(c)
+
+    def break_count(self, a):
+        'Number of active clauses which become unsatisfied by flipping a'
+        n = 0
+        value = self.state[a]
+        counts, active = self.counts, self.active
+        adj, signs = self._adj, self._adj_signs
+        for k in range(self._ptr[a], self._ptr[a+1]):
+            c = adj[k]
+            if active[c] and counts[c] == 1 and signs[k] == value:
+                n += 1
+        return n
+
+    def make_count(self, a):
+        'Number of active clauses which become satisfied by flipping a'
+        n = 0
+        counts, active = self.counts, self.active
+        adj = self._adj
+        for k in range(self._ptr[a], self._ptr[a+1]):
+            c = adj[k]
+            if active[c] and counts[c] == 0:
+                n += 1
+        return n
+
+class WeightedClauseState(ClauseState):
+    '''
+    A ClauseState which also maintains the total cost of violated clauses
+    and, for each atom, the cost added (breaks) and removed (makes) by
+    flipping it.
+
+    A clause of positive weight w costs w when it is unsatisfied and a
+    clause of negative weight w costs -w when it is satisfied. Hard clauses
+    (infinite weights) cost hard_weight. unsat is the list of violated
+    clauses.
+    '''
+    def __init__(self, network, state, hard_weight=None):
+        w = network.weights
+        if hard_weight is None:
+            hard_weight = np.abs(w[np.isfinite(w)]).sum() + 1.0
+        self.costs = np.where(np.isinf(w), hard_weight, np.abs(w)).tolist()
+        self.positive = (w > 0).tolist()
+        self._clause_ptr = network.clause_ptr.tolist()
+        self._lits = network.lits.tolist()
+        self._signs = network.signs.tolist()
+        ClauseState.__init__(self, network, state)
+
+    def reset(self, state, active=None):
+        ClauseState.reset(self, state)
+        network = self.network
+        counts = np.array(self.counts)
+        costs = np.array(self.costs)
+        positive = np.array(self.positive, dtype=bool)
+        violated = np.where(positive, counts == 0, counts > 0) & (costs > 0)
+        self.cost = float(costs[violated].sum())
+        self.unsat = np.flatnonzero(violated).tolist()
+        self._where = [-1] * network.n_clauses
+        for i, c in enumerate(self.unsat):
+            self._where[c] = i
+
+        # Clauses with no true literal contribute to all of their atoms and
+        # clauses with one true literal contribute to that atom.
+        state = np.asarray(state, dtype=bool)
+        lit_true = state[network.lits] == network.signs
+        lit_clauses = self._lit_clauses
+        lit_costs = costs[lit_clauses]
+        lit_positive = positive[lit_clauses]
+        zero = counts[lit_clauses] == 0
+        one = (counts[lit_clauses] == 1) & lit_true
+        n = network.n_atoms
+        makes = np.bincount(network.lits, weights=lit_costs * ((zero & lit_positive) | (one & ~lit_positive)), minlength=n)
+        breaks = np.bincount(network.lits, weights=lit_costs * ((zero & ~lit_positive) | (one & lit_positive)), minlength=n)
+        self.makes = makes.tolist()
+        self.breaks = breaks.tolist()
+
+    def delta(self, a):
+        'Change of the cost by flipping a'
+        return self.breaks[a] - self.makes[a]
+
+    def _zero(self, c, sign):
+        'Add (sign=1) or remove (sign=-1) the contribution of c with no true literal'
+        w = sign * self.costs[c]
+        table = self.makes if self.positive[c] else self.breaks
+        for k in range(self._clause_ptr[c], self._clause_ptr[c+1]):
+            table[self._lits[k]] += w
+
+    def _one(self, c, a, sign):
+        'Add or remove the contribution of c whose only true literal is of a'
+        if self.positive[c]:
+            self.breaks[a] += sign * self.costs[c]
+        else:
+            self.makes[a] += sign * self.costs[c]
+
+    def _violate(self, c, sign):
+        'Make c violated (sign=1) or not violated (sign=-1)'
+        self.cost += sign * self.costs[c]
+        if sign > 0:
+            self._add_unsat(c)
+        else:
+            self._remove_unsat(c)
+
+    def _true_atom(self, c, other):
+        'The atom of the true literal of c other than atom other'
+        state = self.state
+        for k in range(self._clause_ptr[c], self._clause_ptr[c+1]):
+            b = self._lits[k]
+            if b != other and state[b] == self._signs[k]:
+                return b
+
+    def flip(self, a):
+        'Flip the truth value of atom a'
+        value = not self.state[a]
+        self.state[a] = value
+        self.flips += 1
+        counts = self.counts
+        adj, signs = self._adj, self._adj_signs
+        for k in range(self._ptr[a], self._ptr[a+1]):
+            c = adj[k]
+            if self.costs[c] == 0:
+                counts[c] += 1 if signs[k] == value else -1
+                continue
+            if signs[k] == value:
+                counts[c] += 1
+                if counts[c] == 1:
+                    self._zero(c, -1)
+                    self._one(c, a, 1)
+                    self._violate(c, -1 if self.positive[c] else 1)
+                elif counts[c] == 2:
+                    self._one(c, self._true_atom(c, a), -1)
+            else:
+                counts[c] -= 1
+                if counts[c] == 0:
+                    self._one(c, a, -1)
+                    self._zero(c, 1)
+                    self._violate(c, 1 if self.positive[c] else -1)
+                elif counts[c] == 1:
+                    self._one(c, self._true_atom(c, a), 1)
@@ -0,0 +1,102 @@
+'On-disk format of ground networks which can be memory-mapped'
+
+import os
+import json
+import struct
+import tempfile
+import numpy as np
+from network import GroundNetwork
+
+__all__ = ['InvalidNetworkFile', 'save_network', 'read_header', 'load_network']
+
+# File layout:
+#   magic (8 bytes), format version (uint32), header length (uint32)
+#   header: JSON with hashes, predicates, constants and array descriptors
+#   arrays: raw little-endian data, each aligned to ALIGN bytes
+MAGIC = b'MLNGRND\0'
+VERSION = 1
+ALIGN = 64
+ARRAYS = ['atom_pred', 'atom_ptr', 'atom_args', 'clause_ptr', 'lits', 'signs', 'weights']
+
+class InvalidNetworkFile(Exception):
+    'Invalid Ground Network File'
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+def save_network(network, path, model_hash='', evidence_hash=''):
+    'Write a GroundNetwork to path'
+    arrays = {}
+    offset = 0
+    for name in ARRAYS:
+        a = np.ascontiguousarray(getattr(network, name))
+        a = a.astype(a.dtype.newbyteorder('<'))
+        arrays[name] = a
+    descriptors = {}
+    for name in ARRAYS:
+        a = arrays[name]
+        descriptors[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = _align(offset + a.nbytes)
+    header = json.dumps({
+        'model_hash': model_hash,
+        'evidence_hash': evidence_hash,
+        'predicates': list(network.predicates),
+        'constants': list(network.constants),
+        'arrays': descriptors,
+        }).encode('utf-8')
+    start = _align(16 + len(header))
+    # Write a new file and rename it over path, so that readers which have
+    # memory-mapped the old file keep its data instead of seeing it truncated
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + struct.pack('<II', VERSION, len(header)) + header)
+            for name in ARRAYS:
+                f.seek(start + descriptors[name]['offset'])
+                f.write(arrays[name].tobytes())
+            f.truncate(start + offset)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def read_header(path):
+    'Read the header of a ground network file as a dict'
+    with open(path, 'rb') as f:
+        prefix = f.read(16)
+        if len(prefix) < 16 or prefix[:8] != MAGIC:
+            raise InvalidNetworkFile('Not a ground network file: {}'.format(path))
+        version, length = struct.unpack('<II', prefix[8:])
+        if version != VERSION:
+            raise InvalidNetworkFile('Unsupported version: {}'.format(version))
+        try:
+            header = json.loads(f.read(length).decode('utf-8'))
+        except ValueError:
+            raise InvalidNetworkFile('Invalid header: {}'.format(path))
+    header['start'] = _align(16 + length)
+    return header
+
+def load_network(path, model_hash=None, evidence_hash=None):
+    '''
+    Open a ground network file as a GroundNetwork whose arrays are
+    read-only memory maps of the file. If hashes are given, they must
+    match those in the header.
+    '''
+    header = read_header(path)
+    if model_hash is not None and header['model_hash'] != model_hash:
+        raise InvalidNetworkFile('Model hash mismatch: {}'.format(path))
+    if evidence_hash is not None and header['evidence_hash'] != evidence_hash:
+        raise InvalidNetworkFile('Evidence hash mismatch: {}'.format(path))
+    size = os.path.getsize(path)
+    arrays = []
+    for name in ARRAYS:
+        d = header['arrays'][name]
+        dtype, shape = np.dtype(d['dtype']), tuple(d['shape'])
+        if header['start'] + d['offset'] + dtype.itemsize * int(np.prod(shape)) > size:
+            raise InvalidNetworkFile('Truncated ground network file: {}'.format(path))
+        if np.prod(shape) == 0:
+            arrays.append(np.zeros(shape, dtype=dtype))
+        else:
+            arrays.append(np.memmap(path, dtype=dtype, mode='r',
+                                    offset=header['start'] + d['offset'], shape=shape))
+    return GroundNetwork(header['predicates'], header['constants'], *arrays)
@@ -3,17 +3,21 @@
 from pprinter import *
 from collections import namedtuple
 from io import StringIO
+import gc
+import sys
+import os
 
 __all__ = [
     'LexError', 'ParserError', 'EvaluationError',
     'Imply', 'Equiv', 'And', 'Or', 'Forall', 'Exists', 'Not', 'Atom', 'Apply',
-    'tokenize', 'parse_mln', 'parse_formula', 'parse_term', 'eval_term'
+    'tokenize', 'iter_mln', 'parse_program', 'parse_mln', 'parse_formula', 'parse_term', 'eval_term',
+    'set_interning', 'interned'
     ]
 
 # === A Class for Tree Nodes ===
 
 def _eq_node(self, other):
-    return type(self) == type(other) and tuple.__eq__(self, other)
+    return self is other or (type(self) == type(other) and tuple.__eq__(self, other))
 
 def _ne_node(self, other):
     return not _eq_node(self, other)
@@ -38,16 +42,109 @@ def _le_node(self, other):
     n2 = type(other).__name__
     return n1 <= n2 or (n1 == n2 and tuple.__le__(self, other))
 
+def _reduce_node(self):
+    return (type(self), tuple(self))
+
+_node_classes = []
+
 def _node(name, fields):
-    klass = namedtuple(name, fields)
+    base = namedtuple(name, fields)
+    klass = type(name, (base,), {'__module__': __name__, '__slots__': ()})
     klass.__eq__ = _eq_node
     klass.__ne__ = _ne_node
     klass.__gt__ = _gt_node
     klass.__ge__ = _ge_node
     klass.__lt__ = _lt_node
     klass.__le__ = _le_node
+    klass.__hash__ = tuple.__hash__
+    klass.__reduce__ = _reduce_node
+    _node_classes.append(klass)
+    if _interning:
+        _install_interning(klass)
     return klass
 
+# === Hash-consing ===
+#
+# In the interning mode, nodes are made unique: constructing a node which
+# is structurally identical to a live node returns the live node, so nodes
+# are hashed and compared by identity. Tuples cannot be weakly referenced,
+# so the table maps structures, whose child nodes are given by their ids,
+# to nodes, and after each full garbage collection the nodes which only
+# the table refers to are removed from it.
+
+_interning = False
+_table = {}
+
+def _key_of(x):
+    if type(x) in _node_classes:
+        return id(x)
+    elif isinstance(x, tuple):
+        return tuple(_key_of(y) for y in x)
+    return x
+
+def _key(node):
+    'A key of an interned node; its children are alive as long as it is'
+    return (type(node),) + tuple(_key_of(x) for x in node)
+
+def _intern(node):
+    return _table.setdefault(_key(node), node)
+
+def _sweep(phase, info):
+    if phase != 'stop' or info['generation'] != 2:
+        return
+    # Nodes are added after their children, so removing them in reverse
+    # order frees whole trees in one pass
+    for key in list(reversed(_table)):
+        if sys.getrefcount(_table[key]) <= 2:
+            del _table[key]
+
+gc.callbacks.append(_sweep)
+
+def _new_interned(cls, *args, **kwargs):
+    return _intern(cls.__bases__[0].__new__(cls, *args, **kwargs))
+
+def _make_interned(cls, iterable):
+    return _intern(tuple.__new__(cls, iterable))
+
+def _install_interning(klass):
+    klass.__new__ = _new_interned
+    klass._make = classmethod(_make_interned)
+    klass.__hash__ = object.__hash__
+    klass.__eq__ = object.__eq__
+    klass.__ne__ = object.__ne__
+
+def _uninstall_interning(klass):
+    del klass.__new__
+    del klass._make
+    klass.__hash__ = tuple.__hash__
+    klass.__eq__ = _eq_node
+    klass.__ne__ = _ne_node
+
+def set_interning(enabled=True):
+    '''
+    Turn the interning mode of nodes on or off and return the previous
+    mode. While the mode is on, nodes are unique and equality and hashes
+    of nodes are those of their identities; nodes made outside the mode
+    must be passed through interned() before they are mixed with others.
+    '''
+    global _interning
+    previous = _interning
+    if enabled != previous:
+        for klass in _node_classes:
+            (_install_interning if enabled else _uninstall_interning)(klass)
+        _interning = enabled
+    return previous
+
+def interned(f):
+    'Rebuild a formula or term from interned nodes in the interning mode'
+    if not _interning or not isinstance(f, tuple):
+        return f
+    elif type(f) not in _node_classes:
+        return tuple(interned(x) for x in f)
+    elif _table.get(_key(f)) is f:
+        return f
+    return _intern(tuple.__new__(type(f), [interned(x) for x in f]))
+
 # === Exceptions ===
 
 class LexError(Exception):
@@ -71,6 +168,7 @@ Not = _node('Not', 'f')
 Atom = _node('Atom', 'pred args')
 Apply = _node('Apply', 'fun args')
 
+import ply
 from ply import lex
 
 tokens = (
@@ -100,34 +198,58 @@ t_FLOAT = r'[+-]?[0-9]+(\.([0-9]+)?)?([eE][+-]?[0-9]+)?'
 t_ignore = ' \t\r\n'
 
 def t_error(t):
-    raise LexError('Illegal character: {}'.format(t.value[0]))
+    column = t.lexpos - t.lexer.lexdata.rfind('\n', 0, t.lexpos)
+    raise LexError('Illegal character {!r} at line {}, column {}'.format(
+        t.value[0], t.lexer.lineno, column))
+
+_lexer_cache = []
+
+def _lexer():
+    'The lexer, which is built on first use'
+    if not _lexer_cache:
+        _lexer_cache.append(lex.lex())
+    return _lexer_cache[0]
 
-lex.lex()   # Build the lexer
+def _lines(source):
+    'Lines of a text or of an iterable of lines such as a file'
+    if isinstance(source, str):
+        return source.splitlines(True)
+    return source
 
-def tokenize(text):
-    lex.input(text)
-    while True:
-        tok = lex.token()
-        if not tok: break
-        yield tok
+def tokenize(source):
+    '''
+    Generate tokens of a text or of an iterable of lines. Each token has
+    the line number and the column (both starting at 1) where it begins.
+    '''
+    lexer = _lexer().clone()
+    for lineno, line in enumerate(_lines(source), 1):
+        lexer.lineno = lineno
+        lexer.input(line)
+        while True:
+            tok = lexer.token()
+            if not tok: break
+            tok.column = tok.lexpos + 1
+            yield tok
 
 from ply import yacc
 
 def p_error(p):
     if p:
-        raise ParserError('Syntax error at token: {}'.format(p.type))
+        raise ParserError('Syntax error at token: {} (line {}, column {})'.format(
+            p.type, p.lineno, p.column))
     else:
         raise ParserError('Syntax error at EOF')
 
 def p_mln(p):
     '''
     mln : mln_entry
-        | mln_entry mln
+        | mln mln_entry
     '''
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = [p[1]] + p[2]
+        p[0] = p[1]
+        p[0].append(p[2])
 
 def p_mln_entry(p):
     '''
@@ -135,7 +257,7 @@ def p_mln_entry(p):
               | formula
     '''
     if len(p) == 2:
-        p[0] = (p[1], 0.0)
+        p[0] = (p[1], None)
     else:
         p[0] = (p[1], p[3])
 
@@ -255,20 +377,103 @@ def p_function(p):
     'function : VARIABLE'
     p[0] = p[1]
 
-# Build the parsers
+# Parsers are built on first use. Their tables are cached as modules in
+# the directory of this file, named after the version of ply and the start
+# symbol; ply checks the grammar signature stored in the tables and builds
+# them again if the grammar is changed. If the directory is not writable,
+# tables are only kept in memory.
+
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_PREFIX = '_parsetab_' + ply.__version__.replace('.', '_') + '_'
+
+_parsers = {}
+
+def _parser(start):
+    'The LALR parser of the grammar from given start symbol'
+    parser = _parsers.get(start)
+    if parser is None:
+        parser = _parsers[start] = yacc.yacc(
+                start=start, debug=False, tabmodule=TABLE_PREFIX + start,
+                outputdir=TABLE_DIR, errorlog=yacc.NullLogger())
+    return parser
+
+def _parse(start, tokens):
+    tokens = iter(tokens)
+    return _parser(start).parse(lexer=_lexer(), tokenfunc=lambda: next(tokens, None))
+
+# Tokens which can begin a formula
+_FORMULA_BEGIN = frozenset(['CONSTANT', 'NOT', 'FORALL', 'EXISTS', 'LPAREN'])
 
-_mln_parser = yacc.yacc(start='mln')
-_formula_parser = yacc.yacc(start='formula')
-_term_parser = yacc.yacc(start='term')
+def _entries(source):
+    '''
+    Generate entries (formula, weight) of a Markov logic network, where
+    weight is None for unweighted formulas, parsing them one by one.
+    Formulas end with a closing parenthesis, so an entry ends at its weight
+    or where a formula begins after a closing parenthesis at depth 0.
+    '''
+    entry = []
+    depth = 0
+    for tok in tokenize(source):
+        if entry and depth == 0 and entry[-1].type == 'RPAREN' and tok.type in _FORMULA_BEGIN:
+            yield _parse('mln_entry', entry)
+            entry = []
+        entry.append(tok)
+        if tok.type == 'LPAREN':
+            depth += 1
+        elif tok.type == 'RPAREN':
+            depth -= 1
+        elif tok.type == 'FLOAT':
+            yield _parse('mln_entry', entry)
+            entry = []
+            depth = 0
+    if entry:
+        yield _parse('mln_entry', entry)
+
+def _is_declaration(f, w):
+    'An unweighted atom whose arguments are all variables declares types'
+    return w is None and isinstance(f, Atom) and \
+            all(isinstance(t, str) and t[:1].islower() for t in f.args)
+
+def iter_mln(source, types=None):
+    '''
+    Parse a Markov logic network given as a text or an iterable of lines
+    (such as a file) lazily and generate pairs (formula, weight). Type
+    declarations such as 'Friends(person, person)' precede the formulas;
+    they are not generated but stored in types (a map from predicates to
+    tuples of argument types) if it is given. After the first formula, an
+    unweighted atom such as 'Smokes(x)' is a formula.
+    '''
+    if types is None:
+        types = {}
+    declaring = True
+    for f, w in _entries(source):
+        if declaring and _is_declaration(f, w):
+            if types.get(f.pred, f.args) != f.args:
+                raise ParserError('Conflicting declarations of {}'.format(f.pred))
+            types[f.pred] = f.args
+        else:
+            declaring = False
+            yield f, 0.0 if w is None else w
+
+def parse_program(source):
+    '''
+    Parse a Markov logic network with type declarations. Return a pair of
+    a map from predicates to tuples of argument types and a list of
+    (formula, weight).
+    '''
+    types = {}
+    mln = list(iter_mln(source, types))
+    return types, mln
 
-def parse_mln(text):
-    return _mln_parser.parse(text)
+def parse_mln(source):
+    'Parse a Markov logic network as a list of (formula, weight)'
+    return list(iter_mln(source))
 
 def parse_formula(text):
-    return _formula_parser.parse(text)
+    return _parse('formula', tokenize(text))
 
 def parse_term(text):
-    return _term_parser.parse(text)
+    return _parse('term', tokenize(text))
 
 INDENT = 4
 
@@ -0,0 +1,353 @@
+'Exact inference by weighted model counting with component caching'
+
+import math
+import numpy as np
+from syntax import *
+from normalize import ConjunctiveNormalForm
+from grounding import Grounder
+from evidence import Database
+from enumeration import InferenceError
+
+__all__ = ['WeightedModelCounter', 'log_partition_function', 'wmc', 'probability']
+
+LOG2 = math.log(2)
+
+def _factors(w):
+    'Log factors of a clause of weight w when it is satisfied and unsatisfied'
+    if w == float('inf'):
+        return 0.0, -math.inf
+    if w == -float('inf'):
+        return -math.inf, 0.0
+    return float(w), 0.0
+
+def _logaddexp(x, y):
+    if x == -math.inf:
+        return y
+    if y == -math.inf:
+        return x
+    m = max(x, y)
+    return m + math.log1p(math.exp(-abs(x - y)))
+
+def _condition(clauses, lit):
+    '''
+    Assign literal lit (a signed variable) true in clauses given as
+    (literals, log factor if satisfied, log factor if unsatisfied). Return
+    the remaining clauses and the log factor of decided clauses.
+    '''
+    rest = []
+    factor = 0.0
+    for lits, sat, unsat in clauses:
+        if lit in lits:
+            factor += sat
+        elif -lit in lits:
+            if len(lits) == 1:
+                factor += unsat
+            else:
+                rest.append((tuple(l for l in lits if l != -lit), sat, unsat))
+        else:
+            rest.append((lits, sat, unsat))
+    return rest, factor
+
+def _components(clauses):
+    'Split clauses into lists of clauses which share no variables'
+    parent = {}
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for lits, _, _ in clauses:
+        root = find(abs(lits[0]))
+        for l in lits[1:]:
+            other = find(abs(l))
+            if other != root:
+                parent[other] = root
+    groups = {}
+    for clause in clauses:
+        groups.setdefault(find(abs(clause[0][0])), []).append(clause)
+    return list(groups.values())
+
+class WeightedModelCounter(object):
+    '''
+    Weighted model counter of the ground clauses of a GroundNetwork, where
+    the weight of a world is the exponential of the sum of the weights of
+    the clauses which it satisfies (hard clauses must be satisfied).
+
+    Counts are computed by DPLL search which splits clauses into connected
+    components counted independently and caches the counts of components
+    by their clause sets, so the cache is shared by all counts of a
+    counter. The cached search is a decision circuit whose branches are
+    kept, so marginals of all variables are computed from one count by
+    passing probabilities of reaching components down the circuit.
+    Variables are the atom ids of the network plus one.
+    '''
+    def __init__(self, network):
+        self.n_vars = network.n_atoms
+        self.clauses = []
+        lits, signs, ptr = network.lits.tolist(), network.signs.tolist(), network.clause_ptr.tolist()
+        for j, w in enumerate(network.weights.tolist()):
+            sat, unsat = _factors(w)
+            c = tuple(sorted(set(a + 1 if s else -(a + 1)
+                                 for a, s in zip(lits[ptr[j]:ptr[j+1]], signs[ptr[j]:ptr[j+1]]))))
+            if not c:
+                self.clauses.append(((), sat, unsat))
+            elif not any(-l in c for l in c):
+                self.clauses.append((c, sat, unsat))
+            elif sat:
+                self.clauses.append(((), sat, sat))     # tautology
+        # A map from clause sets of components to (log count, branches, order)
+        # where branches are lists of (literal, log weight, free variables,
+        # keys of components)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add_variable(self):
+        'Add a variable which is not in the network and return it'
+        self.n_vars += 1
+        return self.n_vars
+
+    def _top(self, hard):
+        'Log count, free variables and keys of components of all clauses'
+        factor = 0.0
+        clauses = []
+        for c in self.clauses + [(tuple(sorted(set(c))), 0.0, -math.inf) for c in hard]:
+            if c[0]:
+                clauses.append(c)
+            else:
+                factor += c[2]
+        variables = set(abs(l) for c, _, _ in clauses for l in c)
+        free = [v for v in range(1, self.n_vars + 1) if v not in variables]
+        z, keys = self._count(clauses)
+        return factor + len(free) * LOG2 + z, free, keys
+
+    def log_count(self, hard=()):
+        '''
+        Logarithm of the weighted model count of the clauses of the network
+        conjoined with hard clauses given as tuples of signed variables.
+        '''
+        return self._top(hard)[0]
+
+    def marginals(self, hard=()):
+        '''
+        Probabilities that variables are true (indexed by variables minus
+        one) given the hard clauses, or None if they are unsatisfiable.
+        '''
+        z, free, keys = self._top(hard)
+        if z == -math.inf:
+            return None
+        result = np.zeros(self.n_vars)
+        result[np.array(free, dtype=np.int64) - 1] = 0.5
+        reach = dict.fromkeys(keys, 1.0)
+        stack = list(keys)
+        seen = set(keys)
+        while stack:
+            for _, _, _, children in self.cache[stack.pop()][1]:
+                for key in children:
+                    if key not in seen:
+                        seen.add(key)
+                        stack.append(key)
+        for key in sorted(seen, key=lambda key: -self.cache[key][2]):
+            z, branches, _ = self.cache[key]
+            p = reach.pop(key, 0.0)
+            for lit, weight, free, children in branches:
+                q = p * math.exp(weight - z)
+                if lit > 0:
+                    result[lit - 1] += q
+                for v in free:
+                    result[v - 1] += 0.5 * q
+                for child in children:
+                    reach[child] = reach.get(child, 0.0) + q
+        return result
+
+    def _count(self, clauses):
+        total = 0.0
+        keys = []
+        for component in _components(clauses):
+            z, key = self._component(component)
+            total += z
+            keys.append(key)
+            if total == -math.inf:
+                break
+        return total, keys
+
+    def _lookup(self, clauses):
+        '''
+        Merge identical clauses of a component by adding factors. Return the
+        key of the component, its clauses and its cached node or None.
+        '''
+        merged = {}
+        for c, sat, unsat in clauses:
+            s, u = merged.get(c, (0.0, 0.0))
+            merged[c] = (s + sat, u + unsat)
+        clauses = [(c, s, u) for c, (s, u) in merged.items()]
+        key = frozenset(clauses)
+        node = self.cache.get(key)
+        if node is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, clauses, node
+
+    def _component(self, clauses):
+        '''
+        Log count and key of a component. The search keeps a stack of
+        frames of the components being counted instead of recursing, so
+        its depth is not limited by the Python stack.
+        '''
+        key, clauses, node = self._lookup(clauses)
+        if node is not None:
+            return node[0], key
+        stack = [_Frame(key, clauses)]
+        result = None
+        while True:
+            frame = stack[-1]
+            branch = frame.branch
+            if result is not None:
+                branch.total += result[0]
+                branch.keys.append(result[1])
+                result = None
+            if branch is not None and branch.pending and branch.total > -math.inf:
+                key, clauses, node = self._lookup(branch.pending.pop())
+                if node is None:
+                    stack.append(_Frame(key, clauses))
+                else:
+                    result = node[0], key
+                continue
+            if branch is not None:
+                weight = branch.factor + len(branch.free) * LOG2 + branch.total
+                if weight > -math.inf:
+                    frame.branches.append((branch.lit, weight, branch.free, branch.keys))
+                    frame.z = _logaddexp(frame.z, weight)
+                frame.branch = None
+            if frame.literals:
+                frame.start(frame.literals.pop())
+                continue
+            self.cache[frame.key] = (frame.z, frame.branches, len(self.cache))
+            stack.pop()
+            result = frame.z, frame.key
+            if not stack:
+                return result
+
+class _Branch(object):
+    'A branch of the search which assigns lit, with components pending to be counted'
+    __slots__ = ('lit', 'factor', 'free', 'pending', 'keys', 'total')
+
+    def __init__(self, lit, factor, free, pending):
+        self.lit = lit
+        self.factor = factor
+        self.free = free
+        self.pending = pending
+        self.keys = []
+        self.total = 0.0
+
+class _Frame(object):
+    'A component being counted by WeightedModelCounter._component'
+    __slots__ = ('key', 'clauses', 'variables', 'literals', 'z', 'branches', 'branch')
+
+    def __init__(self, key, clauses):
+        self.key = key
+        self.clauses = clauses
+        self.variables = set(abs(l) for c, _, _ in clauses for l in c)
+        units = [c[0] for c, _, unsat in clauses if len(c) == 1 and unsat == -math.inf]
+        if units:
+            self.literals = [units[0]]
+        else:
+            counts = {}
+            for c, _, _ in clauses:
+                for l in c:
+                    counts[abs(l)] = counts.get(abs(l), 0) + 1
+            x = max(counts, key=counts.get)
+            self.literals = [-x, x]     # popped from the end
+        self.z = -math.inf
+        self.branches = []
+        self.branch = None
+
+    def start(self, lit):
+        'Start the branch of lit unless it falsifies a hard clause'
+        rest, factor = _condition(self.clauses, lit)
+        if factor == -math.inf:
+            return
+        remaining = set(abs(l) for c, _, _ in rest for l in c)
+        free = [v for v in self.variables if v != abs(lit) and v not in remaining]
+        self.branch = _Branch(lit, factor, free, _components(rest)[::-1])
+
+def log_partition_function(network):
+    'Logarithm of the partition function of a GroundNetwork'
+    return WeightedModelCounter(network).log_count()
+
+def wmc(network):
+    '''
+    Compute marginal probabilities of the atoms of a GroundNetwork exactly
+    by weighted model counting. Return an array of probabilities indexed by
+    atom ids.
+    '''
+    result = WeightedModelCounter(network).marginals()
+    if result is None:
+        raise InferenceError('Hard clauses are unsatisfiable')
+    return result
+
+def _formula_clauses(counter, network, f, database, constants, variables, name):
+    '''
+    Hard ground clauses of signed variables which are equivalent to formula
+    f whose variables range over constants, as a pair (clauses,
+    definitions). Auxiliary atoms (named after name) are defined by
+    definitions, which determine them from the other atoms. Atoms whose
+    truth values are known by database are evaluated and variables maps
+    ground atoms out of the network to new variables. Return None if f is
+    false.
+    '''
+    cnf = ConjunctiveNormalForm(f, constants, mode='auto', name=name, hard=True)
+    clauses = [(c, float('inf')) for c in cnf.clauses + cnf.definitions]
+    open_world = set(l.f.pred if isinstance(l, Not) else l.pred for c, _ in clauses for l in c)
+    grounder = Grounder(clauses, database, constants, open_world=open_world)
+    result = ([], [])
+    for j in range(len(clauses)):
+        for ground in grounder.ground_clause(j):
+            lits = []
+            for pred, args, sign in ground:
+                atom = Atom(pred, args)
+                v = network.atom_id(atom)
+                if v is not None:
+                    v += 1
+                else:
+                    v = variables.get(atom)
+                    if v is None:
+                        v = variables[atom] = counter.add_variable()
+                lits.append(v if sign else -v)
+            result[j >= len(cnf.clauses)].append(tuple(lits))
+    if grounder.stats.falsified:
+        return None
+    return result
+
+def probability(network, f1, f2=None, database=None, constants=None):
+    '''
+    Compute the conditional probability P(f1 | f2) of formulas (or their
+    texts) exactly by weighted model counting. Variables of the formulas
+    range over constants (by default those of the GroundNetwork) and atoms
+    of the formulas whose truth values are known by the evidence database
+    are evaluated.
+    '''
+    if isinstance(f1, str):
+        f1 = parse_formula(f1)
+    if isinstance(f2, str):
+        f2 = parse_formula(f2)
+    if database is None:
+        database = Database()
+    if constants is None:
+        constants = network.constants
+    counter = WeightedModelCounter(network)
+    variables = {}
+    c1 = _formula_clauses(counter, network, f1, database, constants, variables, 'Query')
+    c2 = ([], []) if f2 is None else \
+        _formula_clauses(counter, network, f2, database, constants, variables, 'Given')
+    if c2 is None:
+        raise InferenceError('Condition is false: {}'.format(f2))
+    # Auxiliary atoms of both formulas are determined in both counts
+    definitions = c2[1] + ([] if c1 is None else c1[1])
+    given = counter.log_count(c2[0] + definitions)
+    if given == -math.inf:
+        raise InferenceError('Condition has probability 0: {}'.format(f2))
+    if c1 is None:
+        return 0.0
+    return math.exp(counter.log_count(c1[0] + c2[0] + definitions) - given)
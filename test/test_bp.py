@@ -0,0 +1,64 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+
+from syntax import *
+from evidence import *
+from network import *
+from model import *
+from bp import *
+import inference
+
+f = parse_formula
+
+def test_belief_propagation_tree():
+    network = GroundNetwork.from_clauses(
+        [[f('P(A)')], [f('not P(A)'), f('Q(A)')], [f('not Q(A)'), f('R(A)'), f('not S(A)')],
+         [f('S(A)')], [f('R(A)')]],
+        [1.0, 1.5, float('inf'), -0.7, 0.4])
+    stats = BeliefPropagationStats()
+    p = belief_propagation(network, tol=1e-9, stats=stats)
+    ok_(np.allclose(p, inference.simple_inference(network), atol=1e-6))
+    ok_(stats.converged)
+    eq_((stats.supernodes, stats.superfeatures), (4, 5))
+
+def test_belief_propagation_lifted():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                       : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 0.7
+    ''')
+    constants = ['C{}'.format(i) for i in range(12)]
+    world = Database(constants=constants, atoms=['Smokes(C0)'] +
+                     ['Friends({}, {})'.format(x, y) for x in constants for y in constants if x != y])
+    network = model.ground_network(world, open_world=['Smokes', 'Cancer'])
+    lifted, ground = BeliefPropagationStats(), BeliefPropagationStats()
+    p = belief_propagation(network, stats=lifted)
+    ok_(np.allclose(p, belief_propagation(network, lifted=False, stats=ground)))
+    eq_(lifted.iterations, ground.iterations)
+    eq_(ground.compression, 1.0)
+    ok_(lifted.compression > 10)
+    ok_(lifted.superedges < ground.superedges)
+
+def test_belief_propagation_options():
+    network = GroundNetwork.from_clauses([[f('P(A)'), f('Q(A)')], [f('not P(A)'), f('not Q(A)')]],
+                                         [2.0, 2.0])
+    stats = BeliefPropagationStats()
+    belief_propagation(network, max_iter=3, tol=0.0, stats=stats)
+    eq_(stats.iterations, 3)
+    ok_(not stats.converged)
+    eq_(len(belief_propagation(GroundNetwork.from_clauses([], []))), 0)
+
+def test_query_bp():
+    model = MarkovLogicNetwork()
+    model.load('forall x (Smokes(x) => Cancer(x)) : 1.5')
+    world = Database(constants=['A', 'B'], atoms=['Smokes(A)'])
+    stats = BeliefPropagationStats()
+    result = model.query(world, 'Cancer(x)', method='bp', damping=0.0, stats=stats)
+    exact = model.query(world, 'Cancer(x)', method='simple')
+    ok_(all(abs(result[a] - exact[a]) < 1e-6 for a in exact))
+    eq_(stats.atoms, 1)
@@ -0,0 +1,106 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+
+from syntax import *
+from evidence import *
+from model import *
+from cache import *
+
+f = parse_formula
+
+MODEL = '''
+forall x (Smokes(x) => Cancer(x))                        : 1.5
+forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))  : 1.1
+'''
+
+def _world():
+    return Database(atoms=['Smokes(A)', 'Friends(A, B)', 'Friends(B, C)'])
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    eq_(cache.get('a'), 1)
+    cache.put('c', 3)
+    ok_('a' in cache and 'c' in cache and 'b' not in cache)
+    eq_(cache.get('b'), None)
+    eq_((cache.stats.hits, cache.stats.misses, cache.stats.evictions), (1, 1, 1))
+    eq_(cache.stats.hit_rate, 0.5)
+
+def test_query_key():
+    key = query_key([f('P(x, f(y))'), f('Q(A)')], 'mcsat', {'seed': 0})
+    eq_(key, query_key([f('Q(A)'), f('P(z, f(x))')], 'mcsat', {'seed': 0}))
+    ok_(key != query_key([f('P(x, f(x))'), f('Q(A)')], 'mcsat', {'seed': 0}))
+    ok_(key != query_key([f('P(x, f(y))'), f('Q(A)')], 'mcsat', {'seed': 1}))
+    eq_(query_key([f('P(x)')], 'gibbs', {'init': [True]}), None)
+
+def test_query_cache():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    cache = model.enable_cache()
+    world = _world()
+    p1 = model.query(world, 'Cancer(x)', seed=0, samples=50)
+    p2 = model.query(world, 'Cancer(y)', seed=0, samples=50)
+    eq_(p1, p2)
+    eq_((cache.results.stats.hits, cache.results.stats.misses), (1, 1))
+
+    # Same network, other method
+    model.query(world, 'Cancer(x)', method='wmc')
+    eq_(cache.networks.stats.hits, 1)
+    eq_(len(cache.networks), 1)
+
+    # Changed evidence
+    world.add(f('Smokes(C)'))
+    p3 = model.query(world, 'Cancer(x)', seed=0, samples=50)
+    eq_(cache.results.stats.misses, 3)
+    eq_(len(cache.networks), 2)
+    ok_(p3 != p1)
+
+def test_invalidate():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    cache = model.enable_cache()
+    world = _world()
+    p1 = model.query(world, 'Cancer(x)', method='wmc')
+    eq_(len(cache.results), 1)
+    model.load(MODEL.replace('1.5', '-1.5'))
+    eq_((len(cache.results), len(cache.networks)), (0, 0))
+    p2 = model.query(world, 'Cancer(x)', method='wmc')
+    ok_(p2[f('Cancer(A)')] < p1[f('Cancer(A)')])
+
+    facts = ['Cancer(A)', 'Cancer(B)']
+    model.train(world, facts, max_iterations=5)
+    eq_(len(cache.results), 0)
+
+def test_evidence_hash_memo():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    model.enable_cache()
+    world = _world()
+    calls = []
+    fingerprint = world.fingerprint
+    def counted():
+        calls.append(1)
+        return fingerprint()
+    world.fingerprint = counted
+    model.query(world, 'Cancer(x)', method='wmc')
+    model.query(world, 'Cancer(x)', method='wmc')
+    model.query(world, 'Cancer(x)', seed=0, samples=20)
+    eq_(len(calls), 1)
+
+    # A change of the evidence or of the query predicates hashes it again
+    world.add(f('Smokes(C)'))
+    model.query(world, 'Cancer(x)', method='wmc')
+    model.query(world, 'Smokes(x)', method='wmc')
+    eq_(len(calls), 3)
+
+    columnar = ColumnarDatabase()
+    columnar.add('Smokes(A)')
+    h = model._evidence_hash(columnar, ['Cancer'])
+    eq_(model._evidence_hash(columnar, ['Cancer']), h)
+    columnar.add('Smokes(B)')
+    ok_(model._evidence_hash(columnar, ['Cancer']) != h)
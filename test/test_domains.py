@@ -0,0 +1,57 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+
+from syntax import *
+from evidence import *
+from domains import *
+from normalize import *
+from model import *
+
+f = parse_formula
+
+types = {'Friends': ('person', 'person'), 'Lives': ('person', 'city')}
+
+def test_infer_types():
+    eq_(infer_types(f('forall x y (Friends(x, y) and Lives(y, z) => Smokes(w))'), types),
+        {'x': 'person', 'y': 'person', 'z': 'city'})
+    assert_raises(InvalidType, infer_types, f('Friends(x, y) and Lives(y, x)'), types)
+    assert_raises(InvalidType, infer_types, f('Friends(x)'), types)
+
+def test_type_domains():
+    db = Database(atoms=['Friends(Anna, Bob)', 'Lives(Anna, Paris)', 'not Lives(Chris, Rome)'])
+    eq_(type_domains(types, db, [f('Lives(x, Tokyo)')]),
+        {'person': ['Anna', 'Bob', 'Chris'], 'city': ['Paris', 'Rome', 'Tokyo']})
+
+def test_typed_exists():
+    domains = {'person': ['Anna', 'Bob'], 'city': ['Paris']}
+    cnf = ConjunctiveNormalForm(f('forall x exists y Lives(x, y)'),
+                                ['Anna', 'Bob', 'Paris'], types, domains)
+    eq_(cnf.clauses, [[f('Lives(x0, Paris)')]])
+
+def test_typed_grounding():
+    text = '''
+    forall x y z (Friends(x, y) and Lives(x, z) => Lives(y, z)) : 1.0
+    '''
+    world = Database(atoms=['Friends(Anna, Bob)', 'Friends(Bob, Chris)',
+                            'Lives(Anna, Paris)', 'Lives(Chris, Rome)'])
+    untyped = MarkovLogicNetwork()
+    untyped.load(text)
+    typed = MarkovLogicNetwork()
+    typed.load('Friends(person, person)\nLives(person, city)\n' + text)
+    eq_(typed.types, types)
+
+    g1 = untyped.grounder(world, ['Lives'])
+    g2 = typed.grounder(world, ['Lives'])
+    clauses1 = sorted(map(str, g1.ground()))
+    clauses2 = sorted(map(str, g2.ground()))
+    eq_(g1.stats.total, 5 ** 3)
+    eq_(g2.stats.total, 3 * 3 * 2)
+    ok_(set(clauses2) <= set(clauses1))
+    ok_(all('Lives(Anna,Anna)' not in c for c in clauses2))
+
+    result = typed.query(world, 'Lives(Bob, z)', seed=0, samples=100)
+    eq_(sorted(a.args[1] for a in result), ['Paris', 'Rome'])
@@ -0,0 +1,85 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+
+from syntax import *
+from evidence import *
+from network import *
+from model import *
+from elimination import *
+import inference
+
+f = parse_formula
+
+def chain(n, w=0.7):
+    clauses = [[f('not P(C{})'.format(i)), f('P(C{})'.format(i + 1))] for i in range(n)]
+    return GroundNetwork.from_clauses(clauses + [[f('P(C0)')]], [w] * n + [1.0])
+
+def test_elimination_order():
+    order, width = elimination_order(chain(50))
+    eq_(sorted(order), list(range(51)))
+    eq_(width, 1)
+    clique = GroundNetwork.from_clauses(
+        [[f('P({})'.format(a)), f('P({})'.format(b))] for a in 'ABCDE' for b in 'ABCDE' if a < b],
+        [1.0] * 10)
+    eq_(elimination_order(clique)[1], 4)
+    # The order stops at the first atom whose neighbors exceed max_width
+    order, width = elimination_order(clique, max_width=2)
+    eq_((len(order), width), (1, 4))
+    eq_(elimination_order(chain(50), max_width=1), elimination_order(chain(50)))
+
+def test_junction_tree():
+    network = chain(4)
+    order, _ = elimination_order(network)
+    clusters, parents = junction_tree(network, order)
+    eq_(len(clusters), 5)
+    eq_(parents.count(-1), 1)
+    ok_(all(order[i] in c for i, c in enumerate(clusters)))
+    ok_(all(p > i for i, p in enumerate(parents) if p >= 0))
+
+def test_variable_elimination():
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        clauses, weights = [], []
+        for _ in range(14):
+            atoms = rng.integers(0, 12, rng.integers(1, 4))
+            clauses.append([f('P(C{})'.format(a)) if rng.random() < 0.5 else
+                            f('not P(C{})'.format(a)) for a in atoms])
+            weights.append(rng.normal() if rng.random() < 0.8 else float('inf'))
+        network = GroundNetwork.from_clauses(clauses, weights)
+        try:
+            exact = inference.simple_inference(network)
+        except inference.InferenceError:
+            assert_raises(inference.InferenceError, variable_elimination, network)
+            continue
+        ok_(np.allclose(variable_elimination(network), exact))
+
+def test_variable_elimination_chain():
+    p = variable_elimination(chain(1000))
+    ok_(np.allclose(p[:10], inference.methods['elimination'](chain(100))[:10]))
+    ok_(np.allclose(p[:3], inference.wmc(chain(100))[:3]))
+
+def test_variable_elimination_width():
+    clique = GroundNetwork.from_clauses(
+        [[f('P({})'.format(a)), f('P({})'.format(b))] for a in 'ABCDE' for b in 'ABCDE' if a < b],
+        [-1.0] * 10)
+    exact = inference.simple_inference(clique)
+    ok_(np.allclose(variable_elimination(clique, max_width=4), exact))
+    assert_raises(inference.InferenceError, variable_elimination, clique, max_width=3,
+                  fallback=None)
+    ok_(np.allclose(variable_elimination(clique, max_width=3, fallback=inference.wmc), exact))
+
+def test_query_elimination():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                     : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 1.1
+    ''')
+    world = Database(atoms=['Friends(A, B)', 'Friends(B, C)', 'Smokes(A)'])
+    result = model.query(world, 'Cancer(x) and Smokes(x)', method='elimination')
+    exact = model.query(world, 'Cancer(x) and Smokes(x)', method='simple')
+    ok_(all(np.isclose(result[a], exact[a]) for a in exact))
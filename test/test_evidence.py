@@ -0,0 +1,128 @@
+import sys
+import os
+import tempfile
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+
+from syntax import *
+from evidence import *
+from model import *
+
+db_text = '''// friends
+Friends(Anna, Bob)
+Friends(Bob, "Chris")
+!Friends(Anna, Chris)
+
+Smokes(Anna)  // a smoker
+Smokes(Bob)
+!Smokes(Bob)
+'''
+
+def test_read_evidence():
+    eq_(list(read_evidence(db_text.splitlines())), [
+        ('Friends', ('Anna', 'Bob'), True),
+        ('Friends', ('Bob', 'Chris'), True),
+        ('Friends', ('Anna', 'Chris'), False),
+        ('Smokes', ('Anna',), True),
+        ('Smokes', ('Bob',), True),
+        ('Smokes', ('Bob',), False),
+        ])
+    eq_(list(read_evidence(['Friends,Anna,Bob', '!Smokes,Bob'], 'csv')),
+        [('Friends', ('Anna', 'Bob'), True), ('Smokes', ('Bob',), False)])
+    eq_(list(read_evidence(['Friends\tAnna\tBob'], 'tsv')),
+        [('Friends', ('Anna', 'Bob'), True)])
+    assert_raises(InvalidEvidence, list, read_evidence(['Friends Anna']))
+    assert_raises(InvalidEvidence, list, read_evidence(['Friends(Anna, bob)']))
+    assert_raises(InvalidEvidence, list, read_evidence(['Friends,"anna",Bob'], 'csv'))
+
+def test_columnar_database():
+    db = load_database(db_text.splitlines(), open_world=['Cancer'])
+    eq_(db.constants, ['Anna', 'Bob', 'Chris'])
+    eq_(sorted(db.predicates()), ['Friends', 'Smokes'])
+    eq_(db.lookup('Friends', ('Anna', 'Bob')), True)
+    eq_(db.lookup('Friends', ('Anna', 'Chris')), False)
+    eq_(db.lookup('Friends', ('Chris', 'Anna')), None)
+    eq_(db.truth('Friends', ('Chris', 'Anna')), False)
+    eq_(db.lookup('Smokes', ('Bob',)), False)
+    eq_(db.truth('Cancer', ('Bob',)), None)
+    eq_(sorted(db.true_tuples('Friends')), [('Anna', 'Bob'), ('Bob', 'Chris')])
+    eq_(len(db.true_tuples('Smokes')), 1)
+    eq_(len(db), 5)
+
+def test_small_chunks():
+    db = ColumnarDatabase(chunk=2)
+    load_database(db_text.splitlines(), db=db)
+    eq_(db.lookup('Smokes', ('Bob',)), False)
+    eq_(len(db), 5)
+    reference = ColumnarDatabase()
+    load_database(db_text.splitlines(), db=reference)
+    eq_(db.fingerprint(), reference.fingerprint())
+
+def test_merge_runs():
+    db = ColumnarDatabase(chunk=7)
+    reference = Database()
+    for i in range(200):
+        atom = 'Friends(P{}, P{})'.format(i * 37 % 50, i % 3)
+        db.add(atom, i % 5 != 0)
+        reference.add(atom, i % 5 != 0)
+        if i % 60 == 0:     # merge the runs between additions
+            eq_(db.lookup('Friends', ('P0', 'P0')), reference.lookup('Friends', ('P0', 'P0')))
+    eq_(len(db), len(reference))
+    eq_(sorted(db.true_tuples('Friends')), sorted(reference.true_tuples('Friends')))
+    for args in reference.tuples('Friends'):
+        eq_(db.lookup('Friends', args), reference.lookup('Friends', args))
+
+def test_not_ground():
+    db = ColumnarDatabase()
+    assert_raises(InvalidEvidence, db.add, 'Smokes(x)')
+    assert_raises(InvalidEvidence, Database().add, 'Smokes(x)')
+    eq_(len(db), 0)
+
+def test_types():
+    db = ColumnarDatabase(types={'Likes': ('person', 'food')})
+    db.extend(read_evidence(['Likes(Anna, Pizza)', 'Likes(Bob, Pizza)']))
+    eq_(db.domains, {'person': ['Anna', 'Bob'], 'food': ['Pizza']})
+    assert_raises(InvalidEvidence, db.add_tuple, 'Likes', ('Anna',))
+
+def test_load_file():
+    path = os.path.join(tempfile.mkdtemp(), 'world.csv')
+    with open(path, 'w') as f:
+        f.write('Friends,Anna,Bob\n!Smokes,Bob\n')
+    db = load_database(path)
+    eq_(db.lookup('Friends', ('Anna', 'Bob')), True)
+    eq_(db.lookup('Smokes', ('Bob',)), False)
+
+def test_query_columnar():
+    model = MarkovLogicNetwork()
+    model.load('forall x y (Friends(x, y) and Smokes(x) => Smokes(y)) : 1.0')
+    world = load_database(['Friends(A, B)', 'Friends(B, C)', 'Smokes(A)'])
+    reference = Database(atoms=['Friends(A, B)', 'Friends(B, C)', 'Smokes(A)'])
+    eq_(sorted(map(str, model.grounder(world, ['Smokes']).ground())),
+        sorted(map(str, model.grounder(reference, ['Smokes']).ground())))
+
+def test_retract():
+    db = Database(atoms=['Smokes(Anna)', 'not Smokes(Bob)'])
+    version = db.version
+    db.retract('Smokes(Anna)')
+    db.retract('not Smokes(Bob)')
+    eq_(db.lookup('Smokes', ('Anna',)), None)
+    eq_(db.lookup('Smokes', ('Bob',)), None)
+    ok_(db.is_closed('Smokes'))
+    eq_(db.version, version + 2)
+    assert_raises(InvalidEvidence, db.retract, 'Smokes(x)')
+
+def test_retract_columnar():
+    db = load_database(db_text.splitlines(), db=ColumnarDatabase(chunk=2))
+    version = db.version
+    db.retract('Friends(Anna, Bob)')
+    db.retract('not Smokes(Bob)')
+    db.retract('Smokes(Dora)')
+    eq_(db.lookup('Friends', ('Anna', 'Bob')), None)
+    eq_(db.lookup('Smokes', ('Bob',)), None)
+    eq_(db.truth('Friends', ('Anna', 'Bob')), False)
+    eq_(sorted(db.true_tuples('Friends')), [('Bob', 'Chris')])
+    eq_(db.version, version + 3)
+    db.add('Friends(Anna, Bob)')
+    eq_(db.lookup('Friends', ('Anna', 'Bob')), True)
@@ -0,0 +1,81 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+from itertools import product
+
+from syntax import *
+from evidence import *
+from grounding import *
+from model import *
+
+f = parse_formula
+
+def friends_world():
+    return Database(atoms=['Friends(A, B)', 'Friends(B, C)', 'Smokes(A)'],
+                    open_world=['Smokes'])
+
+def test_formula_constants():
+    eq_(formula_constants(f('forall x P(x, A) and Q(f(B), A)')), ['A', 'B'])
+
+def test_weighted_clauses():
+    clauses = weighted_clauses([(f('forall x (P(x) <=> Q(x))'), 1.0)], ['A'])
+    eq_(clauses, [([f('not P(x0)'), f('Q(x0)')], 0.5), ([f('P(x0)'), f('not Q(x0)')], 0.5)])
+
+def test_ground():
+    clauses = [([f('not Friends(x, y)'), f('not Smokes(x)'), f('Smokes(y)')], 1.0)]
+    grounder = Grounder(clauses, friends_world())
+    eq_(sorted(grounder.ground()), [
+        ([f('Smokes(B)')], 1.0),
+        ([f('not Smokes(B)'), f('Smokes(C)')], 1.0),
+        ])
+    eq_(grounder.stats.total, 9)
+    eq_(grounder.stats.emitted, 2)
+    eq_(grounder.stats.pruned, 7)
+
+def test_ground_falsified():
+    clauses = [([f('not Friends(x, y)'), f('Friends(y, x)')], 1.0)]
+    grounder = Grounder(clauses, friends_world())
+    eq_(list(grounder.ground()), [])
+    eq_(grounder.stats.falsified, 2)
+    # Falsified groundings of a hard clause are kept as empty clauses
+    grounder = Grounder([(clauses[0][0], float('inf'))], friends_world())
+    eq_(list(grounder.ground()), [([], float('inf'))] * 2)
+    eq_(grounder.stats.falsified, 2)
+
+def test_ground_open_world():
+    clauses = [([f('not Smokes(x)')], 1.0)]
+    grounder = Grounder(clauses, friends_world(), open_world=['Smokes'])
+    eq_(list(grounder.ground()), [([f('not Smokes(B)')], 1.0), ([f('not Smokes(C)')], 1.0)])
+
+def test_ground_functions():
+    clauses = [([f('not Friends(x, y)'), f('Smokes(best(x))')], 1.0)]
+    grounder = Grounder(clauses, friends_world(), functions={'best': lambda x: 'C'})
+    eq_(list(grounder.ground()), [([f('Smokes(C)')], 1.0)] * 2)
+
+def test_ground_matches_enumeration():
+    world = Database(atoms=['R(A, B)', 'R(B, B)', 'R(C, A)', 'not S(B)', 'S(C)'],
+                     open_world=['S'])
+    clause = [f('not R(x, y)'), f('not R(y, z)'), f('S(x)'), f('not S(z)')]
+    expected = []
+    for x, y, z in product(world.constants, repeat=3):
+        s_x, s_z = world.truth('S', (x,)), world.truth('S', (z,))
+        if not (world.truth('R', (x, y)) and world.truth('R', (y, z))):
+            continue
+        if s_x is True or s_z is False:
+            continue
+        lits = ([f('S({})'.format(x))] if s_x is None else []) + \
+               ([f('not S({})'.format(z))] if s_z is None else [])
+        if lits:
+            expected.append(lits)
+    grounder = Grounder([(clause, 1.0)], world)
+    eq_(sorted(map(str, (c for c, _ in grounder.ground()))), sorted(map(str, expected)))
+    eq_(grounder.stats.total, 27)
+
+def test_model_grounder():
+    model = MarkovLogicNetwork()
+    model.load('forall x y (Friends(x, y) and Smokes(x) => Smokes(y)) : 1.0')
+    grounder = model.grounder(friends_world())
+    eq_(len(list(grounder.ground())), 2)
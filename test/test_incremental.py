@@ -0,0 +1,134 @@
+import sys
+import os
+import random
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+
+from syntax import *
+from evidence import *
+from model import *
+from incremental import *
+from inference import InferenceError
+
+f = parse_formula
+
+MODEL = '''
+Friends(person, person)
+Smokes(person)
+Cancer(person)
+forall x (Smokes(x) => Cancer(x))                         : 1.5
+forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))   : 1.1
+forall x (not exists y Friends(x, y) => Smokes(x))        : 0.8
+'''
+
+people = ['P{}'.format(i) for i in range(8)]
+
+def _world(world=None):
+    if world is None:
+        world = Database()
+    for c in people:
+        world.add_constant(c)
+    for i in range(0, 8, 2):
+        world.add(Atom('Friends', (people[i], people[(i + 3) % 8])))
+        world.add(Atom('Smokes', (people[i],)))
+    return world
+
+def _clauses(network):
+    'Ground clauses of a network as a sorted list of comparable tuples'
+    ptr, lits, signs = network.clause_ptr, network.lits, network.signs
+    return sorted((tuple(sorted((repr(network.atom(a)), bool(s))
+                                for a, s in zip(lits[ptr[j]:ptr[j+1]], signs[ptr[j]:ptr[j+1]]))),
+                   float(network.weights[j])) for j in range(network.n_clauses))
+
+def test_incremental_grounding():
+    _check_incremental(_world())
+    _check_incremental(_world(ColumnarDatabase()))
+
+def _check_incremental(world):
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    model.incremental = True
+    reference = MarkovLogicNetwork()
+    reference.load(MODEL)
+    reference.simplify = False
+    open_world = ['Cancer']
+    eq_(_clauses(model.ground_network(world, open_world)),
+        _clauses(reference.ground_network(world, open_world)))
+
+    rng = random.Random(0)
+    for _ in range(40):
+        p, q = rng.choice(people), rng.choice(people)
+        atom = rng.choice([Atom('Friends', (p, q)), Atom('Smokes', (p,)), Atom('Cancer', (p,))])
+        change = rng.randrange(3)
+        if change == 0:
+            model.add_evidence(world, atom, rng.random() < 0.5)
+        elif change == 1:
+            model.retract_evidence(world, atom)
+        elif world.truth(atom.pred, atom.args) is not None:
+            model.flip_evidence(world, atom)
+        eq_(_clauses(model.ground_network(world, open_world)),
+            _clauses(reference.ground_network(world, open_world)))
+
+def test_unknown_atom_uses_index():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    model.incremental = True
+    world = _world()
+    network = model.ground_network(world, ['Cancer'])
+    live = model._incremental(world, ['Cancer'])
+    ok_(live is not None)
+    # Cancer(P0) is in one ground clause, Smokes(P0) => Cancer(P0)
+    eq_(model.add_evidence(world, 'Cancer(P0)'), 1)
+    ok_(model._incremental(world, ['Cancer']) is live)
+    eq_(model.ground_network(world, ['Cancer']).n_clauses, network.n_clauses - 1)
+
+def test_changed_evidence_out_of_api():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    model.incremental = True
+    world = _world()
+    model.ground_network(world, ['Cancer'])
+    live = model._incremental(world, ['Cancer'])
+    world.add('Smokes(P1)')
+    eq_(model._incremental(world, ['Cancer']), None)
+    live = model._incremental(world, ['Cancer'], create=True)
+    eq_(model.add_evidence(world, 'Smokes(Q)'), 0)     # a new constant
+    eq_(model._incremental(world, ['Cancer']), None)
+    ok_(model._incremental(world, ['Cancer'], create=True) is not live)
+
+def test_flip_unknown():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    assert_raises(InvalidEvidence, model.flip_evidence, _world(), 'Cancer(P0)')
+
+def test_warm_start():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    model.incremental = True
+    world = _world()
+    p1 = model.query(world, 'Cancer(x)', samples=200, seed=0)
+    live = model._incremental(world, ['Cancer'])
+    ok_(live.state is not None)
+    model.add_evidence(world, 'Smokes(P1)')
+    p2 = model.query(world, 'Cancer(x)', samples=200, seed=0)
+    ok_(p2[f('Cancer(P1)')] > p1[f('Cancer(P1)')])
+    state = model.map_state(world, 'Cancer(x)', seed=0)
+    ok_(state[f('Cancer(P1)')])
+    eq_(len(live.state), model.ground_network(world, ['Cancer']).n_atoms)
+
+def test_contradicting_evidence():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    model.mln[0] = (model.mln[0][0], float('inf'))
+    model.incremental = True
+    world = _world()
+    ok_(not model.ground_network(world, ['Cancer']).contradiction())
+    # Smokes(P0) => Cancer(P0) is hard
+    model.add_evidence(world, 'Cancer(P0)', False)
+    ok_(model.ground_network(world, ['Cancer']).contradiction())
+    assert_raises(InferenceError, model.query, world, 'Cancer(x)', samples=10, seed=0)
+    model.retract_evidence(world, 'Cancer(P0)')
+    ok_(not model.ground_network(world, ['Cancer']).contradiction())
@@ -0,0 +1,160 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+
+from syntax import *
+from evidence import *
+from network import *
+from model import *
+from gibbs import color_atoms
+import inference
+
+f = parse_formula
+
+def small_network():
+    clauses = [
+        [f('not Smokes(A)'), f('Cancer(A)')],
+        [f('not Smokes(B)'), f('Cancer(B)')],
+        [f('Smokes(A)')],
+        [f('not Smokes(A)'), f('Smokes(B)')],
+        [f('Cancer(B)')],
+        [f('Smokes(B)'), f('Cancer(A)')],
+        ]
+    return GroundNetwork.from_clauses(clauses, [1.5, 1.5, 1.0, 0.8, -0.5, float('inf')])
+
+def test_simple_inference():
+    network = GroundNetwork.from_clauses([[f('P(A)')]], [1.0])
+    p = inference.simple_inference(network)
+    ok_(np.allclose(p, [np.exp(1) / (1 + np.exp(1))]))
+
+def test_simple_inference_hard():
+    network = GroundNetwork.from_clauses([[f('P(A)'), f('Q(A)')], [f('not P(A)')]],
+                                         [float('inf'), float('inf')])
+    ok_(np.allclose(inference.simple_inference(network), [0.0, 1.0]))
+
+def test_simple_inference_too_large():
+    network = GroundNetwork.from_clauses([[f('P(A)'), f('P(B)')]], [1.0])
+    assert_raises(inference.InferenceError, inference.simple_inference, network, max_atoms=1)
+
+def test_mcsat():
+    network = small_network()
+    exact = inference.simple_inference(network)
+    approx = inference.mcsat(network, burn_in=100, samples=3000, seed=0)
+    ok_(np.max(np.abs(exact - approx)) < 0.05)
+
+def test_mcsat_unconstrained():
+    network = GroundNetwork.from_clauses([[f('P(A)'), f('P(B)')]], [0.0])
+    ok_(np.allclose(inference.mcsat(network, samples=2000, seed=1), 0.5, atol=0.05))
+
+def test_query():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                     : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 1.1
+    ''')
+    world = Database(atoms=['Friends(A, B)', 'Smokes(A)'])
+    result = model.query(world, 'Cancer(x) and Smokes(B)', samples=2000, seed=0)
+    eq_(sorted(result), [f('Cancer(A)'), f('Cancer(B)'), f('Smokes(B)')])
+    exact = model.query(world, 'Cancer(x) and Smokes(B)', method='simple')
+    for atom in result:
+        ok_(abs(result[atom] - exact[atom]) < 0.05)
+
+def test_maxwalksat():
+    network = small_network()
+    state = inference.maxwalksat(network, tries=3, max_flips=1000, seed=0)
+    eq_(list(state), [True, True, True, True])
+
+def test_maxwalksat_options():
+    network = small_network()
+    state = inference.maxwalksat(network, tries=1, max_flips=0, init=[True, False, True, False])
+    eq_(list(state), [True, False, True, False])
+    state = inference.maxwalksat(network, timeout=10.0, target=100.0, seed=0)
+    eq_(len(state), 4)
+    assert_raises(ValueError, inference.maxwalksat, network, tries=0)
+
+def test_map_state():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                     : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 1.1
+    ''')
+    world = Database(atoms=['Friends(A, B)', 'Smokes(A)'])
+    eq_(model.map_state(world, 'Cancer(x) and Smokes(B)', seed=0), {
+        f('Cancer(A)'): True, f('Cancer(B)'): True, f('Smokes(B)'): True
+        })
+    eq_(model.map_state(world, seed=0), {f('Cancer(A)'): True})
+
+def test_color_atoms():
+    network = small_network()
+    colors = color_atoms(network, seed=0)
+    for clause in range(network.n_clauses):
+        atoms = network.lits[network.clause_ptr[clause]:network.clause_ptr[clause+1]]
+        eq_(len(set(colors[atoms])), len(atoms))
+
+def test_gibbs():
+    network = small_network()
+    exact = inference.simple_inference(network)
+    approx = inference.gibbs(network, burn_in=100, samples=5000, seed=0)
+    ok_(np.max(np.abs(exact - approx)) < 0.05)
+
+def test_query_tseitin():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                       : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 0.0
+    ''')
+    model.mln[1] = (model.mln[1][0], float('inf'))
+    world = Database(atoms=['Friends(A, B)', 'Smokes(A)'])
+    expected = model.query(world, 'Cancer(x) and Smokes(x)', method='simple')
+    model.modes[model.mln[1][0]] = 'tseitin'
+    per_formula = model.query(world, 'Cancer(x) and Smokes(x)', method='simple')
+    model.default_mode = 'tseitin'
+    result = model.query(world, 'Cancer(x) and Smokes(x)', method='simple')
+    eq_(result.keys(), expected.keys())
+    for atom in result:
+        ok_(abs(result[atom] - expected[atom]) < 1e-9)
+        ok_(abs(per_formula[atom] - expected[atom]) < 1e-9)
+    # Smokes is closed-world, so the hard formula needs Smokes(B)
+    world.add('Smokes(B)')
+    ok_(all(not atom.pred.startswith('_') for atom in model.map_state(world, seed=0)))
+
+    # The weight of a conjunction is not divided among its conjuncts
+    model.load('Smokes(B) and Cancer(B) : 2.0')
+    result = model.query(Database(), 'Smokes(B)', method='simple')
+    ok_(abs(result[f('Smokes(B)')] - (np.exp(2) + 1) / (np.exp(2) + 3)) < 1e-9)
+
+def test_unsatisfiable_hard_clauses():
+    inf = float('inf')
+    model = MarkovLogicNetwork()
+    model.mln = [(f('P(A)'), inf), (f('forall x (P(x) => Q(x))'), inf), (f('not Q(A)'), inf),
+                 (f('R(A)'), 1.0)]
+    world = Database()
+    network = model.ground_network(world)
+    ok_(network.contradiction())
+    assert_raises(inference.InferenceError, inference.simple_inference, network)
+    assert_raises(inference.InferenceError, inference.wmc, network)
+    for method in ('mcsat', 'gibbs', 'bp'):
+        assert_raises(inference.InferenceError, model.query, world, 'R(A)', method=method)
+    assert_raises(inference.InferenceError, model.map_state, world)
+
+def test_hard_clause_falsified_by_evidence():
+    model = MarkovLogicNetwork()
+    model.mln = [(f('forall x (Smokes(x) => Cancer(x))'), float('inf'))]
+    world = Database(atoms=['Smokes(A)', 'not Cancer(A)'])
+    assert_raises(inference.InferenceError, model.query, world, 'Smokes(x)', method='simple')
+
+def test_query_falsified_hard_clause():
+    model = MarkovLogicNetwork()
+    model.mln = [(f('forall x (Smokes(x) => Cancer(x))'), float('inf')), (f('Smokes(B)'), 1.0)]
+    world = Database(atoms=['Smokes(A)', 'not Cancer(A)'])
+    for simplified in (True, False):
+        model.simplify = simplified
+        ok_(model.ground_network(world).contradiction())
+        for method in ('mcsat', 'wmc'):
+            assert_raises(inference.InferenceError, model.query, world, 'Smokes(B)', method=method)
+    assert_raises(inference.InferenceError, model.query, world, 'Smokes(B)', lazy=True)
+    assert_raises(inference.InferenceError, model.map_state, world, lazy=True)
@@ -0,0 +1,143 @@
+import sys
+import os
+import math
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+
+from syntax import *
+from evidence import *
+from model import *
+from lazy import *
+
+f = parse_formula
+
+MODEL = '''
+Smokes(person)
+Cancer(person)
+Friends(person, person)
+forall x (Smokes(x) => Cancer(x))                        : 1.5
+forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))  : 1.1
+Cancer(x)                                                : -1.0
+'''
+
+def _world(n):
+    people = ['P{}'.format(i) for i in range(n)]
+    friends = ['Friends(P{}, P{})'.format(i, i + 1) for i in range(0, n - 1, 2)]
+    return Database(atoms=['Smokes(P0)', 'Smokes(P3)'] + friends, constants=people)
+
+def _model():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    return model
+
+def test_initial_clauses():
+    model = _model()
+    network = model.lazy_network(_world(6), ['Cancer'])
+    # Only Smokes(x) => Cancer(x) of smokers is unsatisfied when all atoms are false
+    eq_(sorted(network.atom(i) for i in range(network.n_atoms)),
+        [f('Cancer(P0)'), f('Cancer(P3)')])
+    eq_(network.n_clauses, 2)
+    eq_(network.atom_id(f('Cancer(P1)')), None)
+
+    a = network.atom_id(f('Cancer(P0)'))
+    eq_(network.activate(a), 1)     # the unit clause of negative weight
+    eq_(network.activate(a), 0)
+    eq_(network.clause_signs[2], (False,))
+    eq_(network.weights[2], 1.0)
+
+def test_activate():
+    network = LazyNetwork(_model().grounder(_world(6), ['Smokes', 'Cancer']))
+    # Friends(P2, P3) => (Smokes(P3) => Smokes(P2)) is unsatisfied when all atoms are false
+    a = network.atom_id(f('Smokes(P2)'))
+    ok_(a is not None)
+    eq_(network.atom_id(f('Cancer(P2)')), None)
+    network.activate(a)
+    atoms = set(network.atom(b) for c in network.clause_atoms for b in c)
+    ok_(f('Cancer(P2)') in atoms)
+    ok_(f('Smokes(P5)') not in atoms)
+
+def test_lazy_map():
+    model = _model()
+    world = _world(8)
+    eager = model.map_state(world, 'Cancer(x)', seed=0, max_flips=2000)
+    lazy = model.map_state(world, 'Cancer(x)', seed=0, max_flips=2000, lazy=True)
+    eq_(lazy, eager)
+
+    eager = model.map_state(world, 'Smokes(x)', seed=0, max_flips=2000)
+    lazy = model.map_state(world, 'Smokes(x)', seed=0, max_flips=2000, lazy=True)
+    eq_(lazy, eager)
+
+def test_lazy_mcsat():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                        : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))  : 1.1
+    ''')
+    world = Database(atoms=['Friends(A, B)', 'Smokes(A)', 'Friends(C, D)'])
+    query = 'Smokes(x) or Cancer(x)'
+    exact = model.query(world, query, method='wmc')
+    eager = model.query(world, query, seed=0, samples=4000)
+    lazy = model.query(world, query, seed=0, samples=4000, lazy=True)
+    eq_(set(lazy), set(exact))
+    for atom in exact:
+        ok_(abs(lazy[atom] - exact[atom]) < 0.05)
+        ok_(abs(lazy[atom] - eager[atom]) < 0.07)
+    # Atoms whose clauses are satisfied by default are sampled too
+    ok_(abs(lazy[f('Cancer(C)')] - 0.611) < 0.05)
+    ok_(abs(lazy[f('Smokes(C)')] - 0.35) < 0.05)
+
+def test_lazy_mcsat_memory():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x y (Friends(x, y) and Smokes(x) => Smokes(y)) : 1.1
+    Smokes(x)                                             : -1.0
+    Friends(x, y)                                         : -2.0
+    ''')
+    world = Database(atoms=['Smokes(P0)'], constants=['P{}'.format(i) for i in range(30)])
+    network = model.ground_network(world, ['Smokes', 'Friends'])
+    lazy = model.lazy_network(world, ['Smokes', 'Friends'])
+    lazy_mcsat(lazy, seed=0, burn_in=20, samples=100)
+    # Groundings of two false atoms are neither kept nor swept
+    ok_(lazy.n_clauses < network.n_clauses / 4)
+    ok_(len(lazy.live_atoms()) < network.n_atoms / 4)
+    ok_(len(lazy.active_atoms) < len(lazy.live_atoms()))
+    eq_(lazy.prior(f('Friends(P5, P6)')), 1 / (1 + math.exp(2.0)))
+
+def test_lazy_mcsat_priors():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x y (Friends(x, y) and Smokes(x) => Smokes(y)) : 1.1
+    Smokes(x)                                             : -1.0
+    Friends(x, y)                                         : -0.5
+    ''')
+    world = Database(atoms=['Smokes(A)'], constants=['A', 'B', 'C'])
+    query = 'Smokes(x) or Friends(x, y)'
+    exact = model.query(world, query, method='wmc')
+    lazy = model.query(world, query, seed=0, samples=3000, lazy=True)
+    for atom in exact:
+        ok_(abs(lazy[atom] - exact[atom]) < 0.05)
+    # Friends(A, A) is in no clause but its unit clause
+    ok_(abs(lazy[f('Friends(A, A)')] - 1 / (1 + math.exp(0.5))) < 1e-9)
+
+def test_deactivate():
+    network = LazyNetwork(_model().grounder(_world(6), ['Smokes', 'Cancer']))
+    a = network.atom_id(f('Smokes(P2)'))
+    n = network.n_clauses
+    added = network.activate(a)
+    ok_(added > 0)
+    eq_(len(network.deactivate(a)), added)
+    eq_((network.n_clauses, network.active_atoms), (n, []))
+    network.activate(a)
+    eq_(network.n_clauses, n + added)
+    eq_(network.n_slots, n + added)       # slots are reused
+
+def test_active_set():
+    model = _model()
+    world = _world(100)
+    network = model.ground_network(world, ['Cancer'])
+    lazy = model.lazy_network(world, ['Cancer'])
+    state = lazy_maxwalksat(lazy, seed=0, max_flips=1000)
+    eq_(sum(state), 2)
+    ok_(lazy.n_clauses < network.n_clauses / 10)
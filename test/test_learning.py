@@ -0,0 +1,80 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+from itertools import product
+import numpy as np
+
+from syntax import *
+from evidence import *
+from learning import *
+from model import *
+
+f = parse_formula
+
+mln = [
+    (f('forall x (Smokes(x) => Cancer(x))'), 0.0),
+    (f('forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))'), 0.0),
+    (f('forall x Cancer(x)'), 0.0),
+    ]
+people = ['A', 'B', 'C', 'D']
+world = Database(atoms=['Friends(A, B)', 'Friends(B, A)', 'Friends(C, D)', 'Smokes(A)'])
+facts = ['Smokes(B)', 'Cancer(A)', 'Cancer(B)', 'Cancer(D)']
+
+def true_groundings(i, truth):
+    'Number of true groundings of clauses of i-th formula divided by #clauses'
+    x, y = 'x', 'y'
+    if i == 0:
+        return sum(not truth[('Smokes', (a,))] or truth[('Cancer', (a,))] for a in people)
+    elif i == 1:
+        n = 0
+        for a, b in product(people, repeat=2):
+            fr = truth[('Friends', (a, b))]
+            n += (not fr or not truth[('Smokes', (a,))] or truth[('Smokes', (b,))])
+            n += (not fr or truth[('Smokes', (a,))] or not truth[('Smokes', (b,))])
+        return n / 2.0
+    else:
+        return sum(truth[('Cancer', (a,))] for a in people)
+
+def test_count_matrix():
+    db = TrainingDatabase(world, facts)
+    truth = {}
+    for pred, arity in [('Smokes', 1), ('Cancer', 1), ('Friends', 2)]:
+        for args in product(people, repeat=arity):
+            truth[(pred, args)] = bool(db.lookup(pred, args))
+    expected = []
+    for pred in ['Cancer', 'Smokes']:
+        for a in people:
+            flipped = dict(truth)
+            flipped[(pred, (a,))] = not truth[(pred, (a,))]
+            row = [true_groundings(i, flipped) - true_groundings(i, truth) for i in range(3)]
+            if any(row):
+                expected.append(row)
+    D = count_matrix(mln, world, facts, people)
+    ok_(np.allclose(D.toarray(), expected))
+
+def test_count_matrix_parallel():
+    D1 = count_matrix(mln, world, facts, people)
+    D2 = count_matrix(mln, world, facts, people, processes=2)
+    ok_(np.allclose(D1.toarray(), D2.toarray()))
+
+def test_gradient():
+    D = count_matrix(mln, world, facts, people)
+    w = np.array([0.3, -0.2, 0.5])
+    pll, grad = pseudo_log_likelihood(w, D)
+    eps = 1e-6
+    for i in range(3):
+        e = np.zeros(3)
+        e[i] = eps
+        ok_(abs((pseudo_log_likelihood(w + e, D)[0] - pll) / eps - grad[i]) < 1e-4)
+
+def test_train():
+    model = MarkovLogicNetwork()
+    model.load('forall x (Smokes(x) => Cancer(x)) : 0.0')
+    people = ['P{}'.format(i) for i in range(20)]
+    world = Database(atoms=['Smokes({})'.format(p) for p in people[:10]])
+    facts = ['Cancer({})'.format(p) for p in people[:9]]
+    model.train(world, facts)
+    ok_(model.mln[0][1] > 1.0)
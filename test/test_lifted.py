@@ -0,0 +1,82 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+
+from syntax import *
+from evidence import *
+from network import *
+from model import *
+from lifted import *
+import inference
+
+f = parse_formula
+
+def symmetric_network():
+    clauses, weights = [], []
+    for c in ['A', 'B', 'C']:
+        clauses.extend([[f('not Smokes({})'.format(c)), f('Cancer({})'.format(c))],
+                        [f('Smokes({})'.format(c))]])
+        weights.extend([1.5, 0.3])
+    clauses.append([f('Cancer(D)'), f('Smokes(D)')])
+    weights.append(0.7)
+    return GroundNetwork.from_clauses(clauses, weights)
+
+def test_color_passing():
+    network = symmetric_network()
+    atoms, clauses = color_passing(network)
+    smokes = [network.atom_id(f('Smokes({})'.format(c))) for c in 'ABC']
+    cancer = [network.atom_id(f('Cancer({})'.format(c))) for c in 'ABC']
+    eq_(len(set(atoms[smokes])), 1)
+    eq_(len(set(atoms[cancer])), 1)
+    ok_(atoms[smokes[0]] != atoms[cancer[0]])
+    eq_(atoms[network.atom_id(f('Cancer(D)'))], atoms[network.atom_id(f('Smokes(D)'))])
+    eq_(len(set(clauses)), 3)
+
+def test_components():
+    network = symmetric_network()
+    atoms, clauses = components(network)
+    eq_(len(set(atoms)), 4)
+    eq_(atoms[network.atom_id(f('Smokes(A)'))], atoms[network.atom_id(f('Cancer(A)'))])
+    ok_(np.all(clauses == atoms[network.lits[network.clause_ptr[:-1]]]))
+
+def test_subnetwork():
+    network = symmetric_network()
+    atoms = [network.atom_id(f('Cancer(B)')), network.atom_id(f('Smokes(B)'))]
+    sub = subnetwork(network, atoms, [2, 3])
+    eq_(sub.atoms(), [f('Cancer(B)'), f('Smokes(B)')])
+    eq_(sub.to_clauses(), ([[f('not Smokes(B)'), f('Cancer(B)')], [f('Smokes(B)')]], [1.5, 0.3]))
+
+def test_deduplicated_inference():
+    network = symmetric_network()
+    calls = []
+    def fallback(network):
+        calls.append(network.n_atoms)
+        return inference.simple_inference(network)
+    p = deduplicated_inference(network, max_atoms=0, fallback=fallback)
+    ok_(np.allclose(p, inference.simple_inference(network)))
+    eq_(calls, [2, 2])
+    ok_(np.allclose(inference.methods['dedup'](network), p))
+
+def test_deduplicated_inference_hard():
+    network = GroundNetwork.from_clauses([[f('P(A)'), f('Q(A)')], [f('not P(A)')], []],
+                                         [float('inf'), float('inf'), 1.0])
+    ok_(np.allclose(deduplicated_inference(network), [0.0, 1.0]))
+    network = GroundNetwork.from_clauses([[f('P(A)')], []], [1.0, float('inf')])
+    assert_raises(inference.InferenceError, deduplicated_inference, network)
+
+def test_query_deduplicated():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                     : 1.5
+    forall x Smokes(x)                                    : 0.3
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 1.1
+    ''')
+    world = Database(constants=['A', 'B', 'C', 'D'], atoms=['Friends(A, B)', 'Smokes(C)'])
+    exact = model.query(world, 'Cancer(x) and Smokes(x)', method='simple')
+    dedup = model.query(world, 'Cancer(x) and Smokes(x)', method='dedup')
+    eq_(set(exact), set(dedup))
+    ok_(all(abs(exact[a] - dedup[a]) < 1e-9 for a in exact))
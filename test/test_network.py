@@ -0,0 +1,71 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+import numpy as np
+
+from syntax import *
+from normalize import *
+from evidence import *
+from network import *
+from model import *
+
+f = parse_formula
+
+clauses = [
+    [f('not Smokes(A)'), f('Cancer(A)')],
+    [f('Friends(A, B)'), f('not Smokes(B)'), f('Smokes(A)')],
+    [f('Smokes(B)')],
+    ]
+weights = [1.5, 0.7, -0.3]
+
+def test_from_clauses():
+    network = GroundNetwork.from_clauses(clauses, weights)
+    eq_(network.n_atoms, 4)
+    eq_(network.n_clauses, 3)
+    eq_(network.predicates, ['Smokes', 'Cancer', 'Friends'])
+    eq_(network.constants, ['A', 'B'])
+    eq_(list(network.clause_ptr), [0, 2, 5, 6])
+    eq_(list(network.lits), [0, 1, 2, 3, 0, 3])
+    eq_(list(network.signs), [False, True, True, False, True, True])
+    eq_(network.atom(2), f('Friends(A, B)'))
+
+def test_to_clauses():
+    network = GroundNetwork.from_clauses(clauses, weights)
+    eq_(network.to_clauses(), (clauses, weights))
+
+def test_to_tuples():
+    network = GroundNetwork.from_clauses(clauses, weights)
+    eq_(list(network.to_tuples())[1],
+        ([('Friends', ('A', 'B'), True), ('Smokes', ('B',), False), ('Smokes', ('A',), True)], 0.7))
+    eq_([w for _, w in network.to_tuples()], weights)
+
+def test_cnf():
+    cnf = ConjunctiveNormalForm(f('(P(A) and Q(A)) or R(A)'), [])
+    network = GroundNetwork.from_cnf(cnf, 1.0)
+    eq_(network.to_cnf().to_formula(), cnf.to_formula())
+
+def test_atom_id():
+    network = GroundNetwork.from_clauses(clauses, weights)
+    eq_(network.atom_id(f('Smokes(B)')), 3)
+    eq_(network.atom_id(f('Cancer(B)')), None)
+    eq_(network.atom_id(f('Unknown(A)')), None)
+
+def test_atom_clauses():
+    network = GroundNetwork.from_clauses(clauses, weights)
+    ptr, cs, positions = network.atom_clauses()
+    eq_(list(ptr), [0, 2, 3, 4, 6])
+    eq_(list(cs[ptr[0]:ptr[1]]), [0, 1])
+    eq_(list(cs[ptr[3]:ptr[4]]), [1, 2])
+    ok_(np.all(network.lits[positions] == np.repeat(np.arange(4), np.diff(ptr))))
+
+def test_ground_network():
+    model = MarkovLogicNetwork()
+    model.load('forall x y (Friends(x, y) and Smokes(x) => Smokes(y)) : 1.0')
+    world = Database(atoms=['Friends(A, B)', 'Friends(B, C)', 'Smokes(A)'],
+                     open_world=['Smokes'])
+    network = model.ground_network(world)
+    eq_(network.n_clauses, 2)
+    eq_(sorted(network.atoms()), [f('Smokes(B)'), f('Smokes(C)')])
@@ -3,7 +3,7 @@ import os
 libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
 sys.path.append(libpath)
 
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 from syntax import *
 from normalize import *
@@ -89,28 +89,160 @@ def test_cnf():
     formula = f('forall x (Smokes(x) => Cancer(x))')
     constants = ['A', 'B']
     cnf = ConjunctiveNormalForm(formula, constants)
-    eq_(cnf.to_formula(), f('not Smokes(x) or Cancer(x)'))
+    eq_(cnf.to_formula(), f('not Smokes(x0) or Cancer(x0)'))
 
     formula = f('forall x (exists y Friends(x, y) => not Smokes(x))')
     constants = ['A', 'B']
     cnf = ConjunctiveNormalForm(formula, constants)
-    eq_(cnf.to_formula(), f('not Friends(x, y) or not Smokes(x)'))
+    eq_(cnf.to_formula(), f('not Friends(x0, x1) or not Smokes(x0)'))
 
     formula = f('forall x (not Smokes(x) => exists y Friends(x, y))')
     constants = ['A', 'B']
     cnf = ConjunctiveNormalForm(formula, constants)
-    eq_(cnf.to_formula(), f('Smokes(x) or Friends(x,A) or Friends(x,B)'))
+    eq_(cnf.to_formula(), f('Smokes(x0) or Friends(x0,A) or Friends(x0,B)'))
 
 def test_dnf():
     formula = f('forall x not (Smokes(x) => Cancer(x))')
     constants = ['A', 'B']
     dnf = DisjunctiveNormalForm(formula, constants)
-    eq_(dnf.to_formula(), f('Smokes(x) and not Cancer(x)'))
+    eq_(dnf.to_formula(), f('Smokes(x0) and not Cancer(x0)'))
 
     formula = f('forall x (exists y Friends(x, y) <=> not Smokes(x))')
     constants = ['A']
     dnf = DisjunctiveNormalForm(formula, constants)
     eq_(dnf.to_formula(), f('''
-    not Friends(x,y) and Friends(x,A) or (not Friends(x,y) and Smokes(x)) or
-    (not Smokes(x) and Friends(x,A)) or (not Smokes(x) and Smokes(x))
+    not Friends(x0,x2) and Friends(x0,A) or (not Friends(x0,x2) and Smokes(x0)) or
+    (not Smokes(x0) and Friends(x0,A)) or (not Smokes(x0) and Smokes(x0))
     '''))
+
+def test_tseitin():
+    formula = f('forall x ((P(x) and Q(x)) or (R(x) and S(x)))')
+    cnf = ConjunctiveNormalForm(formula, [], mode='tseitin', name='0')
+    aux0, aux1 = Atom('_Aux0_0', ('x0',)), Atom('_Aux0_1', ('x0',))
+    eq_(cnf.clauses, [[aux0, aux1]])
+    eq_(len(cnf.definitions), 6)
+    ok_([Not(aux0), f('P(x0)')] in cnf.definitions)
+    ok_([aux0, f('not P(x0)'), f('not Q(x0)')] in cnf.definitions)
+
+    hard = ConjunctiveNormalForm(f('P(x) and (Q(x) or R(x))'), [], mode='tseitin', hard=True)
+    eq_(hard.clauses, [[f('P(x)')], [f('Q(x)'), f('R(x)')]])
+    eq_(hard.definitions, [])
+
+def test_tseitin_linear():
+    formula = f('''
+    ((P1() <=> Q1()) <=> (P2() <=> Q2())) <=> ((P3() <=> Q3()) <=> (P4() <=> Q4()))
+    ''')
+    distributed = ConjunctiveNormalForm(formula, [])
+    tseitin = ConjunctiveNormalForm(formula, [], mode='tseitin')
+    auto = ConjunctiveNormalForm(formula, [], mode='auto', max_clauses=100)
+    ok_(len(distributed.clauses) > 1000)
+    ok_(len(tseitin.clauses) + len(tseitin.definitions) < 100)
+    eq_(auto.clauses, tseitin.clauses)
+
+def test_tseitin_types():
+    types = {'Friends': ('person', 'person'), 'Smokes': ('person',)}
+    formula = f('forall x y (Friends(x, y) and Smokes(x) or Smokes(y))')
+    cnf = ConjunctiveNormalForm(formula, [], types, {}, mode='tseitin', name='3')
+    eq_(cnf.types, {'_Aux3_0': ('person', 'person')})
+
+def test_simplify():
+    inf = float('inf')
+    P, Q, R, S = f('P(x)'), f('Q(x)'), f('R(x)'), f('S(A)')
+    eq_(simplify([([Q, P, Q], 1.0)]), [([P, Q], 1.0)])
+    eq_(simplify([([P, Not(P)], 1.0), ([Q], 0.0)]), [])
+    eq_(simplify([([P, Q], 1.0), ([Q, P], 0.5)]), [([P, Q], 1.5)])
+    eq_(simplify([([P, Q], inf), ([P, Q, R], 1.0), ([P, R], 2.0)]),
+        [([P, Q], inf), ([P, R], 2.0)])
+    eq_(simplify([([P], 1.0), ([P, Q], 2.0)]), [([P], 1.0), ([P, Q], 2.0)])
+
+def test_simplify_evidence():
+    truth = {('S', ('A',)): False, ('T', ('A',)): True}
+    lookup = lambda pred, args: truth.get((pred, args))
+    eq_(simplify([([f('P(x)'), f('S(A)')], 1.0), ([f('T(A)'), f('P(x)')], 1.0)], lookup),
+        [([f('P(x)')], 1.0)])
+
+def test_simplify_unit_propagation():
+    inf = float('inf')
+    clauses = [
+        ([('P', ('A',), True)], inf),
+        ([('P', ('A',), False), ('Q', ('A',), True)], inf),
+        ([('Q', ('A',), False), ('R', ('A',), True), ('R', ('B',), True)], 1.0),
+        ([('P', ('A',), True), ('R', ('B',), False)], 0.5),
+        ]
+    eq_(simplify(clauses), [
+        ([('P', ('A',), True)], inf),
+        ([('Q', ('A',), True)], inf),
+        ([('R', ('A',), True), ('R', ('B',), True)], 1.0),
+        ])
+
+def test_simplify_contradiction():
+    inf = float('inf')
+    P, Q, R = ('P', ('A',), True), ('Q', ('A',), True), ('R', ('A',), True)
+    notP, notQ = ('P', ('A',), False), ('Q', ('A',), False)
+    # A hard clause which propagation empties is kept
+    clauses = simplify([([P], inf), ([notP, Q], inf), ([notQ], inf), ([R], 1.0)])
+    ok_(([], inf) in clauses)
+    ok_(([R], 1.0) in clauses)
+    # A soft one is removed
+    eq_(simplify([([P], inf), ([notP], 1.0)]), [([P], inf)])
+    truth = lambda pred, args: False
+    eq_(simplify([([P, Q], inf)], truth), [([], inf)])
+    eq_(simplify([([P, Q], 2.0)], truth), [])
+
+def reference_cnf(formula, constants):
+    g = n._uniquify(formula, [0])
+    g = n._remove_arrows(g)
+    g = n._move_neg(g)
+    g = n._remove_exists(g, constants)
+    g = n._remove_forall(g)
+    return n._move_or(g), n._move_and(g)
+
+def test_fused_normalization():
+    formulas = [
+        'forall x (Smokes(x) => Cancer(x))',
+        'forall x (exists y Friends(x, y) => not Smokes(x))',
+        'forall x (not Smokes(x) => exists y Friends(x, y))',
+        'forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))',
+        'not forall x exists y (P(x, y) and not (Q(y) or R(x)))',
+        'exists x y (P(x, f(y)) or Q(A)) and forall z not exists w P(z, w)',
+        'not ((P() <=> Q()) <=> not (R() => P()))',
+        'forall x (P(x) and exists y (Q(y) => forall z R(x, y, z)))',
+        'exists y (Q(y) => P(y))',
+        ]
+    for text in formulas:
+        formula = f(text)
+        cnf, dnf = reference_cnf(formula, ['A', 'B'])
+        eq_(ConjunctiveNormalForm(formula, ['A', 'B']).clauses, cnf)
+        eq_(DisjunctiveNormalForm(formula, ['A', 'B']).clauses, dnf)
+
+def test_fused_normalization_deep():
+    formula = f('P(x)')
+    for i in range(1200):
+        formula = Or(Not(formula), Atom('Q', ('x', 'C' + str(i))))
+    clauses = ConjunctiveNormalForm(formula, []).clauses
+    eq_(len(clauses), 601)
+
+def test_quantifier_under_arrow():
+    cnf = ConjunctiveNormalForm(f('exists y (Q(y) => P(y))'), ['A', 'B'])
+    eq_(cnf.clauses, [[f('not Q(A)'), f('P(A)'), f('not Q(B)'), f('P(B)')]])
+    cnf = ConjunctiveNormalForm(f('forall x (P(x) and exists y (Q(y) => R(x, y)))'), ['A'])
+    eq_(cnf.clauses, [[f('P(x0)')], [f('not Q(A)'), f('R(x0, A)')]])
+
+def test_tseitin_deep():
+    formula = f('P(x)')
+    for i in range(1500):
+        op = And if i % 2 else Or
+        formula = op(Atom('Q' + str(i), ('x',)), Not(formula) if i % 3 else formula)
+    formula = Forall(('x',), Imply(Atom('R', ('x',)), formula))
+    types = {'Q{}'.format(i): ('person',) for i in range(1500)}
+    cnf = ConjunctiveNormalForm(formula, [], types, {}, mode='auto', max_clauses=64)
+    eq_(len(cnf.clauses), 1)
+    ok_(len(cnf.types) >= 500)
+    ok_(all(ty == ('person',) for ty in cnf.types.values()))
+
+def test_substitute():
+    formula = f('P(x) and (Q(A) or R(x, y))')
+    result = n._substitute(formula, {'x': 'B'})
+    eq_(result, f('P(B) and (Q(A) or R(B, y))'))
+    ok_(result.f2.f1 is formula.f2.f1)
+    ok_(n._substitute(formula, {'z': 'B'}) is formula)
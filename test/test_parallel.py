@@ -0,0 +1,62 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+
+from syntax import *
+from evidence import *
+from grounding import *
+from parallel import *
+from model import *
+
+f = parse_formula
+
+def model_and_world():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x y z (Friends(x, y) and Friends(y, z) => Friends(x, z)) : 0.7
+    forall x (Smokes(x) => Cancer(x))                               : 1.5
+    Smokes(A) or Smokes(B)                                          : 0.3
+    ''')
+    world = Database(atoms=['Friends(A, B)', 'Friends(B, C)', 'Friends(C, D)',
+                            'Smokes(A)', 'not Cancer(B)'],
+                     open_world=['Friends', 'Smokes', 'Cancer'])
+    return model, world
+
+def clause_set(network):
+    clauses, weights = network.to_clauses()
+    return sorted((sorted(map(str, c)), w) for c, w in zip(clauses, weights))
+
+def test_shards():
+    model, world = model_and_world()
+    model.simplify = False
+    tasks = shards(model.grounder(world), 3)
+    eq_([j for j, _ in tasks], [0, 0, 1, 1, 2])
+    eq_(tasks[0][1], (0, 2))
+    eq_(leading(model.grounder(world), 0, tasks[0][1]), ('x0', ['A', 'B']))
+    eq_(tasks[4][1], None)
+
+def test_ground_parallel():
+    model, world = model_and_world()
+    serial = model.grounder(world)
+    expected = model.ground_network(world)
+    list(serial.ground())
+    grounder = model.grounder(world)
+    network = ground_parallel(grounder, processes=2, chunks=3)
+    eq_(clause_set(network), clause_set(expected))
+    eq_(network.n_atoms, expected.n_atoms)
+    eq_(grounder.stats.total, serial.stats.total)
+    eq_(grounder.stats.emitted, serial.stats.emitted)
+
+def test_model_ground_network():
+    model, world = model_and_world()
+    expected = model.ground_network(world)
+    atom = GroundNetwork.atom
+    GroundNetwork.atom = None   # simplification works on tuples without building atoms
+    try:
+        network = model.ground_network(world, processes=2)
+    finally:
+        GroundNetwork.atom = atom
+    eq_(clause_set(network), clause_set(expected))
@@ -0,0 +1,85 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+
+from syntax import *
+from evidence import *
+from model import *
+from profiling import *
+
+f = parse_formula
+
+MODEL = '''
+Smokes(person)
+Cancer(person)
+Friends(person, person)
+forall x (Smokes(x) => Cancer(x))                        : 1.5
+forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))  : 1.1
+'''
+
+people = ['P{}'.format(i) for i in range(6)]
+world = Database(atoms=['Smokes(P0)', 'Friends(P0, P1)', 'Friends(P1, P2)'], constants=people)
+
+def test_formula_size():
+    eq_(formula_size(f('forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y)))')), 3)
+    eq_(formula_size(f('not exists y P(y)')), 1)
+
+def test_disabled():
+    model = MarkovLogicNetwork()
+    model.load(MODEL)
+    eq_(model.profiler, None)
+    with model._phase('query') as phase:
+        phase.record(atoms=1)
+    eq_(model.profiler, None)
+
+def test_query_phases():
+    model = MarkovLogicNetwork()
+    seen = []
+    profiler = model.profile(hooks=[seen.append])
+    model.load(MODEL)
+    model.query(world, 'Cancer(x)', burn_in=5, samples=20, seed=0)
+    names = [p.name for p in profiler.phases]
+    eq_(names, ['load', 'query/parse', 'query/ground/cnf', 'query/ground', 'query/infer',
+                'query/result', 'query'])
+    eq_(seen, profiler.phases)
+    phases = dict((p.name, p) for p in profiler.phases)
+    eq_(phases['load'].counts, {'formulas': 2, 'predicates': 3})
+    ground = phases['query/ground'].counts
+    ok_(ground['atoms'] > 0 and ground['clauses'] > 0)
+    eq_(ground['groundings'] - ground['pruned'], ground['clauses'])
+    ok_(phases['query'].time >= phases['query/infer'].time)
+    eq_(phases['query'].peak, None)
+
+    sampler = profiler.sampler
+    eq_(sampler.steps, 25)
+    eq_(phases['query/infer'].counts['flips'], sampler.flips)
+    ok_(sampler.flips > 0 and sampler.flips_per_second > 0)
+
+    eq_([(s.clauses, s.literals) for s in profiler.formulas], [(1, 2), (2, 6)])
+    eq_(profiler.formulas[1].expansion, 2.0)
+    eq_(set(profiler.times()), set(names))
+
+def test_memory():
+    model = MarkovLogicNetwork()
+    profiler = model.profile(memory=True)
+    model.load(MODEL)
+    model.map_state(world, 'Cancer(x)', seed=0)
+    phases = dict((p.name, p) for p in profiler.phases)
+    ok_(phases['map_state/ground'].peak > 0)
+    ok_(phases['map_state'].peak >= phases['map_state/ground'].peak)
+    eq_(profiler.sampler.steps, 1)
+    summary = profiler.summary()
+    eq_(len(summary['phases']), len(profiler.phases))
+    eq_(summary['sampler']['flips'], profiler.sampler.flips)
+
+def test_train_phases():
+    model = MarkovLogicNetwork()
+    model.load('forall x (Smokes(x) => Cancer(x)) : 0.0')
+    profiler = model.profile()
+    facts = ['Cancer({})'.format(p) for p in people[:1]]
+    model.train(world, facts, max_iterations=50)
+    eq_([p.name for p in profiler.phases], ['train/count', 'train/optimize', 'train'])
+    eq_(profiler.phases[0].counts['query_atoms'], 1)     # only Cancer(P0) changes counts
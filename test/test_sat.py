@@ -0,0 +1,62 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import eq_, ok_
+import random
+import numpy as np
+
+from syntax import *
+from network import *
+from sat import *
+
+f = parse_formula
+
+def network():
+    clauses = [
+        [f('not P(A)'), f('Q(A)')],
+        [f('P(A)'), f('P(B)'), f('not Q(B)')],
+        [f('Q(A)'), f('Q(B)')],
+        [f('P(B)')],
+        [f('not P(A)'), f('not Q(B)')],
+        ]
+    return GroundNetwork.from_clauses(clauses, [1.0, 2.0, -0.5, float('inf'), 0.0])
+
+def test_flip():
+    cs = ClauseState(network(), [False, False, False, False])
+    eq_(cs.counts, [1, 1, 0, 0, 2])
+    eq_(sorted(cs.unsat), [2, 3])
+    eq_(cs.break_count(0), 1)
+    eq_(cs.make_count(2), 1)
+    cs.flip(2)
+    eq_(cs.counts, [1, 2, 0, 1, 2])
+    eq_(sorted(cs.unsat), [2])
+
+def test_active():
+    cs = ClauseState(network(), [False, False, False, False], [False, True, False, True, False])
+    eq_(sorted(cs.unsat), [3])
+    eq_(cs.active_atoms(), [0, 2, 3])
+
+def test_weighted_incremental():
+    rng = random.Random(0)
+    net = network()
+    cs = WeightedClauseState(net, [False, False, False, False], hard_weight=10.0)
+    eq_(cs.cost, 10.0)
+    for _ in range(100):
+        cs.flip(rng.randrange(net.n_atoms))
+        fresh = WeightedClauseState(net, cs.assignment(), hard_weight=10.0)
+        ok_(abs(cs.cost - fresh.cost) < 1e-9)
+        eq_(sorted(cs.unsat), sorted(fresh.unsat))
+        ok_(np.allclose(cs.makes, fresh.makes))
+        ok_(np.allclose(cs.breaks, fresh.breaks))
+
+def test_delta():
+    net = network()
+    cs = WeightedClauseState(net, [True, False, True, True], hard_weight=10.0)
+    for a in range(net.n_atoms):
+        cost = cs.cost
+        delta = cs.delta(a)
+        cs.flip(a)
+        ok_(abs(cs.cost - cost - delta) < 1e-9)
+        cs.flip(a)
@@ -0,0 +1,87 @@
+import sys
+import os
+import tempfile
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+
+from syntax import *
+from evidence import *
+from network import *
+from storage import *
+from model import *
+
+f = parse_formula
+
+clauses = [
+    [f('not Smokes(A)'), f('Cancer(A)')],
+    [f('Friends(A, B)'), f('not Smokes(B)'), f('Smokes(A)')],
+    [f('Smokes(B)')],
+    ]
+weights = [1.5, 0.7, float('inf')]
+
+def test_save_load():
+    network = GroundNetwork.from_clauses(clauses, weights)
+    path = os.path.join(tempfile.mkdtemp(), 'network.mln')
+    save_network(network, path, 'm', 'e')
+    header = read_header(path)
+    eq_(header['model_hash'], 'm')
+    eq_(header['evidence_hash'], 'e')
+    loaded = load_network(path, 'm', 'e')
+    ok_(isinstance(loaded.lits, np.memmap))
+    eq_(loaded.to_clauses(), (clauses, weights))
+    eq_(loaded.atom_id(f('Smokes(B)')), network.atom_id(f('Smokes(B)')))
+
+def test_empty_network():
+    path = os.path.join(tempfile.mkdtemp(), 'network.mln')
+    save_network(GroundNetwork.from_clauses([], []), path)
+    eq_(load_network(path).n_clauses, 0)
+
+def test_hash_mismatch():
+    path = os.path.join(tempfile.mkdtemp(), 'network.mln')
+    save_network(GroundNetwork.from_clauses(clauses, weights), path, 'm', 'e')
+    assert_raises(InvalidNetworkFile, load_network, path, 'x', 'e')
+    assert_raises(InvalidNetworkFile, load_network, path, 'm', 'x')
+
+def test_invalid_file():
+    path = os.path.join(tempfile.mkdtemp(), 'network.mln')
+    with open(path, 'wb') as f:
+        f.write(b'not a network')
+    assert_raises(InvalidNetworkFile, load_network, path)
+
+def test_truncated_file():
+    path = os.path.join(tempfile.mkdtemp(), 'network.mln')
+    save_network(GroundNetwork.from_clauses(clauses, weights), path)
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        f.truncate(size // 2)
+    assert_raises(InvalidNetworkFile, load_network, path)
+    with open(path, 'r+b') as f:
+        f.truncate(20)
+    assert_raises(InvalidNetworkFile, load_network, path)
+
+def test_save_replaces_mapped_file():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'network.mln')
+    save_network(GroundNetwork.from_clauses(clauses, weights), path)
+    loaded = load_network(path)
+    save_network(GroundNetwork.from_clauses([], []), path)
+    eq_(loaded.to_clauses(), (clauses, weights))
+    eq_(load_network(path).n_clauses, 0)
+    eq_(os.listdir(directory), ['network.mln'])
+
+def test_model_ground_network():
+    model = MarkovLogicNetwork()
+    model.load('forall x y (Friends(x, y) and Smokes(x) => Smokes(y)) : 1.0')
+    world = Database(atoms=['Friends(A, B)', 'Friends(B, C)', 'Smokes(A)'],
+                     open_world=['Smokes'])
+    path = os.path.join(tempfile.mkdtemp(), 'network.mln')
+    network = model.ground_network(world, path=path)
+    ok_(os.path.exists(path))
+    cached = model.ground_network(world, path=path)
+    ok_(isinstance(cached.lits, np.memmap))
+    eq_(cached.to_clauses(), network.to_clauses())
+    world.add('Friends(C, B)')
+    eq_(model.ground_network(world, path=path).n_clauses, 3)
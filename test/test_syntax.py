@@ -96,6 +96,44 @@ def test_parse_mln():
     eq_(mln[2], (parse_formula('not F(x)'), 0))
     eq_(mln[3], (parse_formula('G(x) <=> H(x)'), 0.01))
 
+def test_parse_program():
+    code = '''
+    Friends(person, person)
+    Lives(person, city)
+    Friends(x, y) => Friends(y, x)  :   1.0
+    Lives(x, Tokyo)                 :   0.5
+    '''
+    types, mln = parse_program(code)
+    eq_(types, {'Friends': ('person', 'person'), 'Lives': ('person', 'city')})
+    eq_(mln, [(parse_formula('Friends(x, y) => Friends(y, x)'), 1.0),
+              (parse_formula('Lives(x, Tokyo)'), 0.5)])
+    eq_(parse_mln(code), mln)
+    assert_raises(ParserError, parse_program, 'P(a)\nP(b)')
+
+def test_unweighted_atom_formula():
+    types, mln = parse_program('Smokes(person)\nSmokes(x) => Cancer(x) : 1.5\nSmokes(x)')
+    eq_(types, {'Smokes': ('person',)})
+    eq_(mln, [(parse_formula('Smokes(x) => Cancer(x)'), 1.5),
+              (parse_formula('Smokes(x)'), 0.0)])
+
+def test_iter_mln():
+    lines = iter(['P(x)\n', 'P(x) => (Q(x)\n', ' or R(x)) : 1.5 Q(A) : -2\n', '(R(x))'])
+    types = {}
+    mln = iter_mln(lines, types)
+    eq_(next(mln), (parse_formula('P(x) => (Q(x) or R(x))'), 1.5))
+    eq_(types, {'P': ('x',)})
+    eq_(next(lines), '(R(x))')
+    eq_(list(mln), [(parse_formula('Q(A)'), -2.0)])
+    eq_(parse_mln('P(A) (Q(A))\nnot R(A) : 1'),
+        [(parse_formula('P(A)'), 0.0), (parse_formula('Q(A)'), 0.0),
+         (parse_formula('not R(A)'), 1.0)])
+    with assert_raises(ParserError) as e:
+        parse_mln('P(x) : 1\nQ(x) => : 2')
+    ok_('line 2, column 9' in str(e.exception))
+    with assert_raises(LexError) as e:
+        list(iter_mln('P(x) : 1\n  Q(x;)'))
+    ok_('line 2, column 6' in str(e.exception))
+
 
 # === Pretty Printing ===
 
@@ -128,6 +166,21 @@ def test_print_formula():
     eq_(str(parse_formula('P() => Q() and R()')), 'P() => Q() and R()')
     eq_(str(parse_formula('P() => (Q() => R())')), 'P() => (Q() => R())')
 
+def test_lazy_parsers():
+    parsers, table_dir, prefix = dict(syntax._parsers), syntax.TABLE_DIR, syntax.TABLE_PREFIX
+    syntax._parsers.clear()
+    syntax.TABLE_DIR = os.path.join(libpath, 'no-such-directory')
+    syntax.TABLE_PREFIX = '_parsetab_test_'
+    try:
+        eq_(parse_term('f(x, A)'), Apply('f', ('x', 'A')))
+        eq_(set(syntax._parsers), set(['term']))
+        ok_(not os.path.exists(syntax.TABLE_DIR))
+    finally:
+        syntax._parsers.clear()
+        syntax._parsers.update(parsers)
+        syntax.TABLE_DIR = table_dir
+        syntax.TABLE_PREFIX = prefix
+
 def test_parser_error():
     assert_raises(ParserError, parse_formula, 'P() =>')
     assert_raises(ParserError, parse_formula, 'P() => x')
@@ -145,3 +198,34 @@ def test_eval():
 def test_eval_error():
     assert_raises(EvaluationError, eval_term, {'x': 'y'}, ['A'], parse_term('x'))
     assert_raises(EvaluationError, eval_term, {'x': 'B'}, ['A'], parse_term('x'))
+
+# === Interning ===
+
+def test_interning():
+    import gc
+    import pickle
+    previous = set_interning(True)
+    try:
+        a = parse_formula('P(x, f(y)) and not Q(x)')
+        b = parse_formula('P(x, f(y)) and not Q(x)')
+        ok_(a is b)
+        ok_(a.f1.args[1] is parse_term('f(y)'))
+        ok_(a._replace(f2=Not(Atom('Q', ('x',)))) is a)
+        ok_(Atom('P', ('x',)) != Atom('P', ('y',)))
+        ok_(pickle.loads(pickle.dumps(a)) is a)
+        ok_(not hasattr(a, '__dict__'))
+        n = len(syntax._table)
+        del a, b
+        gc.collect()
+        ok_(len(syntax._table) < n)
+    finally:
+        set_interning(previous)
+    c = parse_formula('P(x) or Q(x)')
+    ok_(c is not parse_formula('P(x) or Q(x)'))
+    set_interning(True)
+    try:
+        d = interned(c)
+        ok_(d is parse_formula('P(x) or Q(x)'))
+    finally:
+        set_interning(previous)
+    eq_(d, c)
@@ -0,0 +1,152 @@
+import sys
+import os
+libpath = os.path.join(os.path.dirname(__file__), '../markov_logic_network')
+sys.path.append(libpath)
+
+from nose.tools import assert_raises, eq_, ok_
+import numpy as np
+from itertools import product
+
+from syntax import *
+from evidence import *
+from network import *
+from model import *
+from wmc import *
+from normalize import ConjunctiveNormalForm
+from bp import belief_propagation
+from elimination import variable_elimination
+import inference
+
+f = parse_formula
+
+def small_network():
+    clauses = [
+        [f('not Smokes(A)'), f('Cancer(A)')],
+        [f('not Smokes(B)'), f('Cancer(B)')],
+        [f('Smokes(A)')],
+        [f('not Smokes(A)'), f('Smokes(B)')],
+        [f('Cancer(B)')],
+        [f('Smokes(B)'), f('Cancer(A)')],
+        [f('Smokes(B)'), f('not Smokes(B)')],
+        [f('Cancer(A)'), f('Smokes(A)')],
+        ]
+    return GroundNetwork.from_clauses(clauses, [1.5, 1.5, 1.0, 0.8, -0.5, float('inf'), 2.0, 0.3])
+
+def random_network(rng, n_atoms, n_clauses):
+    clauses, weights = [], []
+    for _ in range(n_clauses):
+        atoms = rng.integers(0, n_atoms, 3)
+        clauses.append([f('P(C{})'.format(a)) if rng.random() < 0.5 else f('not P(C{})'.format(a))
+                        for a in atoms])
+        weights.append(rng.normal() if rng.random() < 0.8 else float('inf'))
+    return GroundNetwork.from_clauses(clauses, weights)
+
+def test_wmc():
+    network = small_network()
+    ok_(np.allclose(wmc(network), inference.simple_inference(network)))
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        network = random_network(rng, 12, 12)
+        ok_(np.allclose(wmc(network), inference.simple_inference(network)))
+
+def test_wmc_unsatisfiable():
+    network = GroundNetwork.from_clauses([[f('P(A)')], [f('not P(A)')]],
+                                         [float('inf'), float('inf')])
+    assert_raises(inference.InferenceError, wmc, network)
+    eq_(log_partition_function(network), -np.inf)
+
+def test_log_partition_function():
+    network = GroundNetwork.from_clauses([[f('P(A)'), f('Q(A)')], [f('not P(A)')], []],
+                                         [1.0, -2.0, 0.5])
+    worlds = [-2.0, -1.0, 1.0, 1.0]
+    ok_(np.isclose(log_partition_function(network), np.log(np.sum(np.exp(worlds)))))
+
+def test_component_cache():
+    n = 200
+    clauses = [[f('not P(C{})'.format(i)), f('P(C{})'.format(i + 1))] for i in range(n)]
+    network = GroundNetwork.from_clauses(clauses + [[f('P(C0)')]], [0.7] * n + [1.0])
+    counter = WeightedModelCounter(network)
+    p = counter.marginals()
+    eq_(len(p), n + 1)
+    ok_(counter.misses < 10 * n)
+    ok_(np.allclose(p, belief_propagation(network, tol=1e-12, max_iter=1000)))
+
+def test_deep_chain():
+    # The search branches once per atom of the chain, deeper than the Python stack
+    n = 600
+    clauses = [[f('not P(C{})'.format(i)), f('P(C{})'.format(i + 1))] for i in range(n)]
+    network = GroundNetwork.from_clauses(clauses + [[f('P(C0)')]], [0.7] * n + [1.0])
+    p = wmc(network)
+    ok_(np.allclose(p, variable_elimination(network)))
+    last = network.atom_id(f('P(C{})'.format(n)))
+    ok_(np.isclose(probability(network, 'P(C{})'.format(n)), p[last]))
+
+def test_probability():
+    network = small_network()
+    p = inference.simple_inference(network)
+    ok_(np.isclose(probability(network, "Cancer(A)"), p[network.atom_id(f("Cancer(A)"))]))
+    ok_(np.isclose(probability(network, 'Cancer(A) or not Cancer(A)'), 1.0))
+    eq_(probability(network, 'Smokes(B) and not Smokes(B)'), 0.0)
+    ok_(np.isclose(probability(network, 'Q(A)', 'Cancer(A)'), 0.5))
+    clauses, weights = network.to_clauses()
+    conditioned = GroundNetwork.from_clauses(clauses + [[f('not Smokes(A)')]],
+                                             weights + [float('inf')])
+    expected = inference.simple_inference(conditioned)[conditioned.atom_id(f('Cancer(A)'))]
+    ok_(np.isclose(probability(network, 'Cancer(A)', 'not Smokes(A)'), expected))
+    world = Database(atoms=['Smokes(A)'])
+    ok_(np.isclose(probability(network, 'Smokes(A) and Q(A)', database=world), 0.5))
+    ok_(np.isclose(probability(network, 'forall x Q(x)', constants=['A', 'B']), 0.25))
+    assert_raises(inference.InferenceError, probability, network, 'Cancer(A)',
+                  'Smokes(A) and not Smokes(A)')
+
+def _brute_force(network, holds, given=lambda world: True):
+    'P(holds | given) of functions of worlds (maps from atoms to truth values)'
+    clauses, weights = network.to_clauses()
+    atoms = network.atoms()
+    total = [0.0, 0.0]
+    for values in product([False, True], repeat=len(atoms)):
+        world = dict(zip(atoms, values))
+        if not given(world):
+            continue
+        log_weight = 0.0
+        for clause, w in zip(clauses, weights):
+            if any(not world[l.f] if isinstance(l, Not) else world[l] for l in clause):
+                log_weight += w if w != float('inf') else 0.0
+            elif w == float('inf'):
+                log_weight = -np.inf
+        total[holds(world)] += np.exp(log_weight)
+    return total[1] / sum(total)
+
+def test_probability_tseitin():
+    rng = np.random.default_rng(1)
+    network = random_network(rng, 12, 10)
+    clauses, weights = network.to_clauses()
+    units = [[f('P(C{})'.format(i))] for i in range(12)]
+    network = GroundNetwork.from_clauses(clauses + units, weights + list(rng.normal(size=12)))
+    # 81 clauses when distributed, so the formulas are translated by Tseitin's encoding
+    groups = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (9, 10, 11)]
+    f1 = ' or '.join('(P(C{}) and P(C{}) and P(C{}))'.format(*g) for g in groups)
+    f2 = ' or '.join('(P(C{}) and not P(C{}) and P(C{}))'.format(*g[::-1]) for g in groups)
+    ok_(ConjunctiveNormalForm(f(f1), [], mode='auto', hard=True).definitions)
+    P = lambda i: f('P(C{})'.format(i))
+    holds = lambda w: any(all(w[P(i)] for i in g) for g in groups)
+    given = lambda w: any(w[P(g[2])] and not w[P(g[1])] and w[P(g[0])] for g in groups)
+    ok_(np.isclose(probability(network, f1), _brute_force(network, holds)))
+    ok_(np.isclose(probability(network, f1, f2), _brute_force(network, holds, given)))
+
+def test_model_probability():
+    model = MarkovLogicNetwork()
+    model.load('''
+    forall x (Smokes(x) => Cancer(x))                     : 1.5
+    forall x y (Friends(x, y) => (Smokes(x) <=> Smokes(y))) : 1.1
+    ''')
+    world = Database(atoms=['Friends(A, B)', 'Smokes(A)'])
+    marginals = model.query(world, 'Cancer(x)', method='simple')
+    ok_(np.isclose(model.probability(world, 'Cancer(B)'), marginals[f('Cancer(B)')]))
+    ok_(np.isclose(model.probability(world, 'Cancer(A)', 'Smokes(A)'), marginals[f('Cancer(A)')]))
+    eq_(model.probability(world, 'Smokes(A)'), 1.0)
+    wmc_marginals = model.query(world, 'Cancer(x) and Smokes(x)', method='wmc')
+    exact = model.query(world, 'Cancer(x) and Smokes(x)', method='simple')
+    ok_(all(np.isclose(wmc_marginals[a], exact[a]) for a in exact))
+    all_cancer = model.probability(world, 'forall x Cancer(x)')
+    ok_(np.isclose(all_cancer, model.probability(world, 'Cancer(A) and Cancer(B)')))